@@ -1,8 +1,19 @@
 """New LangGraph Agent.
 
 This module defines a custom graph.
+
+The graph is built on first access (``from agent import graph``), so
+importing the package itself stays cheap for server workers and tests.
 """
 
-from agent.graph import graph
+from typing import Any
 
 __all__ = ["graph"]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "graph":
+        from agent.graph import graph
+
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,369 @@
+"""Concurrent batch runs of many objectives.
+
+``BatchRunner`` reads a stream of inputs and runs them through the graph
+concurrently instead of one ``ainvoke`` at a time:
+
+- at most ``batch_max_concurrency`` runs are in flight overall, and at most
+  ``batch_tenant_max_concurrency`` per tenant (``batch_tenant_limits``
+  overrides it for individual tenants, e.g. "nightly=8,adhoc=1");
+- at most ``batch_max_pending`` inputs are read ahead of the completed
+  ones, so a large input file is not loaded into memory at once;
+- every run is cancelled after ``batch_timeout_seconds``, and ``cancel``
+  stops a single run by id;
+- results are written as they complete, in completion order.
+
+Runs in a batch share the process-wide planner cache and search service,
+so objectives that overlap reuse plans and search results, and identical
+calls that are in flight at the same time are made only once. With
+``coalesce_backend`` set, identical objectives share one whole graph run
+(see ``coalesce.py``).
+
+From the command line, with one JSON object per input line
+(``{"id": ..., "input": ..., "tenant": ..., "configurable": {...}}``):
+
+    python -m agent.batch inputs.jsonl results.jsonl --concurrency 32 --tenant-limit adhoc=2
+"""
+import argparse
+import asyncio
+import functools
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import (
+    Any,
+    AsyncIterable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    TextIO,
+    Union,
+)
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+
+from .checkpointer import thread_config
+from .configuration import Configuration
+
+DEFAULT_TENANT = "default"
+STATUSES = ("ok", "error", "timeout", "cancelled")
+
+
+@dataclass
+class BatchItem:
+    """One objective of a batch."""
+
+    id: str
+    input: str
+    tenant: str = DEFAULT_TENANT
+    # Configuration fields for this run only, on top of the batch configuration
+    configurable: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], index: int = 0) -> "BatchItem":
+        """Build an item from a decoded input line.
+
+        Args:
+            data: The decoded JSON object.
+            index: Position of the line, used as the id when none is given.
+
+        Raises:
+            ValueError: If the object has no non-empty "input".
+        """
+        if not isinstance(data, dict) or not str(data.get("input") or "").strip():
+            raise ValueError("each batch item needs a non-empty 'input'")
+        return cls(
+            id=str(data.get("id") or f"item-{index}"),
+            input=str(data["input"]),
+            tenant=str(data.get("tenant") or DEFAULT_TENANT),
+            configurable=dict(data.get("configurable") or {}),
+        )
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one batch item."""
+
+    id: str
+    tenant: str
+    # One of STATUSES
+    status: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+    latency_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the result as a JSON-serializable dictionary."""
+        return asdict(self)
+
+
+def parse_tenant_limits(text: str) -> Dict[str, int]:
+    """Parse per-tenant limits written as "tenant=N,other=M".
+
+    Raises:
+        ValueError: If an entry is not of the form name=integer.
+    """
+    limits = {}
+    for entry in filter(None, (part.strip() for part in text.split(","))):
+        name, sep, value = entry.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"expected tenant=N, got {entry!r}")
+        limits[name.strip()] = int(value)
+    return limits
+
+
+def read_jsonl(lines: Iterable[str]) -> Iterator[Union[BatchItem, BatchResult]]:
+    """Decode batch items from JSON lines, skipping blank ones.
+
+    Lines that cannot be decoded become "error" results instead of stopping
+    the batch.
+    """
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            yield BatchItem.from_dict(json.loads(line), index)
+        except ValueError as e:
+            yield BatchResult(id=f"line-{index + 1}", tenant=DEFAULT_TENANT, status="error", error=str(e))
+
+
+class BatchRunner:
+    """Run batch items through the graph with global and per-tenant limits."""
+
+    def __init__(
+        self,
+        graph: Any = None,
+        config: Optional[RunnableConfig] = None,
+        tenant_limits: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """Create a runner for ``graph``.
+
+        Args:
+            graph: The compiled graph to run; the agent graph by default.
+            config: Runnable config applied to every run. Its configurable
+                section also supplies the ``batch_*`` limits.
+            tenant_limits: Concurrency per tenant, on top of ``batch_tenant_limits``.
+        """
+        if graph is None:
+            from .graph import graph
+        self.graph = graph
+        self.config: RunnableConfig = config or {}
+        configuration = Configuration.from_runnable_config(config)
+        if configuration.coalesce_backend != "none":
+            from .coalesce import CoalescingGraph
+
+            self.graph = CoalescingGraph(graph, config)
+        self.max_concurrency = max(1, configuration.batch_max_concurrency)
+        self.tenant_max_concurrency = max(1, configuration.batch_tenant_max_concurrency)
+        self.tenant_limits = {
+            **parse_tenant_limits(configuration.batch_tenant_limits),
+            **(tenant_limits or {}),
+        }
+        self.timeout_seconds = configuration.batch_timeout_seconds
+        self.max_pending = max(1, configuration.batch_max_pending)
+        self._tenant_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Dict[str, asyncio.Task[BatchResult]] = {}
+        self._cancelled: Set[str] = set()
+
+    def cancel(self, item_id: str) -> bool:
+        """Cancel the run of ``item_id`` if it is queued or in flight.
+
+        Returns:
+            Whether a run was cancelled.
+        """
+        task = self._tasks.get(item_id)
+        if task is None or task.done():
+            return False
+        self._cancelled.add(item_id)
+        return task.cancel()
+
+    def _tenant_semaphore(self, tenant: str) -> asyncio.Semaphore:
+        if tenant not in self._tenant_semaphores:
+            limit = self.tenant_limits.get(tenant, self.tenant_max_concurrency)
+            self._tenant_semaphores[tenant] = asyncio.Semaphore(max(1, limit))
+        return self._tenant_semaphores[tenant]
+
+    def _run_config(self, item: BatchItem) -> RunnableConfig:
+        config = merge_configs(
+            self.config,
+            {"configurable": dict(item.configurable), "metadata": {"batch_id": item.id, "tenant": item.tenant}},
+        )
+        # The item id doubles as the thread id, so a checkpointed batch can be resumed
+        return thread_config(item.id, config)
+
+    async def _run(self, item: BatchItem, global_slots: asyncio.Semaphore) -> BatchResult:
+        start = time.perf_counter()
+        result = BatchResult(id=item.id, tenant=item.tenant, status="ok")
+        try:
+            # Take the tenant slot first so a busy tenant cannot hold global slots while queued
+            async with self._tenant_semaphore(item.tenant), global_slots:
+                start = time.perf_counter()
+                state = await asyncio.wait_for(
+                    self.graph.ainvoke({"input": item.input}, self._run_config(item)),
+                    self.timeout_seconds if self.timeout_seconds > 0 else None,
+                )
+            result.response = state.get("response")
+        except asyncio.TimeoutError:
+            result.status, result.error = "timeout", f"timed out after {self.timeout_seconds}s"
+        except asyncio.CancelledError:
+            if item.id not in self._cancelled:
+                raise
+            result.status, result.error = "cancelled", "cancelled"
+        except Exception as e:
+            result.status, result.error = "error", f"{type(e).__name__}: {e}"
+        result.latency_seconds = round(time.perf_counter() - start, 6)
+        return result
+
+    async def arun(
+        self,
+        items: Union[Iterable[Any], AsyncIterable[Any]],
+        on_result: Optional[Callable[[BatchResult], None]] = None,
+    ) -> Dict[str, Any]:
+        """Run every item and report each result as soon as it completes.
+
+        Args:
+            items: ``BatchItem``s, decoded input dictionaries or ready-made
+                ``BatchResult``s (e.g. from ``read_jsonl``), sync or async.
+            on_result: Called with every result in completion order.
+
+        Returns:
+            The batch summary: counts per status and tenant, throughput,
+            latency percentiles and the shared cache, search and coalescing counters.
+        """
+        from .cache import get_structured_output_cache
+        from .reporting import summary_ms
+        from .search import get_search_service
+
+        global_slots = asyncio.Semaphore(self.max_concurrency)
+        pending = asyncio.Semaphore(self.max_pending)
+        results: List[BatchResult] = []
+        search_service = get_search_service(self.config)
+        search_before = asdict(search_service.stats)
+        coalescing = getattr(self.graph, "stats", None)
+        coalescing_before = asdict(coalescing) if coalescing is not None else {}
+
+        def report(result: BatchResult) -> None:
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        def finished(task: "asyncio.Task[BatchResult]", item_id: str) -> None:
+            self._tasks.pop(item_id, None)
+            self._cancelled.discard(item_id)
+            pending.release()
+            if not task.cancelled():
+                report(task.result())
+
+        async def submit(index: int, raw: Any) -> None:
+            if isinstance(raw, BatchResult):
+                report(raw)
+                return
+            try:
+                item = raw if isinstance(raw, BatchItem) else BatchItem.from_dict(raw, index)
+            except ValueError as e:
+                report(BatchResult(id=f"item-{index}", tenant=DEFAULT_TENANT, status="error", error=str(e)))
+                return
+            if item.id in self._tasks:
+                report(BatchResult(id=item.id, tenant=item.tenant, status="error", error="duplicate id in flight"))
+                return
+            # Backpressure: stop reading input while max_pending items are unfinished
+            await pending.acquire()
+            task = asyncio.ensure_future(self._run(item, global_slots))
+            self._tasks[item.id] = task
+            task.add_done_callback(functools.partial(finished, item_id=item.id))
+
+        start = time.perf_counter()
+        try:
+            if hasattr(items, "__aiter__"):
+                index = 0
+                async for raw in items:
+                    await submit(index, raw)
+                    index += 1
+            else:
+                for index, raw in enumerate(items):
+                    await submit(index, raw)
+            while self._tasks:
+                await asyncio.wait(list(self._tasks.values()))
+        finally:
+            for task in list(self._tasks.values()):
+                task.cancel()
+        wall_seconds = time.perf_counter() - start
+
+        cache = get_structured_output_cache(self.config)
+        by_tenant: Dict[str, Dict[str, int]] = {}
+        for result in results:
+            counts = by_tenant.setdefault(result.tenant, dict.fromkeys(STATUSES, 0))
+            counts[result.status] += 1
+        completed = [r.latency_seconds for r in results if r.status == "ok"]
+        return {
+            "total": len(results),
+            "status": {s: sum(r.status == s for r in results) for s in STATUSES},
+            "tenants": by_tenant,
+            "wall_seconds": round(wall_seconds, 3),
+            "throughput_rps": round(len(completed) / wall_seconds, 3) if wall_seconds else 0.0,
+            "latency_ms": summary_ms(completed, (50, 95, 99)),
+            "planner_cache": cache.stats_snapshot() if cache is not None else {},
+            "search": {k: v - search_before[k] for k, v in asdict(search_service.stats).items()},
+            "coalescing": (
+                {k: v - coalescing_before[k] for k, v in asdict(coalescing).items()} if coalescing is not None else {}
+            ),
+        }
+
+
+def _write_line(output: TextIO) -> Callable[[BatchResult], None]:
+    def write(result: BatchResult) -> None:
+        output.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+        output.flush()
+
+    return write
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run a JSONL batch from the command line and print its summary."""
+    from .reporting import parse_setting
+
+    parser = argparse.ArgumentParser(prog="python -m agent.batch", description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help="JSONL file of batch items, or - for stdin")
+    parser.add_argument("output", help="JSONL file the results are appended to as they complete")
+    parser.add_argument("--concurrency", type=int, help="runs in flight overall")
+    parser.add_argument("--tenant-concurrency", type=int, help="runs in flight per tenant")
+    parser.add_argument(
+        "--tenant-limit", type=parse_setting, action="append", default=[], metavar="TENANT=N"
+    )
+    parser.add_argument("--timeout", type=float, help="seconds before a run is cancelled")
+    parser.add_argument("--max-pending", type=int, help="inputs read ahead of completed runs")
+    parser.add_argument("--set", type=parse_setting, action="append", default=[], metavar="KEY=VALUE")
+    args = parser.parse_args(argv)
+
+    configurable: Dict[str, Any] = dict(args.set)
+    for name, value in (
+        ("batch_max_concurrency", args.concurrency),
+        ("batch_tenant_max_concurrency", args.tenant_concurrency),
+        ("batch_timeout_seconds", args.timeout),
+        ("batch_max_pending", args.max_pending),
+    ):
+        if value is not None:
+            configurable[name] = value
+    runner = BatchRunner(
+        config={"configurable": configurable},
+        tenant_limits={tenant: int(limit) for tenant, limit in args.tenant_limit},
+    )
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            summary = asyncio.run(runner.arun(read_jsonl(source), _write_line(output)))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    sys.stdout.write(json.dumps(summary, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+"""Offline benchmarks for the agent.
+
+Benchmarks run the real planner, executor and replanner nodes against
+scripted fake models and a fake search backend, so they need no network
+access or API keys, and print a JSON report with sorted keys that CI can
+store and diff:
+
+    python -m agent.benchmark graph --requests 50 --concurrency 8 --output bench.json
+    python -m agent.benchmark checkpoint --runs 5 --steps 8
+    python -m agent.benchmark draft --sections 8
+    python -m agent.benchmark prompts --requests 5
+
+- ``graph``: end-to-end latency percentiles, throughput at N concurrent
+  runs, LLM calls and prompt/completion tokens per node per request, and
+  search calls per request. Counts are deterministic; timings are not.
+  ``--set key=value`` passes configuration fields (e.g. ``replan_policy``
+  or ``speculative_execution``) to every run, so variants can be compared.
+- ``checkpoint``: cost of checkpointing. Runs the same plan with and without
+  a checkpointer and reports the write time per superstep, the end-to-end
+  overhead and the size of the stored state with and without compression.
+- ``draft``: cost of report steps. Builds the same report section by
+  section with full-draft rewrites and with section patches, and reports
+  executor tokens and time per step for both.
+- ``prompts``: prompt size. Runs the ``graph`` workload with the original
+  prompt layouts and with ``compact_prompts``, and reports prompt tokens
+  per call for each node, broken down by section, and how many of them
+  fall outside the byte-stable prefix a provider prompt cache can reuse.
+"""
+import argparse
+import asyncio
+import json
+import re
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from .checkpointer import CompressedSerializer, thread_config
+from .fakes import (
+    FakeChatModel,
+    FakeSearchBackend,
+    default_fake_responder,
+    fake_search,
+    finishing_replanner,
+    registered_models,
+    research_planner,
+    searching_executor,
+)
+from .prompt_assembly import prompt_snapshot
+from .reporting import parse_setting, summary_ms
+from .speculation import speculation_hit_rate
+from .state import PlanExecute
+from .task_router import routing_snapshot
+
+
+async def benchmark_graph(
+    requests: int = 20,
+    concurrency: int = 4,
+    searches: int = 3,
+    llm_latency_ms: float = 20.0,
+    ms_per_token: float = 0.0,
+    search_latency_ms: float = 10.0,
+    output_words: int = 80,
+    search_rate_per_second: float = 0.0,
+    configurable: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Run ``requests`` research objectives through the graph, ``concurrency`` at a time.
+
+    Args:
+        requests: Number of graph runs.
+        concurrency: Number of runs in flight at the same time.
+        searches: Number of independent search steps in each plan.
+        llm_latency_ms: Fake model latency before the first token.
+        ms_per_token: Fake model latency per generated token.
+        search_latency_ms: Fake search backend latency.
+        output_words: Length of each executor answer.
+        search_rate_per_second: Search rate limit (0 disables it).
+        configurable: Extra configuration fields for every run.
+
+    Returns:
+        The JSON-serializable report.
+    """
+    from .graph import workflow
+
+    def model(responder: Any) -> FakeChatModel:
+        return FakeChatModel(
+            responder=responder,
+            latency_seconds=llm_latency_ms / 1000,
+            seconds_per_token=ms_per_token / 1000,
+        )
+
+    models = {
+        "planner": model(research_planner(searches)),
+        "executor": model(searching_executor(output_words)),
+        "replanner": model(finishing_replanner),
+    }
+    run_configurable = {
+        "llm_provider": "fake",
+        "cache_backend": "none",
+        "entry_route": "full",
+        **(configurable or {}),
+    }
+    graph = workflow.compile(name="Plan and Execute Agent")
+    backend = FakeSearchBackend(latency_seconds=search_latency_ms / 1000)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies: List[float] = []
+    speculation: Dict[str, int] = {}
+    failures = 0
+
+    async def run(index: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                state = await graph.ainvoke(
+                    {"input": f"Research objective {index}"}, {"configurable": run_configurable}
+                )
+            except Exception:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - start)
+            for key, value in (state.get("speculation_stats") or {}).items():
+                speculation[key] = speculation.get(key, 0) + value
+
+    routing_before = routing_snapshot()
+    with registered_models(models), fake_search(backend, search_rate_per_second) as search_stats:
+        start = time.perf_counter()
+        await asyncio.gather(*(run(i) for i in range(requests)))
+        wall_seconds = time.perf_counter() - start
+    routing = {k: v - routing_before[k] for k, v in routing_snapshot().items() if k in ("steps", "draft_attached")}
+
+    def per_request(value: float) -> float:
+        return round(value / requests, 3) if requests else 0.0
+
+    return {
+        "benchmark": "graph",
+        "parameters": {
+            "requests": requests,
+            "concurrency": concurrency,
+            "searches": searches,
+            "llm_latency_ms": llm_latency_ms,
+            "ms_per_token": ms_per_token,
+            "search_latency_ms": search_latency_ms,
+            "output_words": output_words,
+            "configurable": configurable or {},
+        },
+        "failures": failures,
+        "latency_ms": summary_ms(latencies, (50, 90, 95, 99)),
+        "throughput_rps": round(len(latencies) / wall_seconds, 3) if wall_seconds else 0.0,
+        "llm_calls_per_request": {role: per_request(m.call_count) for role, m in models.items()},
+        "prompt_tokens_per_request": {role: per_request(m.input_tokens) for role, m in models.items()},
+        "completion_tokens_per_request": {role: per_request(m.output_tokens) for role, m in models.items()},
+        "search_calls_per_request": per_request(search_stats.backend_calls),
+        "draft_attach_rate": round(routing["draft_attached"] / routing["steps"], 3) if routing["steps"] else 0.0,
+        "speculation": {**speculation, "hit_rate": round(speculation_hit_rate(speculation), 3)},
+    }
+
+
+def _sequential_planner(steps: int) -> Callable[[List[BaseMessage]], Any]:
+    def respond(messages: List[BaseMessage]) -> Any:
+        return {
+            "steps": [f"Research aspect {i + 1} of the objective" for i in range(steps)],
+            "dependencies": [[i - 1] if i else [] for i in range(steps)],
+        }
+
+    return respond
+
+
+def _verbose_executor(words: int) -> Callable[[List[BaseMessage]], Any]:
+    def respond(messages: List[BaseMessage]) -> Any:
+        task = " ".join(str(messages[-1].content).split())[:120]
+        return f"Findings for {task}: " + " ".join(f"fact{i}" for i in range(words))
+
+    return respond
+
+
+async def benchmark_checkpoint_overhead(
+    runs: int = 5, steps: int = 8, output_words: int = 300, compress_min_bytes: int = 1024
+) -> Dict[str, Any]:
+    """Measure what checkpointing costs per superstep.
+
+    Args:
+        runs: Number of graph runs per variant.
+        steps: Number of sequential plan steps, i.e. scheduler supersteps.
+        output_words: Length of each fake step output, which drives state size.
+        compress_min_bytes: Compression threshold of the checkpoint serializer.
+
+    Returns:
+        The JSON-serializable report.
+    """
+    from .graph import workflow
+
+    configurable: Dict[str, Any] = {
+        "llm_provider": "fake",
+        "cache_backend": "none",
+        "entry_route": "full",
+        "replan_policy": "at_end",
+        "max_concurrency": 1,
+    }
+    models = {
+        "planner": FakeChatModel(responder=_sequential_planner(steps)),
+        "executor": FakeChatModel(responder=_verbose_executor(output_words)),
+        "replanner": FakeChatModel(responder=default_fake_responder("replanner")),
+    }
+    saver = InMemorySaver(serde=CompressedSerializer(min_bytes=compress_min_bytes))
+    write_seconds: List[float] = []
+    aput = saver.aput
+
+    async def timed_aput(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return await aput(*args, **kwargs)
+        finally:
+            write_seconds.append(time.perf_counter() - start)
+
+    saver.aput = timed_aput  # type: ignore[method-assign]
+    plain = workflow.compile(name="Plan and Execute Agent")
+    checkpointed = workflow.compile(checkpointer=saver, name="Plan and Execute Agent")
+
+    plain_seconds: List[float] = []
+    checkpointed_seconds: List[float] = []
+    final_state: Dict[str, Any] = {}
+    with registered_models(models):
+        for run in range(runs):
+            inputs: PlanExecute = {"input": f"Benchmark objective {run}"}
+            start = time.perf_counter()
+            await plain.ainvoke(inputs, {"configurable": configurable})
+            plain_seconds.append(time.perf_counter() - start)
+
+            config = thread_config(f"checkpoint-benchmark-{run}", {"configurable": configurable})
+            start = time.perf_counter()
+            final_state = await checkpointed.ainvoke(inputs, config)
+            checkpointed_seconds.append(time.perf_counter() - start)
+
+    writes_per_run = len(write_seconds) / runs if runs else 0
+    overhead = statistics.fmean(checkpointed_seconds) - statistics.fmean(plain_seconds) if runs else 0.0
+    raw = len(JsonPlusSerializer().dumps_typed(final_state)[1])
+    stored = len(saver.serde.dumps_typed(final_state)[1])
+    return {
+        "benchmark": "checkpoint",
+        "runs": runs,
+        "plan_steps": steps,
+        "supersteps_per_run": writes_per_run,
+        "write_ms_per_superstep": summary_ms(write_seconds),
+        "run_ms": {
+            "without_checkpointer": summary_ms(plain_seconds),
+            "with_checkpointer": summary_ms(checkpointed_seconds),
+        },
+        "overhead_ms_per_superstep": round(overhead * 1000 / writes_per_run, 3) if writes_per_run else 0.0,
+        "final_state_bytes": {"raw": raw, "stored": stored},
+    }
+
+
+_DRAFT_BLOCK = re.compile(r"--- EXISTING DRAFT CONTENT START ---\n(.*)\n--- EXISTING DRAFT CONTENT END ---", re.DOTALL)
+
+
+def _report_steps(sections: int) -> Callable[[List[BaseMessage]], Any]:
+    def respond(messages: List[BaseMessage]) -> Any:
+        steps = ["Generate an initial draft of the report"] + [
+            f"Add a section on topic {i + 1} to the current_draft_report content" for i in range(sections)
+        ]
+        return {"steps": steps, "dependencies": [[i - 1] if i else [] for i in range(len(steps))]}
+
+    return respond
+
+
+def _report_writer(section_words: int) -> Callable[[List[BaseMessage]], Any]:
+    """Write one new section per step, as patches when asked to and as a full rewrite otherwise."""
+
+    def section(title: str) -> str:
+        return f"## {title}\n" + " ".join(f"word{i}" for i in range(section_words))
+
+    def respond(messages: List[BaseMessage]) -> Any:
+        task_input = str(messages[-1].content)
+        task = task_input.splitlines()[0]
+        topic = re.search(r"topic \d+", task)
+        if not topic:
+            return "# Report\n\n" + section("Introduction")
+        if "<<<APPEND>>>" in task_input:
+            return f"<<<APPEND>>>\n{section(topic.group(0).title())}\n<<<END>>>"
+        draft = _DRAFT_BLOCK.search(task_input)
+        current = draft.group(1).rstrip() if draft else ""
+        return f"{current}\n\n{section(topic.group(0).title())}\n\n"
+
+    return respond
+
+
+async def benchmark_draft_edits(
+    sections: int = 8, section_words: int = 150, ms_per_token: float = 0.5
+) -> Dict[str, Any]:
+    """Compare report steps that rewrite the whole draft with section patches.
+
+    A plan writes an initial draft and then adds ``sections`` sections one
+    step at a time, once with ``draft_section_edits`` off and once on.
+
+    Args:
+        sections: Number of "add a section" steps.
+        section_words: Length of each section.
+        ms_per_token: Fake model latency per generated token.
+
+    Returns:
+        The JSON-serializable report.
+    """
+    from .graph import workflow
+
+    graph = workflow.compile(name="Plan and Execute Agent")
+    variants: Dict[str, Any] = {}
+    drafts = []
+    for name, section_edits in (("full_rewrite", False), ("section_patches", True)):
+        executor = FakeChatModel(responder=_report_writer(section_words), seconds_per_token=ms_per_token / 1000)
+        models = {
+            "planner": FakeChatModel(responder=_report_steps(sections)),
+            "executor": executor,
+            "replanner": FakeChatModel(responder=default_fake_responder("replanner")),
+        }
+        configurable = {
+            "llm_provider": "fake",
+            "cache_backend": "none",
+            "entry_route": "full",
+            "replan_policy": "at_end",
+            "draft_section_edits": section_edits,
+            "draft_section_edits_min_tokens": 0,
+        }
+        with registered_models(models):
+            start = time.perf_counter()
+            state = await graph.ainvoke({"input": "Write a report"}, {"configurable": configurable})
+            seconds = time.perf_counter() - start
+        drafts.append(state["current_draft_report"])
+        variants[name] = {
+            "executor_prompt_tokens": executor.input_tokens,
+            "executor_completion_tokens": executor.output_tokens,
+            "ms_per_step": round(seconds * 1000 / (sections + 1), 3),
+        }
+
+    full, patched = variants["full_rewrite"], variants["section_patches"]
+    return {
+        "benchmark": "draft",
+        "parameters": {"sections": sections, "section_words": section_words, "ms_per_token": ms_per_token},
+        "variants": variants,
+        "completion_token_reduction": round(
+            1 - patched["executor_completion_tokens"] / full["executor_completion_tokens"], 3
+        ),
+        "drafts_match": " ".join(drafts[0].split()) == " ".join(drafts[1].split()),
+    }
+
+
+def _prompt_delta(before: Dict[str, Dict[str, Any]], after: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-call prompt tokens of each node between two ``prompt_snapshot`` results."""
+    nodes = {}
+    for node, stats in sorted(after.items()):
+        previous = before.get(node, {})
+        calls = stats["calls"] - previous.get("calls", 0)
+        if not calls:
+            continue
+        tokens = stats["tokens"] - previous.get("tokens", 0)
+        static_tokens = stats["static_tokens"] - previous.get("static_tokens", 0)
+        nodes[node] = {
+            "calls": calls,
+            "tokens_per_call": round(tokens / calls, 1),
+            "uncached_tokens_per_call": round((tokens - static_tokens) / calls, 1),
+            "static_prefix_share": round(static_tokens / tokens, 3) if tokens else 0.0,
+            "sections_per_call": {
+                name: round((value - previous.get("sections", {}).get(name, 0)) / calls, 1)
+                for name, value in sorted(stats["sections"].items())
+            },
+        }
+    return nodes
+
+
+async def benchmark_prompts(requests: int = 5, searches: int = 3, output_words: int = 80) -> Dict[str, Any]:
+    """Compare prompt tokens per node with the original and the compact prompt layouts.
+
+    Args:
+        requests: Number of graph runs per layout.
+        searches: Number of independent search steps in each plan.
+        output_words: Length of each executor answer.
+
+    Returns:
+        The JSON-serializable report.
+    """
+    variants: Dict[str, Any] = {}
+    for name, compact in (("original", False), ("compact", True)):
+        before = prompt_snapshot()
+        await benchmark_graph(
+            requests=requests,
+            concurrency=1,
+            searches=searches,
+            llm_latency_ms=0.0,
+            search_latency_ms=0.0,
+            output_words=output_words,
+            configurable={"compact_prompts": compact, "prompt_stats": True},
+        )
+        variants[name] = _prompt_delta(before, prompt_snapshot())
+
+    original, compact = variants["original"], variants["compact"]
+
+    def reduction(metric: str) -> Dict[str, float]:
+        return {
+            node: round(1 - compact[node][metric] / stats[metric], 3)
+            for node, stats in original.items()
+            if node in compact and stats[metric]
+        }
+
+    return {
+        "benchmark": "prompts",
+        "parameters": {"requests": requests, "searches": searches, "output_words": output_words},
+        "variants": variants,
+        "token_reduction": reduction("tokens_per_call"),
+        # Tokens outside the byte-stable prefix, which a provider prompt cache cannot reuse
+        "uncached_token_reduction": reduction("uncached_tokens_per_call"),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run a benchmark from the command line and print its JSON report."""
+    parser = argparse.ArgumentParser(prog="python -m agent.benchmark", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="also write the report to this file")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    graph = subparsers.add_parser("graph", help="end-to-end latency, throughput, LLM calls and tokens")
+    graph.add_argument("--requests", type=int, default=20)
+    graph.add_argument("--concurrency", type=int, default=4)
+    graph.add_argument("--searches", type=int, default=3)
+    graph.add_argument("--llm-latency-ms", type=float, default=20.0)
+    graph.add_argument("--ms-per-token", type=float, default=0.0)
+    graph.add_argument("--search-latency-ms", type=float, default=10.0)
+    graph.add_argument("--output-words", type=int, default=80)
+    graph.add_argument("--search-rate", type=float, default=0.0)
+    graph.add_argument("--set", type=parse_setting, action="append", default=[], metavar="KEY=VALUE")
+
+    checkpoint = subparsers.add_parser("checkpoint", help="checkpoint write overhead per superstep")
+    checkpoint.add_argument("--runs", type=int, default=5)
+    checkpoint.add_argument("--steps", type=int, default=8)
+    checkpoint.add_argument("--output-words", type=int, default=300)
+    checkpoint.add_argument("--compress-min-bytes", type=int, default=1024)
+
+    draft = subparsers.add_parser("draft", help="report steps with full rewrites vs section patches")
+    draft.add_argument("--sections", type=int, default=8)
+    draft.add_argument("--section-words", type=int, default=150)
+    draft.add_argument("--ms-per-token", type=float, default=0.5)
+
+    prompts = subparsers.add_parser("prompts", help="prompt tokens per node with original vs compact layouts")
+    prompts.add_argument("--requests", type=int, default=5)
+    prompts.add_argument("--searches", type=int, default=3)
+    prompts.add_argument("--output-words", type=int, default=80)
+    args = parser.parse_args(argv)
+
+    if args.benchmark == "graph":
+        coroutine = benchmark_graph(
+            requests=args.requests,
+            concurrency=args.concurrency,
+            searches=args.searches,
+            llm_latency_ms=args.llm_latency_ms,
+            ms_per_token=args.ms_per_token,
+            search_latency_ms=args.search_latency_ms,
+            output_words=args.output_words,
+            search_rate_per_second=args.search_rate,
+            configurable=dict(args.set),
+        )
+    elif args.benchmark == "draft":
+        coroutine = benchmark_draft_edits(
+            sections=args.sections, section_words=args.section_words, ms_per_token=args.ms_per_token
+        )
+    elif args.benchmark == "prompts":
+        coroutine = benchmark_prompts(
+            requests=args.requests, searches=args.searches, output_words=args.output_words
+        )
+    else:
+        coroutine = benchmark_checkpoint_overhead(
+            runs=args.runs,
+            steps=args.steps,
+            output_words=args.output_words,
+            compress_min_bytes=args.compress_min_bytes,
+        )
+    text = json.dumps(asyncio.run(coroutine), indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
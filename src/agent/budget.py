@@ -0,0 +1,180 @@
+"""Run budgets and loop guards for the plan-execute-replan cycle.
+
+The replanner decides when a run is finished, so a run that never converges
+loops until LangGraph's recursion limit. Every run is checked against these
+limits, read from the configuration (0 disables a limit):
+
+- ``budget_max_steps``: plan steps executed by the run (``past_steps``).
+- ``budget_max_tokens``: prompt and completion tokens over all model calls.
+- ``budget_max_seconds``: wall-clock time since the run started.
+- ``budget_max_search_calls``: search tool calls (each query of a batched
+  search counts as one).
+- ``budget_max_repeated_steps``: planned steps that repeat an already
+  executed step, compared by normalized text (see ``scheduler.py``). A
+  replanner proposing finished steps over and over makes no progress.
+
+Usage is metered by wrapping each graph node with ``metered``. It attaches a
+``UsageCounter`` callback and adds the node's tokens and search calls to
+``budget_usage`` in the state. The router resets the usage with
+``start_run`` when a run starts, so a run on a checkpointed thread is not
+charged for the tokens, time and steps of the thread's earlier runs. The checks run on the edges after the planner,
+the scheduler and the replanner. When a budget is exhausted, the run goes to
+the ``finalize`` node instead of looping again. ``finalize`` makes no model
+call: it answers with the current draft, or else the last useful step
+output, and records the exhausted budget in ``budget_stop``.
+"""
+import functools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+
+from .configuration import Configuration
+from .instrumentation import llm_token_usage
+from .replan_policy import looks_like_failure
+from .search import BATCH_SEARCH_TOOL_NAME, SEARCH_TOOL_NAME
+from .state import PlanExecute
+from .streaming import get_writer, response_event
+
+
+class UsageCounter(BaseCallbackHandler):
+    """Sums the model tokens and search tool calls of one run."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        """Create a counter with nothing counted yet."""
+        self.tokens = 0
+        self.search_calls = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        """Add the tokens reported for a finished model call."""
+        self.tokens += sum(llm_token_usage(response))
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        """Count the queries of a search tool call."""
+        name = (serialized or {}).get("name")
+        if name == SEARCH_TOOL_NAME:
+            self.search_calls += 1
+        elif name == BATCH_SEARCH_TOOL_NAME:
+            # Every query of a batch counts as one search call
+            inputs = kwargs.get("inputs")
+            queries = inputs.get("queries") if isinstance(inputs, dict) else None
+            self.search_calls += len(queries) if isinstance(queries, list) else 1
+
+
+Node = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+def metered(node: Node) -> Node:
+    """Wrap a graph node so its model tokens and search calls count towards the budget.
+
+    Args:
+        node: An async node taking the state and the runnable config.
+
+    Returns:
+        The wrapped node; its update also sets ``budget_usage``.
+    """
+
+    @functools.wraps(node)
+    async def run(state: PlanExecute, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        counter = UsageCounter()
+        started_at = time.time()
+        update = await node(state, merge_configs(config, {"callbacks": [counter]})) or {}
+        # A node starting a run (the router) replaces the usage of earlier runs
+        usage = dict(update.get("budget_usage") or state.get("budget_usage") or {})
+        usage.setdefault("started_at", started_at)
+        usage["tokens"] = usage.get("tokens", 0) + counter.tokens
+        usage["search_calls"] = usage.get("search_calls", 0) + counter.search_calls
+        return {**update, "budget_usage": usage}
+
+    return run
+
+
+def start_run(state: PlanExecute) -> Dict[str, Any]:
+    """Return the state update starting the budgets of a new run.
+
+    Steps already in ``past_steps`` belong to earlier runs on the thread and
+    are not counted.
+    """
+    return {
+        "budget_usage": {
+            "started_at": time.time(),
+            "tokens": 0,
+            "search_calls": 0,
+            "first_step": len(state.get("past_steps") or []),
+        },
+        "repeated_steps": 0,
+    }
+
+
+def run_steps(state: PlanExecute) -> List[Tuple[Any, ...]]:
+    """Return the steps executed by the current run."""
+    first_step = int((state.get("budget_usage") or {}).get("first_step", 0))
+    return list(state.get("past_steps") or [])[first_step:]
+
+
+def budget_exhausted(state: PlanExecute, config: Optional[RunnableConfig] = None) -> Optional[str]:
+    """Check the run against its budgets.
+
+    Args:
+        state: The current agent state.
+        config: The runnable config holding the limits.
+
+    Returns:
+        A description of the first exhausted budget, or None if the run may continue.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    usage = state.get("budget_usage") or {}
+    steps = len(run_steps(state))
+    elapsed = time.time() - usage.get("started_at", time.time())
+    checks = (
+        ("steps", steps, configuration.budget_max_steps),
+        ("tokens", usage.get("tokens", 0), configuration.budget_max_tokens),
+        ("seconds", elapsed, configuration.budget_max_seconds),
+        ("search calls", usage.get("search_calls", 0), configuration.budget_max_search_calls),
+        ("repeated steps", state.get("repeated_steps", 0), configuration.budget_max_repeated_steps),
+    )
+    for name, used, limit in checks:
+        if limit and used >= limit:
+            return f"{name} budget exhausted ({used:g} of {limit:g})"
+    return None
+
+
+def remaining_steps(state: PlanExecute, config: Optional[RunnableConfig] = None) -> Optional[int]:
+    """Return how many more steps the run may execute, or None if steps are unlimited."""
+    limit = Configuration.from_runnable_config(config).budget_max_steps
+    if not limit:
+        return None
+    return max(0, limit - len(run_steps(state)))
+
+
+def best_available_response(state: PlanExecute, reason: str) -> str:
+    """Return the best answer available without another model call.
+
+    Args:
+        state: The current agent state.
+        reason: Why the run is being finalized.
+
+    Returns:
+        The current draft if there is one, otherwise the output of the last
+        step that did not fail, otherwise a short note naming ``reason``.
+    """
+    draft = state.get("current_draft_report")
+    if draft and draft.strip():
+        return draft
+    for _, output in reversed(run_steps(state)):
+        if not looks_like_failure(str(output)):
+            return str(output)
+    return f"The run stopped before an answer was ready: {reason}."
+
+
+async def finalize_step(state: PlanExecute, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """Finish a run whose budget is exhausted with the best available answer."""
+    reason = budget_exhausted(state, config) or "budget exhausted"
+    response = best_available_response(state, reason)
+    get_writer()(response_event(response, node="finalize"))
+    return {"response": response, "budget_stop": reason, "plan": [], "plan_dependencies": []}
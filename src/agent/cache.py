@@ -0,0 +1,514 @@
+"""Cache for the planner and replanner structured outputs.
+
+Both chains run at temperature 0 on fully deterministic inputs, so repeated
+objectives can reuse an earlier plan. The cache has two tiers:
+
+1. Exact match: a SHA-256 hash of the normalized prompt variables. Strings
+   are case-folded and whitespace-collapsed, the wall-clock time is ignored
+   and the date is bucketed (day, week or month) so that time context alone
+   does not defeat caching.
+2. Semantic match (optional): when an ``Embeddings`` model is supplied, a
+   near-duplicate objective with the same remaining variables can reuse a
+   cached entry if the cosine similarity exceeds a threshold.
+
+Entries expire after a TTL and the least recently used entries are evicted
+once the backend is full. ``InMemoryCacheBackend`` and ``SQLiteCacheBackend``
+are provided; any object implementing ``CacheBackend`` can be plugged in with
+``set_structured_output_cache``.
+"""
+import asyncio
+import datetime
+import hashlib
+import json
+import math
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Protocol, Tuple, Type, TypeVar
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel
+
+from .configuration import Configuration
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Prompt variables that only carry wall-clock time and never affect the plan
+_IGNORED_FIELDS = ("current_utc_time",)
+# Prompt variables holding the current date, replaced by the date bucket
+_DATE_FIELDS = ("current_utc_date",)
+DATE_BUCKETS = ("day", "week", "month")
+
+
+class CacheBackend(Protocol):
+    """Key-value storage with TTL expiry and LRU eviction.
+
+    Backends doing blocking I/O set a ``blocking`` attribute to True; the
+    structured output cache then calls them in a worker thread.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the value stored under ``key``, or None if missing or expired."""
+        ...
+
+    def set(self, key: str, value: Any) -> None:
+        """Store ``value`` under ``key``."""
+        ...
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        ...
+
+
+class InMemoryCacheBackend:
+    """Process-local LRU cache with per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400) -> None:
+        """Create an empty cache holding at most ``max_entries`` for ``ttl_seconds`` each."""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the value stored under ``key``, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store ``value`` under ``key``, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        """Return the number of stored entries, expired ones included."""
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """SQLite-backed LRU cache with per-entry TTL, shared across processes."""
+
+    # Queries block, so async callers run them in a worker thread
+    blocking = True
+
+    def __init__(
+        self, path: str, max_entries: int = 1024, ttl_seconds: float = 86400
+    ) -> None:
+        """Open (or create) the cache table in the SQLite database at ``path``."""
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._lock = threading.Lock()
+        import sqlite3
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)"
+            )
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the value stored under ``key``, or None if missing or expired."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        """Store ``value`` under ``key``, evicting expired and least recently used entries."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl_seconds, now),
+            )
+            self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+            overflow = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN"
+                    " (SELECT key FROM cache ORDER BY last_access LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+
+@dataclass
+class CacheStats:
+    """Hit and miss counters for one cache namespace."""
+
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    # Lookups that joined an identical call already in flight
+    coalesced: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups served without a new chain call."""
+        hits = self.exact_hits + self.semantic_hits + self.coalesced
+        lookups = hits + self.misses
+        return hits / lookups if lookups else 0.0
+
+
+def _bucket_date(value: str, bucket: str) -> str:
+    """Map a YYYY-MM-DD date onto the start of its day, ISO week or month."""
+    try:
+        date = datetime.date.fromisoformat(value)
+    except ValueError:
+        return value
+    if bucket == "week":
+        year, week, _ = date.isocalendar()
+        return f"{year}-W{week:02d}"
+    if bucket == "month":
+        return date.strftime("%Y-%m")
+    return date.isoformat()
+
+
+def _normalize(value: Any) -> Any:
+    """Normalize a prompt variable into a JSON-serializable, canonical form."""
+    if isinstance(value, BaseMessage):
+        return [value.type, _normalize(value.content)]
+    if isinstance(value, BaseModel):
+        return _normalize(value.model_dump())
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class StructuredOutputCache:
+    """Two-tier cache in front of chains returning pydantic models."""
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        *,
+        date_bucket: str = "day",
+        embeddings: Optional[Embeddings] = None,
+        similarity_threshold: float = 0.95,
+        max_semantic_entries: int = 1024,
+    ) -> None:
+        """Create the cache.
+
+        Args:
+            backend: Exact-match store; an in-memory LRU by default.
+            date_bucket: Granularity of the date in the keys: day, week or month.
+            embeddings: Embeds the objective for the similarity tier; None disables it.
+            similarity_threshold: Minimum cosine similarity for a similarity hit.
+            max_semantic_entries: Maximum number of embeddings kept for the similarity tier.
+        """
+        if date_bucket not in DATE_BUCKETS:
+            raise ValueError(
+                f"Unknown date_bucket {date_bucket!r}; expected one of {DATE_BUCKETS}"
+            )
+        self.backend: CacheBackend = backend or InMemoryCacheBackend()
+        self.date_bucket = date_bucket
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_semantic_entries = max_semantic_entries
+        self.stats: Dict[str, CacheStats] = {}
+        # (namespace, context key) -> list of (embedding, exact key)
+        self._semantic_index: OrderedDict[Tuple[str, str], List[Tuple[List[float], str]]] = OrderedDict()
+        self._semantic_size = 0
+        # Identical calls in flight, per event loop, keyed by exact key
+        self._inflight: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Task[Any]]] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def make_key(self, namespace: str, variables: Dict[str, Any], model: str = "") -> str:
+        """Compute the exact-match key for a set of prompt variables.
+
+        Args:
+            namespace: Name of the cached chain (e.g. "planner").
+            variables: The chain input variables.
+            model: Identity of the model producing the output.
+
+        Returns:
+            A hex digest identifying the normalized variables.
+        """
+        normalized = {}
+        for name, value in variables.items():
+            if name in _IGNORED_FIELDS:
+                continue
+            if name in _DATE_FIELDS and isinstance(value, str):
+                normalized[name] = _bucket_date(value, self.date_bucket)
+            else:
+                normalized[name] = _normalize(value)
+        payload = json.dumps([namespace, model, normalized], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def stats_for(self, namespace: str) -> CacheStats:
+        """Return the counters of ``namespace``, creating them if needed."""
+        return self.stats.setdefault(namespace, CacheStats())
+
+    def stats_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return the counters of every namespace as plain dictionaries."""
+        return {
+            namespace: {**asdict(stats), "hit_rate": stats.hit_rate}
+            for namespace, stats in self.stats.items()
+        }
+
+    async def _backend_get(self, key: str) -> Optional[Any]:
+        if getattr(self.backend, "blocking", False):
+            return await asyncio.to_thread(self.backend.get, key)
+        return self.backend.get(key)
+
+    async def _backend_set(self, key: str, value: Any) -> None:
+        if getattr(self.backend, "blocking", False):
+            await asyncio.to_thread(self.backend.set, key, value)
+        else:
+            self.backend.set(key, value)
+
+    async def _semantic_lookup(
+        self, embeddings: Embeddings, namespace: str, context_key: str, text: str
+    ) -> Tuple[List[float], Optional[str]]:
+        """Embed ``text`` and return the embedding and the closest cached key, if any."""
+        embedding = await embeddings.aembed_query(text)
+        best_key, best_score = None, self.similarity_threshold
+        for candidate, key in self._semantic_index.get((namespace, context_key), []):
+            score = _cosine(embedding, candidate)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return embedding, best_key
+
+    def _semantic_add(
+        self, namespace: str, context_key: str, embedding: List[float], key: str
+    ) -> None:
+        index_key = (namespace, context_key)
+        self._semantic_index.setdefault(index_key, []).append((embedding, key))
+        self._semantic_index.move_to_end(index_key)
+        self._semantic_size += 1
+        while self._semantic_size > self.max_semantic_entries:
+            _, evicted = self._semantic_index.popitem(last=False)
+            self._semantic_size -= len(evicted)
+
+    async def ainvoke(
+        self,
+        namespace: str,
+        chain: Runnable[Dict[str, Any], Any],
+        variables: Dict[str, Any],
+        schema: Type[ModelT],
+        *,
+        semantic_field: Optional[str] = None,
+        config: Optional[RunnableConfig] = None,
+        model: str = "",
+    ) -> ModelT:
+        """Return the cached output for ``variables`` or invoke ``chain`` and cache it.
+
+        Concurrent calls with the same exact key share a single chain call.
+
+        Args:
+            namespace: Name of the cached chain (e.g. "planner").
+            chain: Runnable producing an instance of ``schema``.
+            variables: The chain input variables.
+            schema: The pydantic model returned by ``chain``.
+            semantic_field: Variable holding the objective used by the
+                similarity tier; other variables must match exactly.
+            config: Optional runnable config forwarded to ``chain``.
+            model: Identity of the model behind ``chain``; outputs are only
+                reused for the same model.
+
+        Returns:
+            The structured output.
+        """
+        stats = self.stats_for(namespace)
+        key = self.make_key(namespace, variables, model)
+        cached = await self._backend_get(key)
+        if cached is not None:
+            stats.exact_hits += 1
+            return schema.model_validate(cached)
+
+        embedding: Optional[List[float]] = None
+        context_key = ""
+        if self.embeddings is not None and semantic_field is not None and semantic_field in variables:
+            context = {k: v for k, v in variables.items() if k != semantic_field}
+            context_key = self.make_key(namespace, context, model)
+            text = json.dumps(_normalize(variables[semantic_field]), default=str)
+            embedding, similar_key = await self._semantic_lookup(self.embeddings, namespace, context_key, text)
+            cached = await self._backend_get(similar_key) if similar_key else None
+            if cached is not None:
+                stats.semantic_hits += 1
+                return schema.model_validate(cached)
+
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        task = inflight.get(key)
+        if task is not None:
+            # An identical call is already running (e.g. overlapping batch inputs).
+            stats.coalesced += 1
+            shared: ModelT = await asyncio.shield(task)
+            return shared
+
+        async def _call() -> ModelT:
+            result: ModelT = await chain.ainvoke(variables, config=config)
+            await self._backend_set(key, result.model_dump(mode="json"))
+            if embedding is not None:
+                self._semantic_add(namespace, context_key, embedding, key)
+            return result
+
+        stats.misses += 1
+        task = asyncio.ensure_future(_call())
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+        # Shield the shared call so one cancelled caller does not cancel the others
+        result: ModelT = await asyncio.shield(task)
+        return result
+
+
+_cache: Optional[StructuredOutputCache] = None
+_cache_settings: Optional[Tuple[Any, ...]] = None
+
+
+def set_structured_output_cache(cache: Optional[StructuredOutputCache]) -> None:
+    """Install a custom cache, e.g. one with an embeddings model for the semantic tier.
+
+    Args:
+        cache: The cache to use, or None to rebuild it from the configuration.
+    """
+    global _cache, _cache_settings
+    _cache = cache
+    _cache_settings = None if cache is None else ("custom",)
+
+
+def get_structured_output_cache(
+    config: Optional[RunnableConfig] = None,
+) -> Optional[StructuredOutputCache]:
+    """Return the process-wide structured output cache.
+
+    The cache is built from the ``cache_*`` configuration fields on first use
+    and rebuilt if they change. A cache installed with
+    ``set_structured_output_cache`` always takes precedence.
+
+    Args:
+        config: The runnable config of the current node, if any.
+
+    Returns:
+        The cache, or None when ``cache_backend`` is "none".
+    """
+    global _cache, _cache_settings
+    if _cache_settings == ("custom",):
+        return _cache
+
+    configuration = Configuration.from_runnable_config(config)
+    settings = (
+        configuration.cache_backend,
+        configuration.cache_path,
+        configuration.cache_ttl_seconds,
+        configuration.cache_max_entries,
+        configuration.cache_date_bucket,
+    )
+    if settings == _cache_settings:
+        return _cache
+
+    backend_name, path, ttl_seconds, max_entries, date_bucket = settings
+    if backend_name == "none":
+        _cache = None
+    elif backend_name == "memory":
+        _cache = StructuredOutputCache(
+            InMemoryCacheBackend(max_entries, ttl_seconds), date_bucket=date_bucket
+        )
+    elif backend_name == "sqlite":
+        _cache = StructuredOutputCache(
+            SQLiteCacheBackend(path, max_entries, ttl_seconds), date_bucket=date_bucket
+        )
+    else:
+        raise ValueError(
+            f"Unknown cache_backend {backend_name!r}; expected none, memory or sqlite"
+        )
+    _cache_settings = settings
+    return _cache
+
+
+async def cached_ainvoke(
+    namespace: str,
+    chain: Runnable[Dict[str, Any], Any],
+    variables: Dict[str, Any],
+    schema: Type[ModelT],
+    config: Optional[RunnableConfig] = None,
+    *,
+    semantic_field: Optional[str] = None,
+    role: Optional[str] = None,
+) -> ModelT:
+    """Invoke ``chain`` through the configured cache, or directly if caching is off.
+
+    Args:
+        namespace: Name of the cached chain (e.g. "planner").
+        chain: Runnable producing an instance of ``schema``.
+        variables: The chain input variables.
+        schema: The pydantic model returned by ``chain``.
+        config: The runnable config of the current node, if any.
+        semantic_field: Variable holding the objective for the similarity tier.
+        role: Role whose model runs ``chain``; its provider and deployment are
+            part of the cache key.
+
+    Returns:
+        The structured output.
+    """
+    cache = get_structured_output_cache(config)
+    if cache is None:
+        result: ModelT = await chain.ainvoke(variables, config=config)
+        return result
+    from .llm_config import model_identity
+
+    return await cache.ainvoke(
+        namespace,
+        chain,
+        variables,
+        schema,
+        semantic_field=semantic_field,
+        config=config,
+        model=model_identity(role, config) if role else "",
+    )
@@ -0,0 +1,155 @@
+"""Checkpointer selection and resumable runs.
+
+With a checkpointer the graph saves its state after every superstep, so a
+run that crashes or times out can be resumed from the last completed step
+with ``aresume`` instead of starting over. The backend is chosen by the
+``checkpoint_backend`` configuration field (or ``AGENT_CHECKPOINT_BACKEND``):
+
+- "none": no checkpointer (the default; LangGraph Platform injects its own).
+- "memory": ``InMemorySaver``, for a single long-lived process.
+- "sqlite": ``AsyncSqliteSaver`` on ``checkpoint_path``; requires the
+  ``langgraph-checkpoint-sqlite`` package (``pip install agent[sqlite]``).
+- "package.module:attribute": a ``BaseCheckpointSaver`` instance, or a
+  callable taking the ``Configuration`` and returning one.
+
+Checkpoint values above ``checkpoint_compress_min_bytes`` are stored
+zlib-compressed, which keeps the growing ``past_steps`` and draft cheap to
+write on every superstep.
+"""
+import importlib
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from .configuration import Configuration
+
+COMPRESSED_SUFFIX = "+zlib"
+
+
+class CompressedSerializer(SerializerProtocol):
+    """Serializer that zlib-compresses large payloads of another serializer."""
+
+    def __init__(
+        self, serde: Optional[SerializerProtocol] = None, min_bytes: int = 1024, level: int = 6
+    ) -> None:
+        """Wrap ``serde``, compressing payloads of at least ``min_bytes`` at zlib ``level``."""
+        self.serde = serde or JsonPlusSerializer()
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        """Serialize ``obj``, compressing the bytes when they are large enough."""
+        typ, data = self.serde.dumps_typed(obj)
+        if self.min_bytes <= 0 or len(data) < self.min_bytes:
+            return typ, data
+        compressed = zlib.compress(data, self.level)
+        if len(compressed) >= len(data):
+            return typ, data
+        return f"{typ}{COMPRESSED_SUFFIX}", compressed
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        """Deserialize a value written by ``dumps_typed``."""
+        typ, payload = data
+        if typ.endswith(COMPRESSED_SUFFIX):
+            typ, payload = typ[: -len(COMPRESSED_SUFFIX)], zlib.decompress(payload)
+        return self.serde.loads_typed((typ, payload))
+
+
+def _load_custom(spec: str, configuration: Configuration) -> BaseCheckpointSaver[Any]:
+    module_name, _, attribute = spec.partition(":")
+    try:
+        target = getattr(importlib.import_module(module_name), attribute)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"Cannot load checkpoint_backend {spec!r}: {e}") from e
+    saver = target if isinstance(target, BaseCheckpointSaver) else target(configuration)
+    if not isinstance(saver, BaseCheckpointSaver):
+        raise ValueError(f"checkpoint_backend {spec!r} did not produce a BaseCheckpointSaver")
+    return saver
+
+
+def get_checkpointer(
+    config: Optional[RunnableConfig] = None,
+) -> Optional[BaseCheckpointSaver[Any]]:
+    """Build the checkpointer selected by the configuration.
+
+    Args:
+        config: Optional runnable config; the environment is used otherwise.
+
+    Returns:
+        The checkpointer, or None when ``checkpoint_backend`` is "none".
+
+    Raises:
+        ValueError: If the backend is unknown or cannot be loaded.
+        ImportError: If the sqlite backend's package is not installed.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    backend = configuration.checkpoint_backend
+    serde = CompressedSerializer(min_bytes=configuration.checkpoint_compress_min_bytes)
+
+    if backend == "none":
+        return None
+    if backend == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        return InMemorySaver(serde=serde)
+    if backend == "sqlite":
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            raise ImportError(
+                "The sqlite checkpointer requires langgraph-checkpoint-sqlite. "
+                "Install it with `pip install langgraph-checkpoint-sqlite`."
+            ) from e
+        # The connection opens on first use, inside the running event loop.
+        connection = aiosqlite.connect(configuration.checkpoint_path)
+        saver: BaseCheckpointSaver[Any] = AsyncSqliteSaver(connection, serde=serde)
+        return saver
+    if ":" in backend:
+        return _load_custom(backend, configuration)
+    raise ValueError(
+        f"Unknown checkpoint_backend {backend!r}; expected none, memory, sqlite "
+        "or 'package.module:factory'"
+    )
+
+
+def thread_config(thread_id: str, config: Optional[RunnableConfig] = None) -> RunnableConfig:
+    """Return ``config`` with ``thread_id`` set in its configurable section."""
+    return merge_configs(config, {"configurable": {"thread_id": thread_id}})
+
+
+async def aresume(
+    graph: Any, thread_id: str, config: Optional[RunnableConfig] = None
+) -> Dict[str, Any]:
+    """Continue the run of ``thread_id`` from its last checkpoint.
+
+    Supersteps that completed before the interruption are not re-run; only
+    the interrupted one is. Invoking the thread again with a new input also
+    keeps its ``past_steps``, and the scheduler reuses the output of any
+    planned step that already ran instead of executing it again.
+
+    Args:
+        graph: A graph compiled with a checkpointer.
+        thread_id: The thread of the interrupted run.
+        config: Optional runnable config for the resumed run.
+
+    Returns:
+        The final state values. A run that already finished is returned as is.
+
+    Raises:
+        ValueError: If the thread has no checkpoint.
+    """
+    run_config = thread_config(thread_id, config)
+    snapshot = await graph.aget_state(run_config)
+    if not snapshot.values:
+        raise ValueError(f"No checkpoint found for thread {thread_id!r}")
+    values: Dict[str, Any] = snapshot.values
+    if not snapshot.next:
+        return values
+    values = await graph.ainvoke(None, run_config)
+    return values
@@ -0,0 +1,622 @@
+"""Single-flight coalescing of identical graph runs.
+
+When the same question arrives from many callers at once, each caller would
+run the whole graph. ``CoalescingGraph`` wraps the compiled graph so that
+identical runs share one execution:
+
+- The key is the objective (case-folded, whitespace collapsed), the
+  current UTC date, bucketed by ``coalesce_date_bucket`` as in the planner
+  cache, and the configuration fields that can change the answer (models,
+  provider, entry route, budgets, ...). Runs with different settings are
+  never shared.
+- The first caller starts the run. Callers arriving while it is in flight
+  attach to it: they receive every custom stream event (already emitted
+  events are replayed first) and the same final state.
+- A finished run is reused for ``coalesce_ttl_seconds``. Later callers get
+  its events and final state without running the graph again. Failed runs
+  are not reused.
+
+Two modes (``coalesce_backend``):
+
+- ``memory``: in-flight runs and results are shared within the process.
+- ``sqlite``: also shared across processes through ``coalesce_path``. The
+  process that claims a key runs the graph and writes its events and
+  result to the database, renewing a lease while it runs. Other processes
+  poll for them. If the lease expires (the owner died), a waiting process
+  takes the run over; its events are then streamed again from the start
+  of the new execution.
+
+Coalesced runs are treated as stateless. Only the first caller's config
+(thread id, callbacks) is used, so followers get no checkpoint of their own.
+Nodes and their caches are unchanged.
+"""
+import asyncio
+import copy
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from dataclasses import asdict, dataclass, fields
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from langchain_core.runnables import RunnableConfig
+
+from .cache import DATE_BUCKETS, InMemoryCacheBackend, _bucket_date
+from .configuration import Configuration
+from .streaming import StreamEvent
+
+EventCallback = Callable[[StreamEvent], None]
+Publish = Callable[[StreamEvent], Awaitable[None]]
+Execute = Callable[[Publish], Awaitable[Dict[str, Any]]]
+
+COALESCE_BACKENDS = ("none", "memory", "sqlite")
+
+# Configuration fields that only change how a run executes, not its answer.
+# Every other field is part of the coalescing key, so new fields are safe by default.
+_EXECUTION_ONLY_PREFIXES = ("coalesce_", "cache_", "checkpoint_", "trace_", "batch_", "llm_http_", "fake_")
+_EXECUTION_ONLY_FIELDS = frozenset(
+    {
+        "max_concurrency",
+        "planner_max_concurrency",
+        "executor_max_concurrency",
+        "replanner_max_concurrency",
+        "llm_timeout_seconds",
+        "prompt_stats",
+        "instrumentation",
+        "search_cache_ttl_seconds",
+        "search_cache_max_entries",
+        "search_rate_per_second",
+        "search_burst",
+        "search_max_concurrency",
+        "search_batch_concurrency",
+    }
+)
+
+
+def run_settings(config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """Return the configuration fields of a run that can change its answer.
+
+    Args:
+        config: The runnable config of the run.
+
+    Returns:
+        The fields by name, e.g. the models, ``entry_route`` and the budgets.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    return {
+        f.name: getattr(configuration, f.name)
+        for f in fields(configuration)
+        if f.name not in _EXECUTION_ONLY_FIELDS and not f.name.startswith(_EXECUTION_ONLY_PREFIXES)
+    }
+
+
+def coalesce_key(
+    objective: str, date: str, date_bucket: str = "day", settings: Optional[Dict[str, Any]] = None
+) -> str:
+    """Return the coalescing key of a run.
+
+    Args:
+        objective: The run input.
+        date: The current UTC date (YYYY-MM-DD).
+        date_bucket: Granularity of the date: day, week or month.
+        settings: The configuration fields that can change the answer, see ``run_settings``.
+
+    Returns:
+        A hex digest of the normalized objective, the date bucket and the settings.
+    """
+    payload = json.dumps(
+        [" ".join(objective.split()).casefold(), _bucket_date(date, date_bucket), settings or {}],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CoalescingStats:
+    """How the runs submitted to a single-flight store were served."""
+
+    # Runs that executed the graph
+    executions: int = 0
+    # Runs that attached to an execution in flight (in this or another process)
+    joined: int = 0
+    # Runs answered from a finished execution within the TTL
+    result_hits: int = 0
+    failures: int = 0
+
+
+class _Flight:
+    """One execution shared by every caller in this process with the same key."""
+
+    def __init__(self) -> None:
+        self.events: List[StreamEvent] = []
+        self.state: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+        self.finished = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: StreamEvent) -> None:
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def finish(self, state: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None) -> None:
+        async with self._changed:
+            self.state, self.error, self.finished = state, error, True
+            self._changed.notify_all()
+
+    async def follow(self, on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
+        """Deliver every event of the flight, then return its final state."""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.finished or len(self.events) > index)
+                new, finished = self.events[index:], self.finished
+            index += len(new)
+            if on_event is not None:
+                for event in new:
+                    on_event(event)
+            if finished:
+                break
+        if self.error is not None:
+            raise self.error
+        return copy.deepcopy(self.state or {})
+
+
+class InMemorySingleFlight:
+    """Shares in-flight runs and, for ``ttl_seconds``, finished runs within the process."""
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 1024) -> None:
+        """Create an empty store keeping finished runs for ``ttl_seconds``."""
+        self.ttl_seconds = ttl_seconds
+        self.stats = CoalescingStats()
+        self._results = InMemoryCacheBackend(max_entries, ttl_seconds)
+        # Runs in flight, per event loop, keyed by coalescing key
+        self._flights: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _Flight]] = (
+            weakref.WeakKeyDictionary()
+        )
+        # The event loop only keeps weak references to tasks, so running executions are held here
+        self._tasks: Set[asyncio.Future[None]] = set()
+
+    async def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._results.get(key) if self.ttl_seconds > 0 else None
+
+    def _store(self, key: str, state: Dict[str, Any], events: List[StreamEvent]) -> None:
+        if self.ttl_seconds > 0:
+            self._results.set(key, {"state": copy.deepcopy(state), "events": list(events)})
+
+    async def _produce(self, key: str, execute: Execute) -> Callable[[_Flight], Awaitable[Dict[str, Any]]]:
+        """Return the coroutine function that fills a new local flight."""
+        self.stats.executions += 1
+
+        async def produce(flight: _Flight) -> Dict[str, Any]:
+            state = await execute(flight.publish)
+            self._store(key, state, flight.events)
+            return state
+
+        return produce
+
+    async def run(self, key: str, execute: Execute, on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
+        """Run ``execute`` once for every concurrent caller with the same ``key``.
+
+        Args:
+            key: The coalescing key.
+            execute: Runs the graph, awaiting ``publish`` with each stream
+                event, and returns the final state.
+            on_event: Called with every stream event of the shared run.
+
+        Returns:
+            A copy of the final state of the shared run.
+        """
+        cached = await self._lookup(key)
+        if cached is not None:
+            self.stats.result_hits += 1
+            if on_event is not None:
+                for event in cached["events"]:
+                    on_event(event)
+            return copy.deepcopy(cached["state"])
+
+        flights = self._flights.setdefault(asyncio.get_running_loop(), {})
+        flight = flights.get(key)
+        if flight is None:
+            flight = flights[key] = _Flight()
+
+            async def _run() -> None:
+                try:
+                    produce = await self._produce(key, execute)
+                    await flight.finish(state=await produce(flight))
+                except BaseException as e:
+                    self.stats.failures += 1
+                    await flight.finish(error=e)
+                finally:
+                    flights.pop(key, None)
+
+            # The execution is not tied to any caller, so one cancelled caller does not stop the others
+            task = asyncio.ensure_future(_run())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.stats.joined += 1
+        return await flight.follow(on_event)
+
+
+class SQLiteFlightStore:
+    """Run claims, events and results in a SQLite database shared by processes.
+
+    Its methods block on the database; ``SQLiteSingleFlight`` calls them in a
+    worker thread so the event loop keeps running.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Create a store backed by the SQLite database at ``path``."""
+        self.path = path
+        self._lock = threading.Lock()
+        import sqlite3
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS flights ("
+                " key TEXT PRIMARY KEY, owner TEXT NOT NULL, status TEXT NOT NULL,"
+                " state TEXT, error TEXT, lease_expires REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS flight_events ("
+                " key TEXT NOT NULL, owner TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL,"
+                " PRIMARY KEY (key, owner, seq))"
+            )
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the unexpired result of ``key`` with its events, if any."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT owner, state FROM flights WHERE key = ? AND status = 'done' AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                return None
+            events = self._conn.execute(
+                "SELECT event FROM flight_events WHERE key = ? AND owner = ? ORDER BY seq", (key, row[0])
+            ).fetchall()
+        return {"state": json.loads(row[1]), "events": [json.loads(e[0]) for e in events]}
+
+    def claim(self, key: str, owner: str, lease_seconds: float) -> bool:
+        """Try to become the process running ``key``.
+
+        Expired results, failed runs and runs whose lease expired are removed
+        first.
+
+        Returns:
+            Whether ``owner`` now holds the run.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            removed = self._conn.execute(
+                "DELETE FROM flights WHERE key = ? AND ("
+                " (status = 'running' AND lease_expires < ?) OR (status = 'done' AND expires_at < ?)"
+                " OR status = 'error')",
+                (key, now, now),
+            ).rowcount
+            if removed:
+                self._conn.execute("DELETE FROM flight_events WHERE key = ?", (key,))
+            self._conn.execute(
+                "INSERT OR IGNORE INTO flights (key, owner, status, lease_expires, expires_at)"
+                " VALUES (?, ?, 'running', ?, 0)",
+                (key, owner, now + lease_seconds),
+            )
+            row = self._conn.execute("SELECT owner FROM flights WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] == owner
+
+    def append(self, key: str, owner: str, first_seq: int, events: List[StreamEvent], lease_seconds: float) -> None:
+        """Store ``events`` of the run and renew its lease."""
+        with self._lock, self._conn:
+            if events:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO flight_events (key, owner, seq, event) VALUES (?, ?, ?, ?)",
+                    [(key, owner, first_seq + i, json.dumps(e, default=str)) for i, e in enumerate(events)],
+                )
+            self._conn.execute(
+                "UPDATE flights SET lease_expires = ? WHERE key = ? AND owner = ?",
+                (time.time() + lease_seconds, key, owner),
+            )
+
+    def finish(
+        self, key: str, owner: str, ttl_seconds: float, state: Optional[Dict[str, Any]] = None, error: str = ""
+    ) -> None:
+        """Record the final state of the run, or its error."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE flights SET status = ?, state = ?, error = ?, expires_at = ? WHERE key = ? AND owner = ?",
+                (
+                    "error" if error else "done",
+                    None if error else json.dumps(state, default=str),
+                    error or None,
+                    time.time() + ttl_seconds,
+                    key,
+                    owner,
+                ),
+            )
+
+    def poll(self, key: str, owner: str, after_seq: int) -> Tuple[Optional[Tuple[Any, ...]], List[Tuple[int, Any]]]:
+        """Return the run row of ``key`` and the events of ``owner`` after ``after_seq``.
+
+        The row is (owner, status, state, error, lease_expires), or None if
+        the run is gone.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT owner, status, state, error, lease_expires FROM flights WHERE key = ?", (key,)
+            ).fetchone()
+            events = self._conn.execute(
+                "SELECT seq, event FROM flight_events WHERE key = ? AND owner = ? AND seq > ? ORDER BY seq",
+                (key, owner, after_seq),
+            ).fetchall()
+        return row, [(seq, json.loads(event)) for seq, event in events]
+
+
+class SQLiteSingleFlight(InMemorySingleFlight):
+    """Shares in-flight and finished runs across processes through a SQLite database."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 60.0,
+        lease_seconds: float = 30.0,
+        poll_seconds: float = 0.05,
+    ) -> None:
+        """Create a store sharing runs through the SQLite database at ``path``."""
+        super().__init__(ttl_seconds)
+        self.store = SQLiteFlightStore(path)
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+
+    async def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.lookup, key) if self.ttl_seconds > 0 else None
+
+    def _store(self, key: str, state: Dict[str, Any], events: List[StreamEvent]) -> None:
+        # Results are written by the process that ran the graph, see _execute
+        pass
+
+    async def _produce(self, key: str, execute: Execute) -> Callable[[_Flight], Awaitable[Dict[str, Any]]]:
+        owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        if await asyncio.to_thread(self.store.claim, key, owner, self.lease_seconds):
+            self.stats.executions += 1
+            return lambda flight: self._execute(key, owner, execute, flight)
+        self.stats.joined += 1
+        return lambda flight: self._follow(key, execute, flight)
+
+    async def _execute(self, key: str, owner: str, execute: Execute, flight: _Flight) -> Dict[str, Any]:
+        """Run the graph, writing its events and result for other processes."""
+        pending: List[StreamEvent] = []
+        written = 0
+        last_write = time.monotonic()
+
+        async def flush() -> None:
+            nonlocal written, last_write
+            # Take the batch first: publish and the heartbeat may flush concurrently
+            batch, first_seq = list(pending), written + 1
+            pending.clear()
+            written += len(batch)
+            last_write = time.monotonic()
+            await asyncio.to_thread(self.store.append, key, owner, first_seq, batch, self.lease_seconds)
+
+        async def publish(event: StreamEvent) -> None:
+            await flight.publish(event)
+            pending.append(event)
+            if time.monotonic() - last_write >= self.poll_seconds:
+                await flush()
+
+        async def heartbeat() -> None:
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                await flush()
+
+        beat = asyncio.ensure_future(heartbeat())
+        try:
+            state = await execute(publish)
+        except BaseException as e:
+            await asyncio.to_thread(
+                self.store.finish, key, owner, self.ttl_seconds, error=f"{type(e).__name__}: {e}"
+            )
+            raise
+        finally:
+            beat.cancel()
+        await flush()
+        await asyncio.to_thread(self.store.finish, key, owner, self.ttl_seconds, state=state)
+        return state
+
+    async def _follow(self, key: str, execute: Execute, flight: _Flight) -> Dict[str, Any]:
+        """Relay the events and result of a run owned by another process."""
+        owner, seen = None, 0
+        while True:
+            row, events = await asyncio.to_thread(self.store.poll, key, owner or "", seen)
+            if row is not None and row[0] != owner:
+                # A new execution (first poll, or a takeover): follow it from its first event
+                owner, seen = row[0], 0
+                continue
+            for seq, event in events:
+                await flight.publish(event)
+                seen = seq
+            if row is not None and row[1] == "done":
+                state: Dict[str, Any] = json.loads(row[2])
+                return state
+            if row is not None and row[1] == "error":
+                raise RuntimeError(f"Coalesced run failed: {row[3]}")
+            if row is None or row[4] < time.time():
+                takeover = f"{os.getpid()}-{uuid.uuid4().hex}"
+                if await asyncio.to_thread(self.store.claim, key, takeover, self.lease_seconds):
+                    self.stats.executions += 1
+                    return await self._execute(key, takeover, execute, flight)
+                owner = None
+                continue
+            await asyncio.sleep(self.poll_seconds)
+
+
+_single_flight: Optional[InMemorySingleFlight] = None
+_single_flight_settings: Optional[Tuple[Any, ...]] = None
+
+
+def set_single_flight(single_flight: Optional[InMemorySingleFlight]) -> None:
+    """Install a custom single-flight store.
+
+    Args:
+        single_flight: The store to use, or None to rebuild it from the configuration.
+    """
+    global _single_flight, _single_flight_settings
+    _single_flight = single_flight
+    _single_flight_settings = None if single_flight is None else ("custom",)
+
+
+def get_single_flight(config: Optional[RunnableConfig] = None) -> Optional[InMemorySingleFlight]:
+    """Return the process-wide single-flight store.
+
+    It is built from the ``coalesce_*`` configuration fields on first use and
+    rebuilt if they change. A store installed with ``set_single_flight``
+    always takes precedence.
+
+    Args:
+        config: The runnable config, if any.
+
+    Returns:
+        The store, or None when ``coalesce_backend`` is "none".
+    """
+    global _single_flight, _single_flight_settings
+    if _single_flight_settings == ("custom",):
+        return _single_flight
+
+    configuration = Configuration.from_runnable_config(config)
+    settings = (
+        configuration.coalesce_backend,
+        configuration.coalesce_path,
+        configuration.coalesce_ttl_seconds,
+        configuration.coalesce_lease_seconds,
+    )
+    if settings == _single_flight_settings:
+        return _single_flight
+
+    backend_name, path, ttl_seconds, lease_seconds = settings
+    if backend_name == "none":
+        _single_flight = None
+    elif backend_name == "memory":
+        _single_flight = InMemorySingleFlight(ttl_seconds)
+    elif backend_name == "sqlite":
+        _single_flight = SQLiteSingleFlight(path, ttl_seconds, lease_seconds)
+    else:
+        raise ValueError(
+            f"Unknown coalesce_backend {backend_name!r}; expected one of {COALESCE_BACKENDS}"
+        )
+    _single_flight_settings = settings
+    return _single_flight
+
+
+class CoalescingGraph:
+    """A compiled graph whose identical concurrent runs share one execution."""
+
+    def __init__(
+        self,
+        graph: Any = None,
+        config: Optional[RunnableConfig] = None,
+        single_flight: Optional[InMemorySingleFlight] = None,
+    ) -> None:
+        """Wrap a graph so that runs of the same objective share one execution.
+
+        Args:
+            graph: The compiled graph to run; the agent graph by default.
+            config: Runnable config supplying the ``coalesce_*`` fields.
+            single_flight: The store shared by coalesced runs; by default the
+                process-wide one (a memory store if ``coalesce_backend`` is "none").
+        """
+        if graph is None:
+            from .graph import graph
+        self.graph = graph
+        configuration = Configuration.from_runnable_config(config)
+        if configuration.coalesce_date_bucket not in DATE_BUCKETS:
+            raise ValueError(
+                f"Unknown coalesce_date_bucket {configuration.coalesce_date_bucket!r}; expected one of {DATE_BUCKETS}"
+            )
+        self.date_bucket = configuration.coalesce_date_bucket
+        self.single_flight = (
+            single_flight or get_single_flight(config) or InMemorySingleFlight(configuration.coalesce_ttl_seconds)
+        )
+
+    @property
+    def stats(self) -> CoalescingStats:
+        """Return the statistics of the single-flight store."""
+        return self.single_flight.stats
+
+    def key(self, graph_input: Dict[str, Any], config: Optional[RunnableConfig] = None) -> str:
+        """Return the coalescing key of ``graph_input`` run with ``config`` today."""
+        today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        return coalesce_key(str(graph_input.get("input", "")), today, self.date_bucket, run_settings(config))
+
+    async def arun(
+        self,
+        graph_input: Dict[str, Any],
+        config: Optional[RunnableConfig] = None,
+        on_event: Optional[EventCallback] = None,
+    ) -> Dict[str, Any]:
+        """Run the graph, or attach to an identical run, reporting its stream events.
+
+        Args:
+            graph_input: The graph input, e.g. ``{"input": "..."}``.
+            config: The runnable config, used if this call starts the run.
+            on_event: Called with every custom stream event of the run.
+
+        Returns:
+            The final state.
+        """
+
+        async def execute(publish: Publish) -> Dict[str, Any]:
+            state: Dict[str, Any] = {}
+            async for mode, chunk in self.graph.astream(graph_input, config, stream_mode=["custom", "values"]):
+                if mode == "custom":
+                    await publish(chunk)
+                else:
+                    state = chunk
+            return state
+
+        return await self.single_flight.run(self.key(graph_input, config), execute, on_event)
+
+    async def ainvoke(self, graph_input: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        """Return the final state of the (possibly shared) run."""
+        return await self.arun(graph_input, config)
+
+    async def astream(
+        self, graph_input: Dict[str, Any], config: Optional[RunnableConfig] = None
+    ) -> AsyncIterator[StreamEvent]:
+        """Yield the custom stream events of the (possibly shared) run."""
+        queue: asyncio.Queue[StreamEvent] = asyncio.Queue()
+        run = asyncio.ensure_future(self.arun(graph_input, config, queue.put_nowait))
+        try:
+            while True:
+                get = asyncio.ensure_future(queue.get())
+                await asyncio.wait({get, run}, return_when=asyncio.FIRST_COMPLETED)
+                if get.done():
+                    yield get.result()
+                    continue
+                get.cancel()
+                while not queue.empty():
+                    yield queue.get_nowait()
+                run.result()
+                return
+        finally:
+            if not run.done():
+                run.cancel()
+
+    def stats_snapshot(self) -> Dict[str, int]:
+        """Return the counters of the single-flight store as a plain dictionary."""
+        return asdict(self.stats)
@@ -0,0 +1,187 @@
+"""Context compaction for the replanner prompt.
+
+Without compaction the replanner receives every ``(task, output)`` pair and
+the full draft on each iteration, so prompt size grows roughly
+quadratically over a long run. This module keeps each prompt section within
+a token budget:
+
+- Past steps: the most recent steps are shown in full, older steps are
+  collapsed into a rolling summary of one line per step. Summary lines are
+  computed once and memoized in state (``past_steps_summary`` covers the
+  first ``summarized_steps`` steps), so each step is summarized only once.
+- Draft: when the draft is unchanged since the last replan, only its
+  outline is sent; otherwise it is truncated to the draft budget. The
+  replanner can reference the full draft with ``DRAFT_PLACEHOLDER``.
+
+Token savings are accumulated in ``compaction_stats``.
+"""
+import hashlib
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .configuration import Configuration
+from .tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Placeholder the replanner may use in its final response for the full draft
+DRAFT_PLACEHOLDER = "<<CURRENT_DRAFT_REPORT>>"
+
+# Tokens kept from each step output in the rolling summary
+SUMMARY_LINE_TOKENS = 60
+
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+\S.*$", re.MULTILINE)
+
+
+def draft_fingerprint(draft: Optional[str]) -> str:
+    """Return a short, stable fingerprint of the draft content."""
+    return hashlib.sha256((draft or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _summarize_step(task: str, output: Any) -> str:
+    """Collapse one executed step into a single summary line."""
+    output_text = " ".join(str(output).split())
+    return f"- {task} => {truncate_to_tokens(output_text, SUMMARY_LINE_TOKENS)}"
+
+
+def _format_step(number: int, task: str, output: Any, max_tokens: int) -> str:
+    return f"Step {number}: {task}\nResult: {truncate_to_tokens(str(output), max_tokens)}"
+
+
+def compact_past_steps(
+    past_steps: Sequence[Tuple[str, Any]],
+    summary: str,
+    summarized_steps: int,
+    token_budget: int,
+    recent_steps: int,
+) -> Tuple[str, str, int]:
+    """Render past steps within ``token_budget``, extending the rolling summary.
+
+    Args:
+        past_steps: Every executed ``(task, output)`` pair.
+        summary: The memoized summary of the first ``summarized_steps`` steps.
+        summarized_steps: Number of steps already covered by ``summary``.
+        token_budget: Maximum tokens for the rendered section.
+        recent_steps: Number of most recent steps shown in full.
+
+    Returns:
+        The rendered section, the updated summary and the number of steps it covers.
+    """
+    keep_from = max(0, len(past_steps) - max(1, recent_steps))
+    if keep_from > summarized_steps:
+        new_lines = [_summarize_step(task, output) for task, output in past_steps[summarized_steps:keep_from]]
+        summary = "\n".join(filter(None, [summary, *new_lines]))
+        summarized_steps = keep_from
+
+    recent = past_steps[summarized_steps:]
+    parts: List[str] = []
+    summary_budget = token_budget // 3 if recent else token_budget
+    if summary:
+        lines = summary.split("\n")
+        dropped = 0
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > summary_budget:
+            lines.pop(0)
+            dropped += 1
+        header = f"Summary of earlier steps ({dropped} oldest omitted):" if dropped else "Summary of earlier steps:"
+        parts.append(header + "\n" + "\n".join(lines))
+
+    if recent:
+        remaining = token_budget - count_tokens("\n\n".join(parts))
+        per_step = max(SUMMARY_LINE_TOKENS, remaining // len(recent))
+        parts.extend(
+            _format_step(summarized_steps + i + 1, task, output, per_step)
+            for i, (task, output) in enumerate(recent)
+        )
+    return "\n\n".join(parts) or "(no steps executed yet)", summary, summarized_steps
+
+
+def draft_outline(draft: str) -> str:
+    """Return the markdown headings of ``draft``, or its first line if it has none."""
+    headings = [h.strip() for h in _HEADING.findall(draft)]
+    if headings:
+        return "\n".join(headings)
+    return draft.strip().split("\n", 1)[0]
+
+
+def compact_draft(draft: Optional[str], unchanged: bool, token_budget: int) -> str:
+    """Render the draft section, sending only an outline if it is unchanged.
+
+    Args:
+        draft: The current draft report, if any.
+        unchanged: Whether the draft is identical to the one seen at the last replan.
+        token_budget: Maximum tokens for the rendered section.
+
+    Returns:
+        The text passed to the replanner as the draft.
+    """
+    if not draft:
+        return ""
+    if unchanged:
+        text = (
+            f"(Unchanged since the previous review; {count_tokens(draft)} tokens. "
+            f"Outline:)\n{draft_outline(draft)}"
+        )
+    else:
+        text = draft
+    return truncate_to_tokens(text, token_budget)
+
+
+def compact_replanner_context(
+    state: Dict[str, Any], configuration: Configuration
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """Build compacted ``past_steps`` and ``current_draft_report`` prompt variables.
+
+    Args:
+        state: The current agent state, with defaults applied.
+        configuration: The run configuration holding the token budgets.
+
+    Returns:
+        The prompt variables and the state update memoizing the summary,
+        the draft fingerprint and the accumulated ``compaction_stats``.
+    """
+    past_steps = state["past_steps"]
+    draft = state.get("current_draft_report") or ""
+    fingerprint = draft_fingerprint(draft)
+
+    past_steps_text, summary, summarized_steps = compact_past_steps(
+        past_steps,
+        state["past_steps_summary"],
+        state["summarized_steps"],
+        configuration.replan_past_steps_token_budget,
+        configuration.replan_recent_steps,
+    )
+    draft_text = compact_draft(
+        draft,
+        bool(draft) and fingerprint == state["draft_fingerprint"],
+        configuration.replan_draft_token_budget,
+    )
+
+    raw_tokens = count_tokens(str(past_steps)) + count_tokens(draft)
+    sent_tokens = count_tokens(past_steps_text) + count_tokens(draft_text)
+    previous = state["compaction_stats"]
+    stats = {
+        "replans": previous.get("replans", 0) + 1,
+        "raw_tokens": previous.get("raw_tokens", 0) + raw_tokens,
+        "sent_tokens": previous.get("sent_tokens", 0) + sent_tokens,
+    }
+    stats["tokens_saved"] = stats["raw_tokens"] - stats["sent_tokens"]
+    logger.debug(
+        "Replanner context compacted from %d to %d tokens", raw_tokens, sent_tokens
+    )
+
+    variables = {"past_steps": past_steps_text, "current_draft_report": draft_text}
+    update = {
+        "past_steps_summary": summary,
+        "summarized_steps": summarized_steps,
+        "draft_fingerprint": fingerprint,
+        "compaction_stats": stats,
+    }
+    return variables, update
+
+
+def expand_draft_placeholder(response: str, draft: Optional[str]) -> str:
+    """Replace ``DRAFT_PLACEHOLDER`` in a final response with the full draft."""
+    if DRAFT_PLACEHOLDER not in response:
+        return response
+    return response.replace(DRAFT_PLACEHOLDER, draft or "")
@@ -0,0 +1,191 @@
+"""Runtime configuration for the plan-and-execute agent.
+
+Values are read from ``config["configurable"]`` first, then from an
+``AGENT_<FIELD_NAME>`` environment variable, and finally fall back to the
+defaults declared below.
+"""
+import os
+from dataclasses import dataclass, fields
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+
+def _coerce(value: Any, default: Any) -> Any:
+    """Coerce a raw (usually string) value to the type of the field default."""
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        return bool(value)
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+@dataclass
+class Configuration:
+    """Configurable parameters of the agent."""
+
+    # Entry route: auto (classify the objective), direct, single_step or full
+    entry_route: str = "auto"
+    # Objectives longer than this always take the full plan-execute-replan loop
+    entry_route_max_words: int = 30
+    # Longest question the auto route answers with a single model call and no tools
+    entry_route_direct_max_words: int = 12
+    # Maximum number of independent plan steps executed at the same time
+    max_concurrency: int = 4
+    # Chat model provider: azure, or fake for offline runs
+    llm_provider: str = "azure"
+    # Median latency of fake models (log-normal with fake_latency_sigma), e.g. to load test a served graph
+    fake_llm_latency_ms: float = 0.0
+    fake_latency_sigma: float = 0.0
+    # Model deployment per role; empty falls back to AZURE_OPENAI_DEPLOYMENT_NAME_<ROLE>,
+    # then AZURE_OPENAI_DEPLOYMENT_NAME, then "gpt-4"
+    planner_model: str = ""
+    executor_model: str = ""
+    replanner_model: str = ""
+    # Maximum concurrent LLM calls per role across the process (0 means unlimited)
+    planner_max_concurrency: int = 0
+    executor_max_concurrency: int = 0
+    replanner_max_concurrency: int = 0
+    # Shared HTTP connection pool used by every chat model
+    llm_http_max_connections: int = 100
+    llm_http_max_keepalive_connections: int = 20
+    llm_http_keepalive_expiry_seconds: float = 30.0
+    llm_timeout_seconds: float = 60.0
+    # Use HTTP/2 when the h2 package is installed
+    llm_http2: bool = True
+    # When to call the replanner: always, on_failure, every_n_steps or at_end
+    replan_policy: str = "always"
+    # Number of executed steps between replans for the every_n_steps policy
+    replan_every_n_steps: int = 3
+    # Run budgets (0 disables a limit); an exhausted budget finalizes the run with the current draft
+    budget_max_steps: int = 30
+    budget_max_tokens: int = 0
+    budget_max_seconds: float = 0.0
+    budget_max_search_calls: int = 0
+    # Planned steps repeating an executed step before the run is finalized
+    budget_max_repeated_steps: int = 3
+    # Rewrite the planner's plan before execution: drop duplicates, batch adjacent searches, cap the length
+    plan_optimizer: bool = True
+    # Content-word overlap (Jaccard) at which two steps of the same kind are duplicates
+    plan_dedupe_similarity: float = 0.75
+    # Adjacent independent searches merged into one step at most (1: keep them apart, so the scheduler runs them in parallel)
+    plan_max_batched_searches: int = 1
+    # Maximum number of planned steps, keeping the last one (0 disables the cap, the default)
+    plan_max_steps: int = 0
+    # Execute the next pending step while the replanner runs, keeping it if the new plan does
+    speculative_execution: bool = False
+    # Report steps get the draft outline plus targeted sections and return section patches
+    draft_section_edits: bool = True
+    # Drafts shorter than this are still sent in full and rewritten as a whole
+    draft_section_edits_min_tokens: int = 400
+    # Send static instructions first and the plan as a numbered list (false: original prompt layouts)
+    compact_prompts: bool = True
+    # Count prompt tokens per node and section in prompt_assembly.prompt_stats (tokenizes every prompt)
+    prompt_stats: bool = False
+    # Token budget of the executed-steps section of the replanner prompt
+    replan_past_steps_token_budget: int = 2000
+    # Token budget of the draft section of the replanner prompt
+    replan_draft_token_budget: int = 3000
+    # Number of most recent steps shown in full; older ones are summarized
+    replan_recent_steps: int = 3
+    # Planner/replanner output cache: none, memory or sqlite
+    cache_backend: str = "memory"
+    # Database file used by the sqlite cache backend
+    cache_path: str = "agent_cache.sqlite3"
+    # Lifetime of a cached plan
+    cache_ttl_seconds: int = 86400
+    # Maximum number of cached plans before least recently used ones are evicted
+    cache_max_entries: int = 1024
+    # Granularity of the date in cache keys: day, week or month
+    cache_date_bucket: str = "day"
+    # Share one execution between identical concurrent runs (batch runner, CoalescingGraph): none, memory or sqlite
+    coalesce_backend: str = "none"
+    # Database file used by the sqlite coalescing backend, shared by processes
+    coalesce_path: str = "agent_coalesce.sqlite3"
+    # Seconds a finished run is reused for identical inputs (0 disables reuse)
+    coalesce_ttl_seconds: float = 60.0
+    # Granularity of the date in coalescing keys: day, week or month
+    coalesce_date_bucket: str = "day"
+    # Seconds without a heartbeat before another process takes over a sqlite run
+    coalesce_lease_seconds: float = 30.0
+    # Keep a run's search hits in a local BM25 store the executor can query before searching again
+    evidence_store: bool = True
+    # Maximum number of stored hits before the oldest are evicted
+    evidence_max_entries: int = 200
+    # Stored hits are truncated to this many characters
+    evidence_max_chars: int = 2000
+    # Number of stored hits returned per retrieval
+    evidence_top_k: int = 3
+    # Search backend: tavily, or fake for offline runs (with a median latency of fake_search_latency_ms)
+    search_backend: str = "tavily"
+    fake_search_latency_ms: float = 0.0
+    # Number of hits returned per search query
+    search_max_results: int = 3
+    # Lifetime of cached search results
+    search_cache_ttl_seconds: int = 300
+    # Maximum number of cached search queries
+    search_cache_max_entries: int = 256
+    # Sustained rate of outgoing search calls (0 disables rate limiting)
+    search_rate_per_second: float = 5.0
+    # Number of search calls allowed in a burst above the sustained rate
+    search_burst: int = 5
+    # Maximum number of search calls in flight at the same time
+    search_max_concurrency: int = 4
+    # Queries accepted by one batched search call
+    search_batch_max_queries: int = 5
+    # Queries of one batched search call searched at the same time
+    search_batch_concurrency: int = 4
+    # Token budget of the digest returned by a batched search call
+    search_batch_token_budget: int = 1500
+    # Graph checkpointer: none, memory, sqlite or "package.module:factory"
+    checkpoint_backend: str = "none"
+    # Database file used by the sqlite checkpointer
+    checkpoint_path: str = "agent_checkpoints.sqlite3"
+    # Checkpoint values at least this large are zlib-compressed (0 disables)
+    checkpoint_compress_min_bytes: int = 1024
+    # Reuse the output of plan steps that already appear in past_steps
+    skip_completed_steps: bool = True
+    # Comma-separated instrumentation exporters: trace, prometheus, otel (empty disables)
+    instrumentation: str = ""
+    # Number of recent run traces kept by the instrumentation
+    trace_max_runs: int = 100
+    # Maximum number of records kept per run trace
+    trace_max_records: int = 500
+    # Maximum number of batch runs in flight at the same time
+    batch_max_concurrency: int = 16
+    # Maximum number of batch runs in flight per tenant
+    batch_tenant_max_concurrency: int = 4
+    # Per-tenant overrides of the limit above, e.g. "nightly=8,adhoc=1"
+    batch_tenant_limits: str = ""
+    # Seconds before a batch run is cancelled (0 disables the timeout)
+    batch_timeout_seconds: float = 600.0
+    # Maximum number of batch inputs read ahead of the completed runs
+    batch_max_pending: int = 64
+
+    @classmethod
+    def from_runnable_config(
+        cls, config: Optional[RunnableConfig] = None
+    ) -> "Configuration":
+        """Create a Configuration from a RunnableConfig.
+
+        Args:
+            config: The runnable config passed to a graph node, if any.
+
+        Returns:
+            Configuration instance.
+        """
+        configurable = (config or {}).get("configurable") or {}
+        values = {}
+        for f in fields(cls):
+            if f.name in configurable and configurable[f.name] is not None:
+                raw = configurable[f.name]
+            elif os.getenv(f"AGENT_{f.name.upper()}") is not None:
+                raw = os.getenv(f"AGENT_{f.name.upper()}")
+            else:
+                continue
+            values[f.name] = _coerce(raw, f.default)
+        return cls(**values)
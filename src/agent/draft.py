@@ -0,0 +1,275 @@
+"""Section-indexed draft report with patch-based edits.
+
+``current_draft_report`` stays a markdown string in the state (so
+checkpoints, the replanner and stream consumers are unchanged), but report
+steps work on it as a ``DraftDocument``: an ordered list of sections split
+at markdown headings, each with a stable id derived from its heading.
+Splitting is lossless, so ``DraftDocument.parse(text).render() == text``.
+
+Once a draft is long enough (``draft_section_edits_min_tokens``), a report
+step no longer receives the whole draft and regenerates it. Instead it gets
+the outline of every section plus only the sections its task refers to, and
+answers with patches:
+
+    <<<REPLACE market-size>>>
+    ## Market Size
+    ...
+    <<<END>>>
+
+Supported operations are ``REPLACE <id>``, ``INSERT AFTER <id>`` (or
+``INSERT AFTER START``), ``APPEND`` and ``DELETE <id>``. Patches are
+applied in order; an output without any patch block replaces the draft as a
+whole, as before.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(\S.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s{0,3}(```|~~~)")
+_PATCH = re.compile(
+    r"<<<\s*(REPLACE|INSERT AFTER|APPEND|DELETE)\b\s*([^>\n]*?)\s*>>>[ \t]*\n?(.*?)<<<\s*END\s*>>>",
+    re.DOTALL,
+)
+_WORD = re.compile(r"[a-z0-9]+")
+# Words too common in report tasks to identify a section
+_STOPWORDS = frozenset(
+    "a an and the of on in to for with from by about into current draft report section sections "
+    "content document add write review refine update improve expand revise".split()
+)
+# Fraction of a heading's words that must appear in a task to target the section
+_MATCH_RATIO = 0.6
+# Sections added by a task are not expected to exist yet
+_ADD_TASK = re.compile(r"\b(add|append|insert|include)\b[^.]*\bsection\b", re.IGNORECASE)
+
+PREAMBLE_ID = "start"
+
+
+def _slug(title: str) -> str:
+    return "-".join(_WORD.findall(title.lower())) or "section"
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+@dataclass
+class Section:
+    """One heading and the text up to the next heading."""
+
+    id: str
+    # The heading text without the leading "#"s; empty for the preamble
+    title: str
+    level: int
+    # The exact source text of the section, heading line included
+    text: str
+
+    @property
+    def tokens(self) -> int:
+        """Return the token count of the section text."""
+        return count_tokens(self.text)
+
+
+@dataclass
+class Patch:
+    """One section-level edit returned by a report step."""
+
+    op: str
+    target: str
+    text: str
+
+
+class DraftDocument:
+    """An ordered, section-indexed view of a markdown draft."""
+
+    def __init__(self, sections: Optional[List[Section]] = None) -> None:
+        """Create a document from ``sections``, in order."""
+        self.sections: List[Section] = sections or []
+
+    @classmethod
+    def parse(cls, text: Optional[str]) -> "DraftDocument":
+        """Split ``text`` into sections at markdown headings outside code fences."""
+        document = cls()
+        chunk: List[str] = []
+        title, level = "", 0
+        in_fence = False
+        for line in (text or "").splitlines(keepends=True):
+            if _FENCE.match(line):
+                in_fence = not in_fence
+            heading = None if in_fence else _HEADING.match(line)
+            if heading:
+                if chunk:
+                    document._add(title, level, "".join(chunk))
+                chunk, title, level = [], heading.group(2), len(heading.group(1))
+            chunk.append(line)
+        if chunk:
+            document._add(title, level, "".join(chunk))
+        return document
+
+    def _unique_id(self, title: str) -> str:
+        base = _slug(title) if title else PREAMBLE_ID
+        taken = {section.id for section in self.sections}
+        candidate, suffix = base, 2
+        while candidate in taken:
+            candidate, suffix = f"{base}-{suffix}", suffix + 1
+        return candidate
+
+    def _add(self, title: str, level: int, text: str, index: Optional[int] = None) -> Section:
+        section = Section(self._unique_id(title), title, level, text)
+        self.sections.insert(len(self.sections) if index is None else index, section)
+        return section
+
+    def render(self) -> str:
+        """Return the draft as markdown."""
+        return "".join(section.text for section in self.sections)
+
+    def index_of(self, section_id: str) -> Optional[int]:
+        """Return the position of the section with ``section_id``, if any."""
+        key = section_id.strip().lower()
+        for index, section in enumerate(self.sections):
+            if section.id == key:
+                return index
+        return None
+
+    def outline(self) -> str:
+        """List every section as "id: heading (N tokens)", indented by level."""
+        return "\n".join(
+            f"{'  ' * max(0, s.level - 1)}- {s.id}: {s.title or '(text before the first heading)'} ({s.tokens} tokens)"
+            for s in self.sections
+        )
+
+    def select(self, task: str) -> Optional[List[Section]]:
+        """Pick the sections a task refers to.
+
+        A section is targeted when its id appears in the task or most of its
+        heading words do.
+
+        Returns:
+            The targeted sections in document order; an empty list for tasks
+            that only add new sections; None when the task targets no
+            particular section and needs the whole draft.
+        """
+        task_lower = task.lower()
+        task_words = set(_words(task))
+        selected = []
+        for section in self.sections:
+            title_words = set(_words(section.title))
+            if section.id != PREAMBLE_ID and re.search(rf"\b{re.escape(section.id)}\b", task_lower):
+                selected.append(section)
+            elif title_words and len(title_words & task_words) / len(title_words) >= _MATCH_RATIO:
+                selected.append(section)
+        if selected:
+            return selected
+        return [] if _ADD_TASK.search(task) else None
+
+    def apply(self, patches: Sequence[Patch]) -> List[Patch]:
+        """Apply ``patches`` in order.
+
+        Returns:
+            The patches that could not be applied (unknown section ids).
+            A REPLACE of an unknown section is appended instead, so no
+            content is lost.
+        """
+        rejected = []
+        for patch in patches:
+            # Sections are separated by a blank line, like the rest of the draft
+            text = patch.text.strip("\n") + "\n\n" if patch.text.strip() else ""
+            index = self.index_of(patch.target) if patch.target else None
+            if patch.op == "APPEND" or (patch.op == "REPLACE" and index is None):
+                if patch.op == "REPLACE":
+                    logger.warning("Draft patch targets unknown section %r; appending it", patch.target)
+                self._insert_text(len(self.sections), text)
+            elif patch.op == "INSERT AFTER":
+                if patch.target.strip().lower() == PREAMBLE_ID and index is None:
+                    self._insert_text(0, text)
+                elif index is None:
+                    rejected.append(patch)
+                else:
+                    self._insert_text(index + 1, text)
+            elif index is None:
+                rejected.append(patch)
+            elif patch.op == "DELETE":
+                del self.sections[index]
+            else:
+                del self.sections[index]
+                self._insert_text(index, text)
+        return rejected
+
+    def _insert_text(self, index: int, text: str) -> None:
+        """Insert ``text`` at ``index``, split into sections if it has several headings."""
+        if not text:
+            return
+        if index > 0 and not self.sections[index - 1].text.endswith("\n\n"):
+            # Keep a blank line between the previous section and the new one
+            self.sections[index - 1].text += "\n"
+        for offset, section in enumerate(DraftDocument.parse(text).sections):
+            self._add(section.title, section.level, section.text, index + offset)
+
+
+def parse_patches(output: str) -> List[Patch]:
+    """Extract the patch blocks of a report step output, in order."""
+    return [
+        # Only the first word of the target is the id; models sometimes copy more of the outline
+        Patch(op=" ".join(op.split()).upper(), target=(target.split() or [""])[0], text=text.strip("\n"))
+        for op, target, text in _PATCH.findall(output or "")
+    ]
+
+
+def section_task_input(task_description: str, document: DraftDocument) -> str:
+    """Build the input of a report step that edits ``document`` with patches.
+
+    The step sees the outline of the whole draft and the full text of only
+    the sections its task refers to (every section if it refers to none).
+    """
+    selected = document.select(task_description)
+    if selected is None:
+        selected = document.sections
+    if selected:
+        provided = "\n".join(
+            f"--- SECTION {s.id} START ---\n{s.text.rstrip()}\n--- SECTION {s.id} END ---" for s in selected
+        )
+    else:
+        provided = "(No existing section is needed; add new sections.)"
+    return f"""Current Task: {task_description}
+
+The EXISTING DRAFT CONTENT is organized in sections. Outline (id: heading):
+{document.outline()}
+
+Sections provided for this task:
+{provided}
+
+Do NOT rewrite the whole draft. Return only the edits, one block per changed section:
+<<<REPLACE section-id>>>
+(the complete new text of the section, including its heading)
+<<<END>>>
+<<<INSERT AFTER section-id>>> (or INSERT AFTER {PREAMBLE_ID} for the beginning)
+(new sections, each starting with a markdown heading)
+<<<END>>>
+<<<APPEND>>>
+(new sections added at the end)
+<<<END>>>
+<<<DELETE section-id>>><<<END>>>
+Sections you do not mention stay unchanged.
+"""
+
+
+def apply_step_output(draft: Optional[str], output: str) -> str:
+    """Compute the new draft from a report step output.
+
+    Returns:
+        ``draft`` with the patches in ``output`` applied, or ``output``
+        itself when it contains no patch (a full rewrite).
+    """
+    patches = parse_patches(output)
+    if not patches or not draft:
+        return output
+    document = DraftDocument.parse(draft)
+    rejected = document.apply(patches)
+    if rejected:
+        logger.warning("Ignored %d draft patch(es) for unknown sections", len(rejected))
+    return document.render()
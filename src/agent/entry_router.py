@@ -0,0 +1,134 @@
+"""Entry router: send simple objectives down a shorter path.
+
+The full plan-execute-replan loop costs at least three model calls, which
+is wasted on "what year is it?". The ``router`` node runs first and picks
+one of three routes, recorded in ``route`` and ``route_reason``:
+
+- ``direct``: answered by a single model call without tools (questions
+  about the current date or time, and short questions that need no fresh
+  information).
+- ``single_step``: one executor run, with tools, whose output is the
+  response (short lookups such as "latest EV sales in Norway").
+- ``full``: the planner, scheduler and replanner loop (reports, comparisons,
+  multi-part requests and anything long).
+
+Classification is a cheap, memoized heuristic on the objective; no model
+is called. A route that fails escalates: a direct answer that looks like a
+refusal is retried as a single step, and a failed single step goes to the
+planner. ``entry_route`` forces a route, and "full" restores the original
+behavior.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+
+from .budget import start_run
+from .configuration import Configuration
+from .evidence import evidence_store_for, evidence_update
+from .executor import _prepare_time_context, execute_task
+from .llm_config import get_llm
+from .prompts import get_direct_answer_system_prompt
+from .replan_policy import looks_like_failure
+from .state import PlanExecute, get_default_state
+from .streaming import get_writer, response_event
+
+ENTRY_ROUTES = ("auto", "direct", "single_step", "full")
+
+_TIME_QUESTION = re.compile(
+    r"^\s*(?:what(?:'s| is)?|which|tell me)\s+(?:the\s+)?(?:current\s+|today'?s\s+)?"
+    r"(?:date|time|year|day(?: of the week)?|month)\b(?:\s+(?:is\s+it|is\s+today|today|now|it\s+is))*\s*[?.!]*\s*$",
+    re.IGNORECASE,
+)
+_MULTI_STEP = re.compile(
+    r"\b(?:reports?|articles?|essays?|documents?|drafts?|plans?|outlines?|compar(?:e|ison|ing)|versus|vs\.?"
+    r"|analy[sz](?:e|is|ing)|evaluate|investigate|research|pros and cons|step[- ]by[- ]step|in[- ]depth"
+    r"|detailed|comprehensive|then|as well as)\b",
+    re.IGNORECASE,
+)
+_NEEDS_LOOKUP = re.compile(
+    r"\b(?:latest|current(?:ly)?|today|recent(?:ly)?|news|now|this (?:week|month|year)|price|stock"
+    r"|weather|forecast|score|who won|search|find|look up|\d{4})\b",
+    re.IGNORECASE,
+)
+_QUESTION = re.compile(r"\?\s*$|^\s*(?:what|who|when|where|which|why|how|is|are|does|do|can|define|explain)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def classify_objective(objective: str, max_words: int = 30, direct_max_words: int = 12) -> Tuple[str, str]:
+    """Pick the route for ``objective``.
+
+    Args:
+        objective: The user input.
+        max_words: Objectives longer than this always take the full route.
+        direct_max_words: Longest question answered without tools.
+
+    Returns:
+        The route ("direct", "single_step" or "full") and the reason for it.
+    """
+    text = " ".join(objective.split())
+    words = len(text.split())
+    if _TIME_QUESTION.match(text):
+        return "direct", "question about the current date or time"
+    if words > max_words:
+        return "full", f"longer than {max_words} words"
+    if _MULTI_STEP.search(text) or text.count("?") > 1 or re.search(r"(?:^|\s)(?:\d+[.)]|[-*])\s", text):
+        return "full", "asks for a document, an analysis or several things"
+    if _NEEDS_LOOKUP.search(text):
+        return "single_step", "short request that needs fresh information"
+    if words <= direct_max_words and _QUESTION.search(text):
+        return "direct", "short question answerable without tools"
+    return "single_step", "short request"
+
+
+async def route_step(state: PlanExecute, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """Record the route chosen for the objective, starting a new run."""
+    configuration = Configuration.from_runnable_config(config)
+    mode = configuration.entry_route
+    if mode not in ENTRY_ROUTES:
+        raise ValueError(f"Unknown entry_route {mode!r}; expected one of {ENTRY_ROUTES}")
+    # A checkpointed thread still holds the answer and budget usage of its previous run
+    update = {key: "" for key in ("response", "budget_stop") if state.get(key)}
+    update.update(start_run(state))
+    if mode != "auto":
+        return {**update, "route": mode, "route_reason": "forced by entry_route"}
+    route, reason = classify_objective(
+        state["input"], configuration.entry_route_max_words, configuration.entry_route_direct_max_words
+    )
+    return {**update, "route": route, "route_reason": reason}
+
+
+async def direct_answer_step(state: PlanExecute, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """Answer the objective with one model call and no tools."""
+    current_state = get_default_state()
+    current_state.update(state)
+    messages = [
+        SystemMessage(content=get_direct_answer_system_prompt(_prepare_time_context(current_state))),
+        HumanMessage(content=current_state["input"]),
+    ]
+    answer = str((await get_llm("executor", config).ainvoke(messages, config)).content)
+    if looks_like_failure(answer):
+        return {"route": "single_step", "route_reason": "direct answer looked like a refusal"}
+    get_writer()(response_event(answer, node="direct"))
+    return {"response": answer}
+
+
+async def single_step(state: PlanExecute, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """Run the objective as one executor step and answer with its output."""
+    current_state = get_default_state()
+    current_state.update(state)
+    objective = current_state["input"]
+    evidence = evidence_store_for(current_state, config)
+    output, _ = await execute_task(objective, None, _prepare_time_context(current_state), config, evidence=evidence)
+    if looks_like_failure(output):
+        return {
+            "past_steps": [(objective, output)],
+            "route": "full",
+            "route_reason": "single step looked like a failure",
+            # Hits found so far are kept for the planned run
+            **evidence_update(evidence),
+        }
+    get_writer()(response_event(output, node="single_step"))
+    return {"past_steps": [(objective, output)], "response": output, **evidence_update(evidence)}
@@ -0,0 +1,269 @@
+"""Per-run store of search results with local BM25 retrieval.
+
+Every executor step starts a fresh ReAct sub-agent, so the raw search hits of
+earlier steps only survive as the summaries in ``past_steps``, and a later
+"write the section using the previous results" step tends to search again.
+With ``evidence_store`` enabled:
+
+- every hit returned by the search tool during a run is added to an
+  ``EvidenceStore``, deduplicated by URL;
+- the executor gets a second tool, ``search_previous_results``, that
+  ranks the stored hits with BM25 and returns the best ones without a
+  network call; its description tells the model to try it first.
+
+The store is bounded: at most ``evidence_max_entries`` hits (oldest evicted
+first), each truncated to ``evidence_max_chars``. It travels in the state as
+``evidence``, a list of ``[url, content, query]`` rows, so it is compact in
+checkpoints and its index is rebuilt in a few milliseconds at each node.
+A node only returns the changes of its step (added rows, and ``[url]`` rows
+for evicted hits), which ``merge_evidence`` applies to the state.
+
+The nodes bind the store of their run with ``use_evidence_store``; the tools
+find it through a context variable, so the compiled sub-agent stays shared.
+"""
+import math
+import re
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import BaseModel, Field
+
+from .configuration import Configuration
+
+EVIDENCE_TOOL_NAME = "search_previous_results"
+EVIDENCE_TOOL_DESCRIPTION = (
+    "Look up search results already gathered earlier in this task. "
+    "Use this first; only run a new web search if it returns nothing relevant. "
+    "Input should be a search query."
+)
+NO_EVIDENCE = "No stored search results match this query. Use the web search tool."
+
+_WORD = re.compile(r"\w+")
+
+_current_store: ContextVar[Optional["EvidenceStore"]] = ContextVar("agent_evidence_store", default=None)
+
+
+def _terms(text: str) -> List[str]:
+    return _WORD.findall(text.casefold())
+
+
+@dataclass
+class Evidence:
+    """One stored search hit."""
+
+    url: str
+    content: str
+    # The query that found it
+    query: str = ""
+
+    def to_row(self) -> List[str]:
+        """Return the hit as a state row: url, content and query."""
+        return [self.url, self.content, self.query]
+
+    def to_hit(self) -> Dict[str, str]:
+        """Return the hit in the shape of a search result."""
+        return {"url": self.url, "content": self.content}
+
+
+class EvidenceStore:
+    """Bounded BM25 index over the search hits of one run."""
+
+    # Standard BM25 parameters
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, max_entries: int = 200, max_chars: int = 2000) -> None:
+        """Create an empty store of up to ``max_entries`` hits of ``max_chars`` characters."""
+        self.max_entries = max(1, max_entries)
+        self.max_chars = max_chars
+        self._entries: OrderedDict[str, Evidence] = OrderedDict()
+        self._terms: Dict[str, Counter[str]] = {}
+        # Rows added and [url] rows evicted since the store was loaded, in order
+        self._changes: List[List[str]] = []
+
+    def __len__(self) -> int:
+        """Return the number of stored hits."""
+        return len(self._entries)
+
+    @property
+    def changed(self) -> bool:
+        """Whether hits were added since the store was loaded."""
+        return bool(self._changes)
+
+    @classmethod
+    def from_rows(
+        cls, rows: Optional[Iterable[Sequence[str]]], max_entries: int = 200, max_chars: int = 2000
+    ) -> "EvidenceStore":
+        """Rebuild a store from the ``evidence`` rows of the state."""
+        store = cls(max_entries, max_chars)
+        for row in rows or []:
+            store._add(Evidence(*row[:3]))
+        store._changes.clear()
+        return store
+
+    def to_rows(self) -> List[List[str]]:
+        """Return the stored hits as ``[url, content, query]`` rows, oldest first."""
+        return [evidence.to_row() for evidence in self._entries.values()]
+
+    def changes(self) -> List[List[str]]:
+        """Return the rows added and the ``[url]`` rows evicted since the store was loaded."""
+        return [list(row) for row in self._changes]
+
+    def _add(self, evidence: Evidence) -> None:
+        if self.max_chars > 0:
+            evidence.content = evidence.content[: self.max_chars]
+        self._entries.pop(evidence.url, None)
+        self._entries[evidence.url] = evidence
+        self._terms[evidence.url] = Counter(_terms(evidence.content))
+        self._changes.append(evidence.to_row())
+        while len(self._entries) > self.max_entries:
+            url, _ = self._entries.popitem(last=False)
+            del self._terms[url]
+            self._changes.append([url])
+
+    def add_hits(self, query: str, hits: Any) -> int:
+        """Store the hits of one search.
+
+        Args:
+            query: The search query.
+            hits: The search tool output; anything but a list of dictionaries
+                with ``url`` and ``content`` (e.g. an error message) is ignored.
+
+        Returns:
+            The number of hits stored.
+        """
+        if not isinstance(hits, list):
+            return 0
+        added = 0
+        for hit in hits:
+            if isinstance(hit, dict) and hit.get("content"):
+                self._add(Evidence(str(hit.get("url") or f"result-{len(self._entries)}"), str(hit["content"]), query))
+                added += 1
+        return added
+
+    def search(self, query: str, k: int = 3) -> List[Evidence]:
+        """Rank the stored hits against ``query`` with BM25.
+
+        Returns:
+            Up to ``k`` hits sharing at least one term with the query, best first.
+        """
+        query_terms = set(_terms(query))
+        if not query_terms or not self._entries:
+            return []
+        count = len(self._entries)
+        average_length = sum(sum(terms.values()) for terms in self._terms.values()) / count or 1.0
+        document_frequency = Counter(
+            term for terms in self._terms.values() for term in query_terms if term in terms
+        )
+        scored = []
+        for position, (url, terms) in enumerate(self._terms.items()):
+            length = sum(terms.values())
+            score = 0.0
+            for term in query_terms:
+                frequency = terms.get(term, 0)
+                if not frequency:
+                    continue
+                df = document_frequency[term]
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                score += idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                )
+            if score > 0:
+                # Newer hits win ties
+                scored.append((score, position, url))
+        scored.sort(reverse=True)
+        return [self._entries[url] for _, _, url in scored[:k]]
+
+
+def evidence_store_for(state: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Optional[EvidenceStore]:
+    """Rebuild the evidence store of a run from its state.
+
+    Returns:
+        The store, or None when ``evidence_store`` is disabled.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    if not configuration.evidence_store:
+        return None
+    return EvidenceStore.from_rows(
+        state.get("evidence"), configuration.evidence_max_entries, configuration.evidence_max_chars
+    )
+
+
+def merge_evidence(current: Optional[List[List[str]]], changes: Optional[List[List[str]]]) -> List[List[str]]:
+    """Reduce the ``evidence`` state key with the changes returned by a node.
+
+    Args:
+        current: The stored ``[url, content, query]`` rows.
+        changes: Rows to add, replacing any row with the same URL, and
+            ``[url]`` rows removing an evicted hit.
+
+    Returns:
+        The updated rows, oldest first.
+    """
+    rows = {row[0]: row for row in current or []}
+    for row in changes or []:
+        rows.pop(row[0], None)
+        if len(row) > 1:
+            rows[row[0]] = row
+    return list(rows.values())
+
+
+def evidence_update(store: Optional[EvidenceStore]) -> Dict[str, Any]:
+    """Return the state update saving the changes of ``store``, empty if it did not change."""
+    return {"evidence": store.changes()} if store is not None and store.changed else {}
+
+
+def use_evidence_store(store: Optional[EvidenceStore]) -> None:
+    """Make ``store`` the evidence store of the current context.
+
+    Call it at the start of a task: the task runs in its own copy of the
+    context, so the binding ends with it.
+    """
+    _current_store.set(store)
+
+
+def current_evidence_store() -> Optional[EvidenceStore]:
+    """Return the evidence store bound to the current context, if any."""
+    return _current_store.get()
+
+
+def record_search(query: str, hits: Any) -> None:
+    """Add the hits of a search to the current evidence store, if any."""
+    store = _current_store.get()
+    if store is not None:
+        store.add_hits(query, hits)
+
+
+class EvidenceInput(BaseModel):
+    """Input of the retrieval tool."""
+
+    query: str = Field(description="what to look for in the results gathered so far")
+
+
+def make_evidence_tool(k: Optional[int] = None) -> BaseTool:
+    """Build the tool that searches the current run's stored search results.
+
+    Args:
+        k: Number of hits returned per query; by default the calling run's
+            ``evidence_top_k``.
+
+    Returns:
+        The retrieval tool.
+    """
+
+    async def _retrieve(query: str, config: RunnableConfig) -> Any:
+        store = _current_store.get()
+        top_k = k if k is not None else Configuration.from_runnable_config(config).evidence_top_k
+        hits = store.search(query, top_k) if store is not None else []
+        return [evidence.to_hit() for evidence in hits] or NO_EVIDENCE
+
+    return StructuredTool.from_function(
+        coroutine=_retrieve,
+        name=EVIDENCE_TOOL_NAME,
+        description=EVIDENCE_TOOL_DESCRIPTION,
+        args_schema=EvidenceInput,
+    )
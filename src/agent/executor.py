@@ -1,17 +1,77 @@
-import os
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import merge_configs
+from langchain_core.tools import BaseTool
 from langgraph.prebuilt import create_react_agent
-from .tools import tools
-from .state import PlanExecute, get_default_state
-from .prompts import get_executor_system_prompt
-from .llm_config import get_azure_llm
-
-# Choose the LLM that will drive the agent
-llm = get_azure_llm(
-    model="gpt-4",
-    temperature=0,
-    deployment_name=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME_EXECUTOR", "gpt-4")
+from langgraph.prebuilt.chat_agent_executor import AgentState
+from .tools import evidence_tools, tools
+from .configuration import Configuration
+from .evidence import EvidenceStore, use_evidence_store
+from .draft import DraftDocument, apply_step_output, section_task_input
+from .task_router import normalize_task, record_route, task_kind
+from .tokens import count_tokens
+from .prompt_assembly import executor_messages
+from .llm_config import get_role_runnable
+from .streaming import (
+    draft_event,
+    get_writer,
+    step_end_event,
+    step_start_event,
+    token_event,
+    tool_end_event,
+    tool_start_event,
 )
 
+class ExecutorAgentState(AgentState):
+    """State of the ReAct sub-agent; the time context and prompt layout are supplied per invocation."""
+    time_context: str
+    compact_prompts: bool
+    prompt_stats: bool
+
+
+def _executor_prompt(state: ExecutorAgentState) -> List[BaseMessage]:
+    """Build the sub-agent prompt from the time context carried in its state."""
+    return executor_messages(
+        state["messages"],
+        state["time_context"],
+        state.get("compact_prompts", True),
+        state.get("prompt_stats", False),
+    )
+
+
+def _react_agent(llm: BaseChatModel, agent_tools: Sequence[BaseTool]) -> Runnable[Any, Any]:
+    # Each step is a fresh, self-contained sub-agent run: opt out of inheriting
+    # the parent graph's checkpointer so its messages are never persisted.
+    return create_react_agent(
+        llm,
+        agent_tools,
+        prompt=_executor_prompt,
+        state_schema=ExecutorAgentState,
+        checkpointer=False,
+    )
+
+
+def _build_agent_executor(llm: BaseChatModel) -> Runnable[Any, Any]:
+    return _react_agent(llm, tools)
+
+
+def _build_evidence_agent_executor(llm: BaseChatModel) -> Runnable[Any, Any]:
+    return _react_agent(llm, [*tools, *evidence_tools])
+
+
+def get_agent_executor(config: Optional[RunnableConfig] = None) -> Runnable[Any, Any]:
+    """Return the ReAct sub-agent for the model routed to the executor role.
+    
+    The sub-agent is compiled once per model and reused for every step. Only
+    the time context changes between steps, and it is passed in as runtime state.
+    With ``evidence_store`` enabled it also gets the retrieval tool of ``evidence.py``.
+    """
+    if Configuration.from_runnable_config(config).evidence_store:
+        return get_role_runnable("executor", _build_evidence_agent_executor, config)
+    return get_role_runnable("executor", _build_agent_executor, config)
+
 
 def _prepare_time_context(state: dict) -> str:
     """Prepare time context string from state."""
@@ -21,37 +81,47 @@ def _prepare_time_context(state: dict) -> str:
     )
 
 
-def _is_document_related_task(task_description: str) -> bool:
+def _is_document_related_task(
+    task_description: str, step_kinds: Optional[Mapping[str, str]] = None
+) -> bool:
     """
     Check if a task is related to document creation/editing.
     
     Args:
         task_description: The task description to check.
+        step_kinds: Planner task kind tags (see ``task_router.py``).
         
     Returns:
         True if the task is document-related, False otherwise.
     """
-    document_keywords = [
-        "draft", "report", "summary", "document", "review", "refine", "generate", 
-        "write", "add to", "organize", "create", "compile", "structure"
-    ]
-    return any(kw in task_description.lower() for kw in document_keywords)
+    return task_kind(task_description, step_kinds) == "draft"
 
 
-def _prepare_task_input(task_description: str, current_draft_content: str = None) -> str:
+def _prepare_task_input(
+    task_description: str,
+    current_draft_content: Optional[str] = None,
+    section_edits: bool = False,
+    task_is_document_related: Optional[bool] = None,
+) -> str:
     """
     Prepare task input for the agent, including draft content if relevant.
     
     Args:
         task_description: The task description.
         current_draft_content: Optional existing draft content.
+        section_edits: Send the draft outline and targeted sections and ask for
+            section patches (see ``draft.py``) instead of the whole draft.
+        task_is_document_related: The routing decision, if already made.
         
     Returns:
         Formatted task input string for the agent.
     """
-    task_is_document_related = _is_document_related_task(task_description)
+    if task_is_document_related is None:
+        task_is_document_related = _is_document_related_task(task_description)
     
-    if task_is_document_related and current_draft_content:
+    if task_is_document_related and current_draft_content and section_edits:
+        return section_task_input(task_description, DraftDocument.parse(current_draft_content))
+    elif task_is_document_related and current_draft_content:
         return f"""Current Task: {task_description}
 
 You MUST operate on or use the following EXISTING DRAFT CONTENT:
@@ -70,93 +140,147 @@ You MUST operate on or use the following EXISTING DRAFT CONTENT:
 def _update_draft_report(
     task_description: str, 
     agent_output: str, 
-    current_draft_content: str = None
-) -> str:
+    current_draft_content: Optional[str] = None,
+    task_is_document_related: Optional[bool] = None,
+) -> Optional[str]:
     """
     Determine if the agent output should update the draft report.
     
     Args:
         task_description: The task description.
-        agent_output: The output from the agent.
+        agent_output: The output from the agent: section patches, or the
+            whole new draft.
         current_draft_content: Optional existing draft content.
+        task_is_document_related: The routing decision, if already made.
         
     Returns:
         Updated draft report content.
     """
-    if _is_document_related_task(task_description):
-        return agent_output
+    if task_is_document_related is None:
+        task_is_document_related = _is_document_related_task(task_description)
+    if task_is_document_related:
+        return apply_step_output(current_draft_content, agent_output)
     return current_draft_content
 
 
 async def _execute_task_with_agent(
     task_input: str, 
-    time_context: str
+    time_context: str,
+    task_description: Optional[str] = None,
+    token_target: str = "output",
+    config: Optional[RunnableConfig] = None
 ) -> str:
     """
-    Execute a task using the ReAct agent.
+    Execute a task using the ReAct agent, streaming its progress.
+    
+    Token deltas and tool calls are emitted as custom stream events (see
+    ``streaming.py``) while the agent runs.
     
     Args:
         task_input: The formatted task input for the agent.
         time_context: Time context string.
+        task_description: The plan step, used to label stream events.
+        token_target: "draft" if the generated text is new draft content.
+        config: The runnable config of the calling node, used for model routing.
         
     Returns:
         The final output from the agent.
     """
-    executor_system_prompt = get_executor_system_prompt(time_context)
-    agent_executor = create_react_agent(llm, tools, prompt=executor_system_prompt)
+    writer = get_writer()
+    step = task_description or task_input
+    final_state: Optional[Dict[str, Any]] = None
+    # Tag the sub-agent run with its plan step for per-step instrumentation.
+    run_config = merge_configs(config, {"metadata": {"agent_step": step}})
+    configuration = Configuration.from_runnable_config(config)
+    async for mode, chunk in get_agent_executor(config).astream(
+        {
+            "messages": [("user", task_input)],
+            "time_context": time_context,
+            "compact_prompts": configuration.compact_prompts,
+            "prompt_stats": configuration.prompt_stats,
+        },
+        run_config,
+        stream_mode=["messages", "updates", "values"],
+    ):
+        if mode == "values":
+            final_state = chunk
+        elif mode == "messages":
+            message, metadata = chunk
+            if (
+                isinstance(message, AIMessageChunk)
+                and isinstance(message.content, str)
+                and message.content
+                and metadata.get("langgraph_node") == "agent"
+            ):
+                writer(token_event("executor", step, message.content, token_target))
+        else:
+            for node_name, update in chunk.items():
+                for message in (update or {}).get("messages", []):
+                    if node_name == "agent" and isinstance(message, AIMessage):
+                        for tool_call in message.tool_calls:
+                            writer(tool_start_event(step, tool_call["name"], tool_call["id"], tool_call["args"]))
+                    elif node_name == "tools" and isinstance(message, ToolMessage):
+                        writer(tool_end_event(step, message.name, message.tool_call_id, message.content))
     
-    agent_response_obj = await agent_executor.ainvoke(
-        {"messages": [("user", task_input)]}
-    )
-    
-    return agent_response_obj["messages"][-1].content
+    if final_state is None:
+        raise RuntimeError(f"The executor agent finished step {step!r} without a final state")
+    return str(final_state["messages"][-1].content)
 
 
-async def execute_step(state: PlanExecute):
-    """
-    Execute a single step from the plan.
+async def execute_task(
+    task_description: str,
+    current_draft_content: Optional[str],
+    time_context: str,
+    config: Optional[RunnableConfig] = None,
+    step_kinds: Optional[Mapping[str, str]] = None,
+    evidence: Optional[EvidenceStore] = None,
+) -> Tuple[str, Optional[str]]:
+    """Execute a single plan step and compute the resulting draft report.
     
     Args:
-        state: The current agent state.
+        task_description: The plan step to execute.
+        current_draft_content: Optional existing draft content.
+        time_context: Time context string.
+        config: The runnable config of the calling node, used for model routing.
+        step_kinds: Planner task kind tags, consulted before the task router.
+        evidence: The run's evidence store; the step's search hits are added
+            to it and its retrieval tool reads from it.
         
     Returns:
-        Updated state with execution results.
+        A tuple of the agent output and the (possibly updated) draft report.
     """
-    # Get default state values and update with current state
-    current_state = get_default_state()
-    current_state.update(state)
-    
-    # Handle empty plan case
-    if not current_state["plan"]:
-        return {
-            "past_steps": [("No task to execute", "Plan was empty.")],
-            "current_draft_report": current_state.get("current_draft_report")
-        }
-
-    # Get the current task (first task in the plan)
-    current_task_description = current_state["plan"][0]
-    current_draft_content = current_state.get("current_draft_report")
-    
-    # Prepare time context and task input
-    time_context = _prepare_time_context(current_state)
-    task_input = _prepare_task_input(current_task_description, current_draft_content)
-    
-    # Execute the task
-    agent_final_output = await _execute_task_with_agent(task_input, time_context)
-    
-    # Update draft report if needed
+    use_evidence_store(evidence)
+    writer = get_writer()
+    writer(step_start_event(task_description))
+    configuration = Configuration.from_runnable_config(config)
+    section_edits = configuration.draft_section_edits and (
+        count_tokens(current_draft_content or "") >= configuration.draft_section_edits_min_tokens
+    )
+    kind = task_kind(task_description, step_kinds)
+    is_draft_task = kind == "draft"
+    task_input = _prepare_task_input(
+        task_description, current_draft_content, section_edits, is_draft_task
+    )
+    record_route(
+        kind,
+        step_kinds is not None and normalize_task(task_description) in step_kinds,
+        count_tokens(task_input) if is_draft_task and current_draft_content else 0,
+    )
+    agent_final_output = await _execute_task_with_agent(
+        task_input,
+        time_context,
+        task_description,
+        "draft" if is_draft_task else "output",
+        config,
+    )
     new_draft_report_content = _update_draft_report(
-        current_task_description, 
+        task_description, 
         agent_final_output, 
-        current_draft_content
+        current_draft_content,
+        is_draft_task,
     )
-    
-    # Remove the executed task from the plan
-    # This ensures the next iteration will execute the next task in the plan
-    remaining_plan = current_state["plan"][1:] if len(current_state["plan"]) > 1 else []
-    
-    return {
-        "past_steps": [(current_task_description, agent_final_output)],
-        "current_draft_report": new_draft_report_content,
-        "plan": remaining_plan,  # Update plan to remove executed task
-    }
\ No newline at end of file
+    writer(step_end_event(task_description, agent_final_output))
+    if new_draft_report_content != current_draft_content:
+        writer(draft_event(task_description, new_draft_report_content))
+    return agent_final_output, new_draft_report_content
+
@@ -0,0 +1,353 @@
+"""Offline stand-ins for the external services used by the agent.
+
+These fakes are deterministic so they can drive unit tests and benchmarks
+without network access or API keys. ``registered_models`` and ``fake_search``
+install them for a block of code, and ``research_planner``,
+``searching_executor`` and ``finishing_replanner`` script the research
+workload shared by the benchmark, the load test and the tests.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+from contextlib import contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+)
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, Field, PrivateAttr
+
+from . import llm_config
+from .search import (
+    SEARCH_TOOL_NAME,
+    SearchStats,
+    build_search_service,
+    register_search_service,
+)
+from .tokens import count_tokens
+
+FINAL_STEP = "Write the final report from the findings"
+
+
+def sample_latency(rng: random.Random, median_seconds: float, sigma: float) -> float:
+    """Draw a latency from a log-normal distribution.
+
+    Model and API latencies are right-skewed: most calls are close to the
+    median and a few take several times longer. ``sigma`` is the standard
+    deviation of the log latency; 0 always returns the median, 0.5 gives a
+    p99 about three times the median.
+    """
+    if median_seconds <= 0 or sigma <= 0:
+        return max(0.0, median_seconds)
+    return rng.lognormvariate(math.log(median_seconds), sigma)
+
+
+class FakeSearchBackend:
+    """Search backend returning deterministic results derived from the query."""
+
+    def __init__(
+        self, latency_seconds: float = 0.0, fail_on: str = "", latency_sigma: float = 0.0, seed: Optional[int] = None
+    ) -> None:
+        """Create a backend answering after ``latency_seconds`` and failing queries containing ``fail_on``."""
+        self.latency_seconds = latency_seconds
+        self.latency_sigma = latency_sigma
+        self.fail_on = fail_on
+        self.queries: List[str] = []
+        self._rng = random.Random(seed)
+
+    async def asearch(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        """Return ``max_results`` synthetic hits for ``query``."""
+        self.queries.append(query)
+        if self.latency_seconds:
+            await asyncio.sleep(sample_latency(self._rng, self.latency_seconds, self.latency_sigma))
+        if self.fail_on and self.fail_on in query:
+            raise RuntimeError(f"Search backend failed for {query!r}")
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+        return [
+            {
+                "title": f"Result {i + 1} for {query}",
+                "url": f"https://example.com/{digest}/{i}",
+                "content": f"Synthetic finding {i + 1} about {query}.",
+            }
+            for i in range(max_results)
+        ]
+
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model for offline runs.
+
+    Each call consumes the next item of ``responses``; once they are used up,
+    ``responder`` (if set) is called with the prompt messages, otherwise a
+    generic reply echoing the last message is returned. An item may be:
+    - a string: the message content;
+    - a dict or pydantic model: serialized to JSON, which is what
+      ``with_structured_output`` parses;
+    - an ``AIMessage``: returned as is, e.g. to script tool calls.
+
+    Token usage is reported from a local tokenizer and accumulated in
+    ``input_tokens``/``output_tokens``. Each call waits ``latency_seconds``
+    before the first token plus ``seconds_per_token`` per output token, and
+    streamed responses are split into word-sized chunks. With
+    ``latency_sigma`` set, the wait before the first token is drawn from a
+    log-normal distribution with median ``latency_seconds`` instead.
+    """
+
+    responses: List[Any] = Field(default_factory=list)
+    responder: Optional[Callable[[List[BaseMessage]], Any]] = None
+    latency_seconds: float = 0.0
+    seconds_per_token: float = 0.0
+    latency_sigma: float = 0.0
+    # Seed of the latency draws, for reproducible runs
+    seed: Optional[int] = None
+
+    _rng: Optional[random.Random] = PrivateAttr(default=None)
+    _index: int = PrivateAttr(default=0)
+    _input_tokens: int = PrivateAttr(default=0)
+    _output_tokens: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def call_count(self) -> int:
+        """Number of calls made to the model."""
+        return self._index
+
+    @property
+    def input_tokens(self) -> int:
+        """Prompt tokens received over all calls."""
+        return self._input_tokens
+
+    @property
+    def output_tokens(self) -> int:
+        """Tokens generated over all calls."""
+        return self._output_tokens
+
+    def _first_token_latency(self) -> float:
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        return sample_latency(self._rng, self.latency_seconds, self.latency_sigma)
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        index = self._index
+        self._index += 1
+        if index < len(self.responses):
+            response = self.responses[index]
+        elif self.responder is not None:
+            response = self.responder(messages)
+        else:
+            response = f"Fake response to: {str(messages[-1].content)[:200]}"
+
+        if isinstance(response, AIMessage):
+            message = response.model_copy()
+        elif isinstance(response, BaseModel):
+            message = AIMessage(content=response.model_dump_json())
+        elif isinstance(response, (dict, list)):
+            message = AIMessage(content=json.dumps(response))
+        else:
+            message = AIMessage(content=str(response))
+
+        input_tokens = sum(count_tokens(str(m.content)) for m in messages)
+        output_tokens = count_tokens(str(message.content))
+        self._input_tokens += input_tokens
+        self._output_tokens += output_tokens
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return message
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency_seconds:
+            await asyncio.sleep(self._first_token_latency())
+        result = self._generate(messages, stop, **kwargs)
+        if self.seconds_per_token:
+            message = result.generations[0].message
+            usage = message.usage_metadata if isinstance(message, AIMessage) else None
+            await asyncio.sleep(self.seconds_per_token * (usage["output_tokens"] if usage else 0))
+        return result
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency_seconds:
+            await asyncio.sleep(self._first_token_latency())
+        message = self._next_message(messages)
+        for piece in re.findall(r"\S+\s*|\s+", str(message.content)):
+            if self.seconds_per_token:
+                await asyncio.sleep(self.seconds_per_token * count_tokens(piece))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                    for i, call in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata,
+            )
+        )
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        """Accept tools; tool calls are scripted through ``responses``."""
+        return self
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Runnable[Any, Any]:
+        """Parse the JSON content of each response into ``schema``."""
+
+        def _parse(message: BaseMessage) -> Any:
+            return schema.model_validate_json(str(message.content))
+
+        return self | RunnableLambda(_parse)
+
+
+def default_fake_responder(role: str) -> Callable[[List[BaseMessage]], Any]:
+    """Return a responder producing plausible outputs for ``role``.
+
+    The planner returns a single search step for the objective, the executor
+    summarizes its task and the replanner answers from the executed steps, so
+    a complete graph run finishes after one plan-execute-replan cycle.
+
+    Args:
+        role: One of "planner", "executor" or "replanner".
+
+    Returns:
+        A responder for ``FakeChatModel``.
+    """
+
+    def _last_text(messages: List[BaseMessage]) -> str:
+        return " ".join(str(messages[-1].content).split())[:200] if messages else ""
+
+    def planner(messages: List[BaseMessage]) -> Any:
+        return {
+            "steps": [f"Use TavilySearchResults to find information on: {_last_text(messages)}"],
+            "dependencies": [[]],
+        }
+
+    def executor(messages: List[BaseMessage]) -> Any:
+        return f"Fake findings for the task: {_last_text(messages)}"
+
+    def replanner(messages: List[BaseMessage]) -> Any:
+        return {"action": {"response": "Fake final answer based on the executed steps."}}
+
+    return {"planner": planner, "executor": executor, "replanner": replanner}[role]
+
+
+@contextmanager
+def registered_models(models: Mapping[str, BaseChatModel]) -> Iterator[None]:
+    """Temporarily route roles to ``models``, restoring earlier overrides afterwards."""
+    previous = {role: llm_config._overrides.get(role) for role in models}
+    try:
+        for role, model in models.items():
+            llm_config.register_llm(role, model)
+        yield
+    finally:
+        for role, previous_model in previous.items():
+            llm_config.register_llm(role, previous_model)
+
+
+@contextmanager
+def fake_search(backend: FakeSearchBackend, rate_per_second: float = 0.0) -> Iterator[SearchStats]:
+    """Route every search to ``backend`` through a fresh service with its own cache and stats."""
+    service = build_search_service(backend, rate_per_second=rate_per_second)
+    register_search_service(service)
+    try:
+        yield service.stats
+    finally:
+        register_search_service(None)
+
+
+def _objective(messages: List[BaseMessage]) -> str:
+    return " ".join(str(messages[-1].content).split())[:200] if messages else ""
+
+
+def research_planner(searches: int) -> Callable[[List[BaseMessage]], Any]:
+    """Plan ``searches`` independent searches followed by a report step using all of them."""
+
+    def respond(messages: List[BaseMessage]) -> Any:
+        objective = _objective(messages)
+        steps = [
+            f"Use TavilySearchResults to find information on aspect {i + 1} of: {objective}"
+            for i in range(searches)
+        ]
+        return {
+            "steps": steps + [FINAL_STEP],
+            "dependencies": [[] for _ in steps] + [list(range(searches))],
+        }
+
+    return respond
+
+
+def searching_executor(output_words: int) -> Callable[[List[BaseMessage]], Any]:
+    """Search once for search steps, then answer; answer directly otherwise."""
+    call_ids = itertools.count()
+
+    def respond(messages: List[BaseMessage]) -> Any:
+        task = next(
+            (str(m.content) for m in messages if isinstance(m, HumanMessage)), ""
+        ).splitlines()[0]
+        if "TavilySearchResults" in task and not isinstance(messages[-1], ToolMessage):
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": SEARCH_TOOL_NAME, "args": {"query": task}, "id": f"call_{next(call_ids)}"}],
+            )
+        return f"Findings for {task}: " + " ".join(f"fact{i}" for i in range(output_words))
+
+    return respond
+
+
+def finishing_replanner(messages: List[BaseMessage]) -> Any:
+    """Answer once the report step ran, otherwise keep the report step pending."""
+    prompt = "\n".join(str(m.content) for m in messages)
+    if re.search(rf"Step \d+: {re.escape(FINAL_STEP)}", prompt):
+        return {"action": {"response": "Final report based on the executed steps."}}
+    return {"action": {"steps": [FINAL_STEP], "dependencies": [[]]}}
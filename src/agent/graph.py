@@ -1,91 +1,214 @@
+from typing import Literal
+
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 
+from .checkpointer import get_checkpointer
+from .instrumentation import get_instrumentation
 from .state import PlanExecute
 from .planner import plan_step  # Updated import
-from .executor import execute_step
+from .plan_optimizer import optimize_plan_step
+from .scheduler import schedule_step
 from .replanner import replan_step
+from .replan_policy import should_replan
+from .entry_router import direct_answer_step, route_step, single_step
+from .budget import budget_exhausted, finalize_step, metered
 
 """
 Graph拓扑图 (Graph Topology):
 
 工作流程说明：
-1. Planner: 创建初始计划 (plan = ["task1", "task2", "task3"])
-2. Executor: 执行 plan[0] (task1)，执行后从 plan 中移除该任务
-   - 执行后: plan = ["task2", "task3"]
-   - 将执行结果添加到 past_steps
-3. Replanner: 分析执行结果和剩余计划
+0. Router: 对目标做轻量分类 (不调用模型)，结果记录在 state["route"] / state["route_reason"]
+   - direct: 一次无工具的模型调用直接回答 (如 "what year is it?")
+   - single_step: 一次 executor 调用，输出即为最终回答
+   - full: 进入完整的 planner → scheduler → replanner 循环
+   - 失败时逐级升级: direct → single_step → full；entry_route 配置可强制指定路径
+1. Planner: 创建初始计划 (plan = ["task1", "task2", "task3"])，
+   并声明步骤之间的依赖 (plan_dependencies = [[], [], [0, 1]])
+1.5 Plan Optimizer: 不调用模型，确定性地整理初始计划 (见 plan_optimizer.py)
+   - 去掉编号和空步骤，删除相似度高的重复步骤，将相邻的独立搜索合并为一个多查询步骤
+   - 设置 plan_max_steps (默认关闭) 且计划超长时，保留前面的步骤和最后一步；节省的步骤记录在 state["plan_optimizer_stats"]
+2. Scheduler: 并发执行所有依赖已满足的步骤 (task1 与 task2)，执行后从 plan 中移除
+   - 执行后: plan = ["task3"], plan_dependencies = [[]]
+   - 按计划顺序将执行结果添加到 past_steps（结果顺序是确定的）
+   - 并发数由 config 中的 max_concurrency 限制
+3. 重规划策略 (replan_policy): 决定本轮执行后是否需要调用 Replanner
+   - always: 每轮都调用 (默认)
+   - on_failure: 仅当步骤输出看起来是错误或拒绝时调用
+   - every_n_steps: 每执行 N 个步骤调用一次 (失败时提前调用)
+   - at_end: 仅在计划执行完毕时调用
+   - 不需要时直接回到 Scheduler 执行剩余计划；计划为空时总是调用 Replanner
+4. Replanner: 分析执行结果和剩余计划
    - 如果任务完成 → 返回 Response，结束流程
    - 如果未完成 → 返回新的 Plan（包含剩余任务或调整后的任务）
-4. 循环: 如果 replanner 返回 Plan，流程回到 Executor 继续执行
+5. 循环: 如果 replanner 返回 Plan，流程回到 Scheduler 继续执行
+   - 开启 speculative_execution 时，Replanner 运行期间会提前执行下一个待执行步骤；
+     新计划保留该步骤则提交结果，否则取消并丢弃 (见 speculation.py)
+   - 若提交后计划已为空，则直接回到 Replanner 审阅该步骤
+6. 预算 (budget.py): 每个节点都经 metered 包装，统计 token 和搜索调用次数 (state["budget_usage"])
+   - Router 在每次运行开始时重置用量，同一线程上之前运行的 token、耗时和步骤不计入本次预算
+   - Plan Optimizer、Scheduler、Replanner 之后的条件边会检查步骤数、token、耗时、搜索次数和重复步骤
+   - 任一预算耗尽 → Finalize: 不调用模型，直接返回当前草稿 (或最后一个有效步骤的输出)，
+     原因记录在 state["budget_stop"]
 
     [START]
        |
        v
+   ┌────────┐  direct  ┌───────────────┐
+   │ router │─────────►│ direct_answer │──► [END] (或升级到 single_step)
+   └───┬────┘          └───────────────┘
+       |    single_step ┌─────────────┐
+       ├───────────────►│ single_step │──► [END] (或升级到 planner)
+       |  full          └─────────────┘
+       v
    ┌─────────┐
-   │ planner │  (入口节点，创建初始计划)
+   │ planner │  (创建初始计划)
    └────┬────┘
         |
         v
-   ┌──────────┐
-   │ executor │  (执行 plan[0]，执行后从 plan 中移除)
-   └────┬─────┘
+   ┌────────────────┐
+   │ plan_optimizer │  (去重、合并搜索、限制长度)
+   └────┬───────────┘
         |
         v
    ┌───────────┐
+   │ scheduler │◄──────┐  (并发执行一批相互独立的步骤，执行后从 plan 中移除)
+   └────┬──────┘       |
+        |              |
+        | (条件边) ────┘  如果重规划策略认为无需重规划 → scheduler
+        v
+   ┌───────────┐
    │ replanner │  (分析结果，决定继续或结束)
    └────┬──────┘
         |
         | (条件边)
         ├─── 如果 state["response"] 存在 → [END]
         |
-        └─── 否则 → executor (循环执行剩余任务)
+        └─── 否则 → scheduler (循环执行剩余任务)
+
+   plan_optimizer / scheduler / replanner ──(预算耗尽)──► ┌──────────┐
+                                                   │ finalize │──► [END]
+                                                   └──────────┘
 """
 
 # Define the graph
 workflow = StateGraph(PlanExecute)
 
-# Add the nodes
-workflow.add_node("planner", plan_step)  # Updated function mapping
-workflow.add_node("executor", execute_step)
-workflow.add_node("replanner", replan_step)
+# Add the nodes; metered nodes count their tokens and search calls towards the run budgets
+workflow.add_node("router", metered(route_step))
+workflow.add_node("direct_answer", metered(direct_answer_step))
+workflow.add_node("single_step", metered(single_step))
+workflow.add_node("planner", metered(plan_step))  # Updated function mapping
+workflow.add_node("plan_optimizer", metered(optimize_plan_step))
+workflow.add_node("scheduler", metered(schedule_step))
+workflow.add_node("replanner", metered(replan_step))
+workflow.add_node("finalize", finalize_step)
+workflow.add_edge("finalize", END)
 
 # Set the entrypoint
-workflow.set_entry_point("planner")
+workflow.set_entry_point("router")
+
+
+# Route the objective, and escalate a short route that did not produce a response
+def route_objective(
+    state: PlanExecute,
+) -> Literal["__end__", "direct_answer", "single_step", "planner"]:
+    """Determine which path the objective takes."""
+    if state.get("response"):
+        return "__end__"
+    if state.get("route") == "direct":
+        return "direct_answer"
+    if state.get("route") == "single_step":
+        return "single_step"
+    return "planner"
+
+for short_route in ("router", "direct_answer", "single_step"):
+    workflow.add_conditional_edges(
+        short_route,
+        route_objective,
+        {
+            END: END,
+            "direct_answer": "direct_answer",
+            "single_step": "single_step",
+            "planner": "planner",
+        }
+    )
+
+# Define the edges; a run whose budget is exhausted is finalized instead
+def route_after_planning(state: PlanExecute, config: RunnableConfig) -> Literal["scheduler", "finalize"]:
+    """Determine whether to start executing the plan."""
+    if budget_exhausted(state, config):
+        return "finalize"
+    return "scheduler"
+
+workflow.add_edge("planner", "plan_optimizer")
+workflow.add_conditional_edges(
+    "plan_optimizer",
+    route_after_planning,
+    {
+        "scheduler": "scheduler",
+        "finalize": "finalize",
+    }
+)
+
+
+# Define conditional logic for skipping the replanner while the plan is on track
+def route_after_execution(
+    state: PlanExecute, config: RunnableConfig
+) -> Literal["replanner", "scheduler", "finalize"]:
+    """Determine whether to replan or keep executing the remaining plan."""
+    if budget_exhausted(state, config):
+        return "finalize"
+    if should_replan(state, config):
+        return "replanner"
+    return "scheduler"
+
+workflow.add_conditional_edges(
+    "scheduler",
+    route_after_execution,
+    {
+        "replanner": "replanner",
+        "scheduler": "scheduler",
+        "finalize": "finalize",
+    }
+)
 
-# Define the edges
-workflow.add_edge("planner", "executor")
-workflow.add_edge("executor", "replanner")
 
 # Define conditional logic for continuing or finishing after replanning
-def should_end(state: PlanExecute):  # Renamed and logic adjusted
-    """Determines whether to end the process or continue to the agent (executor)."""
+def should_end(  # Renamed and logic adjusted
+    state: PlanExecute, config: RunnableConfig
+) -> Literal["__end__", "finalize", "replanner", "scheduler"]:
+    """Determines whether to end the process or continue to the scheduler."""
     if "response" in state and state["response"]:
-        return END
+        return "__end__"
+    elif budget_exhausted(state, config):
+        return "finalize"
+    elif not state.get("plan") and state.get("steps_since_replan"):
+        # A committed speculative step emptied the plan: review it right away
+        return "replanner"
     else:
-        # Corresponds to 'agent' in the example, which is our 'executor' node
-        return "executor"  
+        # Corresponds to 'agent' in the example; the scheduler runs the executor
+        return "scheduler"
 
 workflow.add_conditional_edges(
     "replanner",
     should_end,  # Updated function
     {
         END: END,
-        "executor": "executor", 
+        "scheduler": "scheduler",
+        "replanner": "replanner",
+        "finalize": "finalize",
     }
 )
 
 
-# Compile the graph
-# memory = SqliteSaver.from_conn_string(":memory:") # Example for in-memory checkpointer
-# graph = workflow.compile(checkpointer=memory)
-
-# For local testing without a persistent checkpointer initially:
-graph = workflow.compile(name="Plan and Execute Agent")
-
-# To make the agent runnable, you'd typically expose `graph`
-# and provide a way to invoke it, e.g., via a FastAPI endpoint or a CLI.
+# Compile the graph. The checkpointer is selected by AGENT_CHECKPOINT_BACKEND
+# (none, memory, sqlite or a custom factory, see checkpointer.py); with one,
+# interrupted runs can be resumed by thread_id with checkpointer.aresume.
+graph = workflow.compile(checkpointer=get_checkpointer(), name="Plan and Execute Agent")
 
-# The configuration part from the original template might need to be adapted
-# if you want to make parts of this plan-and-execute agent configurable
-# (e.g., the models used in planner, executor, replanner).
-# For now, the models are hardcoded in their respective files.
+# Per-node latency/token/cost traces, enabled by AGENT_INSTRUMENTATION (see
+# instrumentation.py). When disabled no callback is attached at all.
+instrumentation = get_instrumentation()
+if instrumentation is not None:
+    graph = graph.with_config(callbacks=[instrumentation])
@@ -0,0 +1,636 @@
+"""Per-node latency, token and cost instrumentation.
+
+``Instrumentation`` is a LangChain callback handler. Attached to a run, it
+records a bounded trace per graph run:
+
+- ``node``: wall time of each graph node (planner, scheduler, replanner).
+- ``step``: wall time of each executor plan step.
+- ``llm``: wall time, time spent waiting for a role concurrency slot,
+  prompt/completion tokens and estimated cost of each model call.
+- ``tool``: wall time of each tool call.
+- ``queue``: time a plan step waited for a scheduler slot.
+
+LLM, tool and queue records carry the graph node they ran in and, for
+executor work, the plan step. ``RunTrace.summary()`` aggregates them per
+node and per step, and reports graph overhead (run time not spent in
+nodes). Finished traces are handed to exporters:
+``PrometheusExporter`` renders metrics in the Prometheus text format and
+``OpenTelemetryExporter`` emits one span per record.
+
+Instrumentation is off by default and then adds no callbacks at all. It is
+enabled for the deployed graph with the ``instrumentation`` configuration
+field (``AGENT_INSTRUMENTATION=trace,prometheus,otel``), or per run:
+
+    instrumentation = Instrumentation(exporters=[PrometheusExporter()])
+    await graph.ainvoke(inputs, {"callbacks": [instrumentation]})
+    instrumentation.last_trace().summary()
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Protocol, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+
+from .configuration import Configuration
+
+QUEUE_WAIT_EVENT = "agent_queue_wait"
+# Response metadata key in which a chat model reports its role-slot wait.
+QUEUE_SECONDS_KEY = "agent_queue_seconds"
+# Waits shorter than this are not worth an event.
+QUEUE_WAIT_MIN_SECONDS = 0.001
+
+# USD per 1K (prompt, completion) tokens, matched by longest model-name prefix.
+MODEL_PRICES_PER_1K: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4.1-mini": (0.0004, 0.0016),
+    "gpt-4.1": (0.002, 0.008),
+    "gpt-4": (0.03, 0.06),
+    "gpt-35-turbo": (0.0005, 0.0015),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+
+def estimate_cost(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    prices: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> float:
+    """Estimate the USD cost of a call; unknown models cost 0."""
+    prices = MODEL_PRICES_PER_1K if prices is None else prices
+    name = (model or "").lower()
+    matches = [prefix for prefix in prices if name.startswith(prefix)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = prices[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+def llm_token_usage(response: LLMResult) -> Tuple[int, int]:
+    """Return the (prompt, completion) tokens reported in a model response."""
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += usage.get("input_tokens", 0)
+            completion_tokens += usage.get("output_tokens", 0)
+    if not prompt_tokens and not completion_tokens:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+async def record_queue_wait(
+    queue: str,
+    seconds: float,
+    step: Optional[str] = None,
+    config: Optional[RunnableConfig] = None,
+) -> None:
+    """Report time spent waiting for a concurrency slot to the run's callbacks.
+
+    Short waits and calls outside of a run are ignored. Chat models report
+    their own waits in ``response_metadata[QUEUE_SECONDS_KEY]`` instead.
+
+    Args:
+        queue: Name of the queue, e.g. "scheduler".
+        seconds: Time spent waiting.
+        step: The plan step that waited, if any.
+        config: Config of the run the wait belongs to.
+    """
+    if seconds < QUEUE_WAIT_MIN_SECONDS:
+        return
+    from langchain_core.callbacks.manager import adispatch_custom_event
+
+    try:
+        await adispatch_custom_event(
+            QUEUE_WAIT_EVENT, {"queue": queue, "seconds": seconds, "step": step}, config=config
+        )
+    except RuntimeError:
+        pass
+
+
+@dataclass
+class TraceRecord:
+    """One timed unit of work within a run."""
+
+    kind: str
+    name: str
+    node: Optional[str] = None
+    step: Optional[str] = None
+    start_seconds: float = 0.0
+    duration_seconds: float = 0.0
+    queue_seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class RunTrace:
+    """Bounded trace of one graph run; offsets are relative to ``started_at``."""
+
+    run_id: str
+    started_at: float
+    max_records: int = 500
+    duration_seconds: Optional[float] = None
+    error: Optional[str] = None
+    dropped: int = 0
+    records: Deque[TraceRecord] = field(default_factory=deque)
+    # ``time.perf_counter()`` at the start of the run, for record offsets
+    origin: float = field(default=0.0, repr=False)
+
+    def add(self, record: TraceRecord) -> None:
+        """Append ``record``, dropping the oldest one once the trace is full."""
+        if len(self.records) >= self.max_records:
+            self.records.popleft()
+            self.dropped += 1
+        self.records.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregate the records per node and per step."""
+        nodes: Dict[str, Dict[str, Any]] = {}
+        steps: Dict[str, Dict[str, Any]] = {}
+        node_seconds = 0.0
+        for record in self.records:
+            if record.kind == "node":
+                node_seconds += record.duration_seconds
+            for key, groups in ((record.node, nodes), (record.step, steps)):
+                if key is None:
+                    continue
+                totals = groups.setdefault(
+                    key,
+                    {
+                        "wall_seconds": 0.0,
+                        "queue_seconds": 0.0,
+                        "llm_calls": 0,
+                        "llm_seconds": 0.0,
+                        "prompt_tokens": 0,
+                        "completion_tokens": 0,
+                        "tool_calls": 0,
+                        "tool_seconds": 0.0,
+                        "cost_usd": 0.0,
+                    },
+                )
+                if record.kind == "node" or (groups is steps and record.kind == "step"):
+                    totals["wall_seconds"] += record.duration_seconds
+                elif record.kind == "llm":
+                    totals["llm_calls"] += 1
+                    totals["llm_seconds"] += record.duration_seconds
+                elif record.kind == "tool":
+                    totals["tool_calls"] += 1
+                    totals["tool_seconds"] += record.duration_seconds
+                totals["queue_seconds"] += record.queue_seconds
+                totals["prompt_tokens"] += record.prompt_tokens
+                totals["completion_tokens"] += record.completion_tokens
+                totals["cost_usd"] += record.cost_usd
+        duration = self.duration_seconds or 0.0
+        return {
+            "run_id": self.run_id,
+            "duration_seconds": duration,
+            "graph_overhead_seconds": max(0.0, duration - node_seconds),
+            "nodes": nodes,
+            "steps": steps,
+            "dropped_records": self.dropped,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the trace as JSON-serializable data."""
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration_seconds,
+            "error": self.error,
+            "dropped": self.dropped,
+            "records": [asdict(record) for record in self.records],
+        }
+
+
+class TraceExporter(Protocol):
+    """Receives every finished run trace."""
+
+    def export(self, trace: RunTrace) -> None:
+        """Handle the finished ``trace``."""
+        ...
+
+
+@dataclass
+class _OpenRun:
+    trace: RunTrace
+    started: float
+    kind: str = "chain"
+    name: str = ""
+    node: Optional[str] = None
+    step: Optional[str] = None
+    model: str = ""
+
+
+class Instrumentation(BaseCallbackHandler):
+    """Callback handler recording per-node and per-step traces of graph runs."""
+
+    run_inline = True
+
+    def __init__(
+        self,
+        exporters: Sequence[TraceExporter] = (),
+        max_runs: int = 100,
+        max_records: int = 500,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> None:
+        """Create a handler keeping the traces of the last ``max_runs`` runs.
+
+        Args:
+            exporters: Receive every finished run trace.
+            max_runs: Number of run traces kept for ``get_trace``.
+            max_records: Records kept per run trace; later ones are counted as dropped.
+            prices: USD per 1K prompt and completion tokens by model-name prefix;
+                ``MODEL_PRICES_PER_1K`` by default.
+        """
+        self.exporters = list(exporters)
+        self.max_runs = max_runs
+        self.max_records = max_records
+        self.prices = prices
+        self.traces: OrderedDict[str, RunTrace] = OrderedDict()
+        self._open: Dict[UUID, _OpenRun] = {}
+        self._lock = threading.Lock()
+
+    def get_trace(self, run_id: Any) -> Optional[RunTrace]:
+        """Return the trace of the graph run ``run_id``, if it is still kept."""
+        return self.traces.get(str(run_id))
+
+    def last_trace(self) -> Optional[RunTrace]:
+        """Return the trace of the most recently started run."""
+        return next(reversed(self.traces.values()), None)
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        kind: str,
+        name: str,
+        metadata: Optional[Dict[str, Any]],
+    ) -> None:
+        now = time.perf_counter()
+        metadata = metadata or {}
+        with self._lock:
+            parent = self._open.get(parent_run_id) if parent_run_id else None
+            if parent is None:
+                if parent_run_id is not None or kind != "chain":
+                    return
+                trace = RunTrace(str(run_id), time.time(), self.max_records, origin=now)
+                self.traces[trace.run_id] = trace
+                while len(self.traces) > self.max_runs:
+                    self.traces.popitem(last=False)
+                self._open[run_id] = _OpenRun(trace, now, kind="run", name=name)
+                return
+            is_node = parent.kind == "run"
+            step = metadata.get("agent_step", parent.step)
+            if kind == "chain" and is_node:
+                kind = "node"
+            elif kind == "chain" and step and step != parent.step:
+                # The outermost run of an executor step, e.g. its ReAct sub-agent.
+                kind, name = "step", step
+            self._open[run_id] = _OpenRun(
+                parent.trace,
+                now,
+                kind=kind,
+                name=name,
+                node=metadata.get("langgraph_node", name) if is_node else parent.node,
+                step=step,
+                model=str(metadata.get("ls_model_name") or ""),
+            )
+
+    def _end(
+        self,
+        run_id: UUID,
+        error: Optional[BaseException] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        queue_seconds: float = 0.0,
+    ) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            run = self._open.pop(run_id, None)
+        if run is None:
+            return
+        trace = run.trace
+        if run.kind == "run":
+            trace.duration_seconds = now - run.started
+            trace.error = repr(error) if error else None
+            for exporter in self.exporters:
+                exporter.export(trace)
+            return
+        if run.kind not in ("node", "step", "llm", "tool"):
+            return
+        cost = estimate_cost(run.model, prompt_tokens, completion_tokens, self.prices)
+        trace.add(
+            TraceRecord(
+                kind=run.kind,
+                name=(run.model or run.name) if run.kind == "llm" else run.name,
+                node=run.node,
+                step=run.step,
+                start_seconds=run.started - trace.origin,
+                duration_seconds=now - run.started,
+                queue_seconds=queue_seconds,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                cost_usd=cost,
+                error=repr(error) if error else None,
+            )
+        )
+
+    def on_chain_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Open the record of a graph, node or chain run."""
+        name = kwargs.get("name") or (serialized or {}).get("name", "")
+        self._start(run_id, parent_run_id, "chain", name, metadata)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        """Close the record of a chain run."""
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Close the record of a failed chain run."""
+        self._end(run_id, error)
+
+    def on_chat_model_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Open the record of a chat model call, named after its role."""
+        name = (metadata or {}).get("agent_role") or (serialized or {}).get("name", "llm")
+        self._start(run_id, parent_run_id, "llm", name, metadata)
+
+    def on_llm_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Open the record of a completion model call."""
+        self._start(run_id, parent_run_id, "llm", (serialized or {}).get("name", "llm"), metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        """Close the record of a model call with its token usage and queue wait."""
+        queue_seconds = sum(
+            getattr(getattr(generation, "message", None), "response_metadata", {}).get(QUEUE_SECONDS_KEY, 0.0)
+            for generations in response.generations
+            for generation in generations
+        )
+        self._end(run_id, None, *llm_token_usage(response), queue_seconds)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Close the record of a failed model call."""
+        self._end(run_id, error)
+
+    def on_tool_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Open the record of a tool call."""
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(run_id, parent_run_id, "tool", name, metadata)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        """Close the record of a tool call."""
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Close the record of a failed tool call."""
+        self._end(run_id, error)
+
+    def on_custom_event(
+        self, name: str, data: Any, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        """Record the queue waits reported with ``QUEUE_WAIT_EVENT``."""
+        if name != QUEUE_WAIT_EVENT:
+            return
+        with self._lock:
+            run = self._open.get(run_id)
+        if run is None:
+            return
+        now = time.perf_counter()
+        run.trace.add(
+            TraceRecord(
+                kind="queue",
+                name=data["queue"],
+                node=run.node,
+                step=data.get("step"),
+                start_seconds=now - data["seconds"] - run.trace.origin,
+                queue_seconds=data["seconds"],
+            )
+        )
+
+
+class PrometheusExporter:
+    """Aggregates finished traces into metrics rendered in the Prometheus text format."""
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+    def __init__(self, prefix: str = "agent", buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """Create an exporter naming its metrics ``<prefix>_...`` with the given latency buckets."""
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _inc(self, name: str, help_text: str, value: float, **labels: str) -> None:
+        self._help.setdefault(name, ("counter", help_text))
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def _observe(self, name: str, help_text: str, value: float, **labels: str) -> None:
+        self._help.setdefault(name, ("histogram", help_text))
+        key = (name, tuple(sorted(labels.items())))
+        # Per-bucket counts, the overflow count, then the sum and the total count.
+        series = self._histograms.setdefault(key, [0.0] * (len(self.buckets) + 3))
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def export(self, trace: RunTrace) -> None:
+        """Add a finished run to the metrics."""
+        p = self.prefix
+        with self._lock:
+            status = "error" if trace.error else "ok"
+            self._inc(f"{p}_runs_total", "Graph runs.", 1, status=status)
+            self._observe(f"{p}_run_duration_seconds", "Graph run wall time.", trace.duration_seconds or 0.0)
+            for r in trace.records:
+                if r.kind == "node":
+                    self._observe(f"{p}_node_duration_seconds", "Graph node wall time.", r.duration_seconds, node=r.name)
+                elif r.kind == "llm":
+                    labels = {"node": r.node or "", "model": r.name}
+                    self._inc(f"{p}_llm_calls_total", "LLM calls.", 1, **labels)
+                    self._observe(f"{p}_llm_duration_seconds", "LLM call wall time.", r.duration_seconds, **labels)
+                    self._inc(f"{p}_llm_tokens_total", "LLM tokens.", r.prompt_tokens, type="prompt", **labels)
+                    self._inc(f"{p}_llm_tokens_total", "LLM tokens.", r.completion_tokens, type="completion", **labels)
+                    self._inc(f"{p}_llm_cost_usd_total", "Estimated LLM cost in USD.", r.cost_usd, **labels)
+                elif r.kind == "tool":
+                    self._inc(f"{p}_tool_calls_total", "Tool calls.", 1, tool=r.name)
+                    self._observe(f"{p}_tool_duration_seconds", "Tool call wall time.", r.duration_seconds, tool=r.name)
+                if r.queue_seconds:
+                    queue = r.name if r.kind == "queue" else f"llm:{r.node or ''}"
+                    self._observe(f"{p}_queue_wait_seconds", "Time spent waiting for a concurrency slot.", r.queue_seconds, queue=queue)
+
+    @staticmethod
+    def _labels(labels: Sequence[Tuple[str, str]], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in items)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, (kind, help_text) in sorted(self._help.items()):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                if kind == "counter":
+                    for (metric, labels), value in sorted(self._counters.items()):
+                        if metric == name:
+                            lines.append(f"{name}{self._labels(labels)} {value:g}")
+                    continue
+                for (metric, labels), series in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0.0
+                    for bound, count in zip(self.buckets, series):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._labels(labels, [('le', f'{bound:g}')])} {cumulative:g}")
+                    lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {series[-1]:g}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {series[-2]:g}")
+                    lines.append(f"{name}_count{self._labels(labels)} {series[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryExporter:
+    """Emits each finished trace as OpenTelemetry spans (requires opentelemetry-api)."""
+
+    def __init__(self, tracer: Any = None) -> None:
+        """Create an exporter emitting spans with ``tracer``; the global "agent" tracer by default."""
+        if tracer is None:
+            try:
+                from opentelemetry import trace
+            except ImportError as e:
+                raise ImportError(
+                    "OpenTelemetryExporter requires opentelemetry-api. "
+                    "Install it with `pip install opentelemetry-api opentelemetry-sdk`."
+                ) from e
+            tracer = trace.get_tracer("agent")
+        self.tracer = tracer
+
+    def export(self, trace: RunTrace) -> None:
+        """Emit a root span for the run with one child span per record."""
+        from opentelemetry import trace as otel_trace
+
+        start_ns = int(trace.started_at * 1e9)
+        end_ns = start_ns + int((trace.duration_seconds or 0.0) * 1e9)
+        root = self.tracer.start_span("agent.run", start_time=start_ns, attributes={"agent.run_id": trace.run_id})
+        context = otel_trace.set_span_in_context(root)
+        for r in trace.records:
+            attributes = {
+                key: value
+                for key, value in (
+                    ("agent.node", r.node),
+                    ("agent.step", r.step),
+                    ("agent.queue_seconds", r.queue_seconds),
+                    ("llm.prompt_tokens", r.prompt_tokens),
+                    ("llm.completion_tokens", r.completion_tokens),
+                    ("llm.cost_usd", r.cost_usd),
+                )
+                if value
+            }
+            span_start = start_ns + int(r.start_seconds * 1e9)
+            span = self.tracer.start_span(
+                f"agent.{r.kind}.{r.name}", context=context, start_time=span_start, attributes=attributes
+            )
+            if r.error:
+                span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, r.error))
+            span.end(end_time=span_start + int((r.duration_seconds or r.queue_seconds) * 1e9))
+        if trace.error:
+            root.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, trace.error))
+        root.end(end_time=end_ns)
+
+
+INSTRUMENTATION_EXPORTERS = ("trace", "prometheus", "otel")
+
+_instrumentation: Optional[Instrumentation] = None
+_instrumentation_settings: Optional[Tuple[Any, ...]] = None
+
+
+def get_instrumentation(config: Optional[RunnableConfig] = None) -> Optional[Instrumentation]:
+    """Return the process-wide instrumentation selected by the configuration.
+
+    ``instrumentation`` is a comma-separated list of "trace" (keep traces
+    only), "prometheus" and "otel". The exporters are available as
+    ``instrumentation.exporters``.
+
+    Args:
+        config: Optional runnable config; the environment is used otherwise.
+
+    Returns:
+        The handler, or None when instrumentation is disabled.
+
+    Raises:
+        ValueError: If an exporter name is unknown.
+    """
+    global _instrumentation, _instrumentation_settings
+    configuration = Configuration.from_runnable_config(config)
+    names = tuple(n.strip() for n in configuration.instrumentation.split(",") if n.strip())
+    settings = (names, configuration.trace_max_runs, configuration.trace_max_records)
+    if settings == _instrumentation_settings:
+        return _instrumentation
+
+    unknown = set(names) - set(INSTRUMENTATION_EXPORTERS)
+    if unknown:
+        raise ValueError(
+            f"Unknown instrumentation {sorted(unknown)}; expected any of {INSTRUMENTATION_EXPORTERS}"
+        )
+    exporters: List[TraceExporter] = []
+    if "prometheus" in names:
+        exporters.append(PrometheusExporter())
+    if "otel" in names:
+        exporters.append(OpenTelemetryExporter())
+    _instrumentation = (
+        Instrumentation(exporters, configuration.trace_max_runs, configuration.trace_max_records)
+        if names
+        else None
+    )
+    _instrumentation_settings = settings
+    return _instrumentation
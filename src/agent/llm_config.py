@@ -1,48 +1,341 @@
 """
 LLM configuration module for Azure OpenAI.
+
+All chat models share one pooled httpx client pair (keep-alive, optional
+HTTP/2, timeouts); the async client keeps one connection pool per event loop,
+so runs on separate loops (batches, load tests) never reuse a connection
+bound to another loop. ``get_llm`` routes each role (planner, executor,
+replanner) to a model chosen at runtime through the LangGraph config:
+
+    graph.ainvoke(inputs, {"configurable": {"executor_model": "gpt-35-turbo"}})
+
+Models are cached per role and settings, and each role can be limited to a
+maximum number of concurrent LLM calls. Setting ``llm_provider`` to "fake"
+swaps in ``fakes.FakeChatModel`` so the whole graph runs offline.
+
+``httpx`` and ``langchain_openai`` are imported on first use, so importing
+the graph does not pay for the OpenAI SDK until a model is needed.
 """
+import asyncio
+import importlib.util
 import os
-from langchain_openai import AzureChatOpenAI
-from typing import Optional
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from .configuration import Configuration
+from .instrumentation import QUEUE_SECONDS_KEY, QUEUE_WAIT_MIN_SECONDS
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_openai import AzureChatOpenAI
+
+ROLES = ("planner", "executor", "replanner")
+LLM_PROVIDERS = ("azure", "fake")
+
+_lock = threading.Lock()
+_http_clients: Optional[Tuple["httpx.Client", "httpx.AsyncClient"]] = None
+_models: Dict[Tuple[Any, ...], BaseChatModel] = {}
+_overrides: Dict[str, BaseChatModel] = {}
+_runnables: Dict[Tuple[str, int], Runnable[Any, Any]] = {}
+# Per-role limits of the current run, set by get_llm in the run's context
+_role_limits: ContextVar[Dict[str, int]] = ContextVar("agent_role_limits", default={})
+# One semaphore per role and limit, so runs configured with different limits do not share one
+_role_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, int], asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+_limited_classes: Dict[type, Any] = {}
+
+ModelT = TypeVar("ModelT", bound=BaseChatModel)
+
+
+def _loop_transport(factory: Callable[[], "httpx.AsyncBaseTransport"]) -> "httpx.AsyncBaseTransport":
+    """Return an async transport that sends through one ``factory()`` transport per event loop.
+
+    Pooled connections belong to the loop that opened them, so each loop gets
+    its own pool; a pool is dropped with its loop.
+    """
+    import httpx
+
+    class LoopTransport(httpx.AsyncBaseTransport):
+        def __init__(self) -> None:
+            self._transports: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncBaseTransport] = (
+                weakref.WeakKeyDictionary()
+            )
+
+        def _transport(self) -> httpx.AsyncBaseTransport:
+            loop = asyncio.get_running_loop()
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = factory()
+            return transport
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            return await self._transport().handle_async_request(request)
+
+        async def aclose(self) -> None:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+            if transport is not None:
+                await transport.aclose()
+
+    return LoopTransport()
+
+
+def get_http_clients() -> Tuple["httpx.Client", "httpx.AsyncClient"]:
+    """Return the process-wide HTTP clients shared by every chat model.
+
+    The pool is configured from the ``llm_http_*`` and ``llm_timeout_seconds``
+    configuration fields when first used. HTTP/2 is enabled when requested
+    and the ``h2`` package is installed.
+
+    Returns:
+        A sync and an async httpx client.
+    """
+    global _http_clients
+    with _lock:
+        if _http_clients is None:
+            import httpx
+
+            configuration = Configuration.from_runnable_config()
+            limits = httpx.Limits(
+                max_connections=configuration.llm_http_max_connections,
+                max_keepalive_connections=configuration.llm_http_max_keepalive_connections,
+                keepalive_expiry=configuration.llm_http_keepalive_expiry_seconds,
+            )
+            timeout = httpx.Timeout(configuration.llm_timeout_seconds, connect=10.0)
+            http2 = configuration.llm_http2 and importlib.util.find_spec("h2") is not None
+            _http_clients = (
+                httpx.Client(limits=limits, timeout=timeout, http2=http2),
+                httpx.AsyncClient(
+                    transport=_loop_transport(lambda: httpx.AsyncHTTPTransport(limits=limits, http2=http2)),
+                    timeout=timeout,
+                ),
+            )
+        return _http_clients
+
+
+@asynccontextmanager
+async def role_slot(role: Optional[str]) -> AsyncIterator[float]:
+    """Hold one of the concurrent LLM call slots of ``role``, if it is limited.
+
+    The limit is the ``<role>_max_concurrency`` of the run calling the model.
+    Runs with the same limit share its slots across the process.
+
+    Yields:
+        The number of seconds spent waiting for the slot.
+    """
+    limit = _role_limits.get().get(role or "", 0)
+    if limit <= 0:
+        yield 0.0
+        return
+    key = (role or "", limit)
+    semaphores = _role_semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = semaphores.get(key)
+    if semaphore is None:
+        semaphore = semaphores[key] = asyncio.Semaphore(limit)
+    queued_at = time.perf_counter()
+    async with semaphore:
+        yield time.perf_counter() - queued_at
+
+
+def _concurrency_limited(model_cls: Type[ModelT]) -> Type[ModelT]:
+    """Return a subclass of ``model_cls`` whose async calls respect the role limits.
+
+    Noticeable waits for a slot are reported in the response metadata under
+    ``QUEUE_SECONDS_KEY`` for the instrumentation.
+    """
+    limited: Optional[Type[ModelT]] = _limited_classes.get(model_cls)
+    if limited is not None:
+        return limited
+
+    class ConcurrencyLimited(model_cls):  # type: ignore[valid-type, misc]
+        async def _agenerate(self, *args: Any, **kwargs: Any) -> Any:
+            async with role_slot((self.metadata or {}).get("agent_role")) as waited:
+                result = await super()._agenerate(*args, **kwargs)
+            if waited >= QUEUE_WAIT_MIN_SECONDS:
+                for generation in result.generations:
+                    generation.message.response_metadata[QUEUE_SECONDS_KEY] = waited
+            return result
+
+        async def _astream(self, *args: Any, **kwargs: Any) -> Any:
+            async with role_slot((self.metadata or {}).get("agent_role")) as waited:
+                first = True
+                async for chunk in super()._astream(*args, **kwargs):
+                    if first and waited >= QUEUE_WAIT_MIN_SECONDS:
+                        chunk.message.response_metadata[QUEUE_SECONDS_KEY] = waited
+                    first = False
+                    yield chunk
+
+    ConcurrencyLimited.__name__ = ConcurrencyLimited.__qualname__ = model_cls.__name__
+    _limited_classes[model_cls] = ConcurrencyLimited
+    return ConcurrencyLimited
 
 
 def get_azure_llm(
     model: str = "gpt-4",
     temperature: float = 0,
-    deployment_name: Optional[str] = None
-) -> AzureChatOpenAI:
+    deployment_name: Optional[str] = None,
+    **kwargs: Any,
+) -> "AzureChatOpenAI":
     """
     Create an Azure OpenAI LLM instance.
-    
+
     Args:
         model: The model name (e.g., "gpt-4", "gpt-35-turbo")
         temperature: The temperature for the model
         deployment_name: Optional deployment name. If not provided, will use model name.
-        
+        **kwargs: Extra keyword arguments passed to ``AzureChatOpenAI``.
+
     Returns:
-        AzureChatOpenAI instance
-        
+        AzureChatOpenAI instance using the shared HTTP connection pool
+
     Raises:
         ValueError: If required environment variables are not set
     """
+    from langchain_openai import AzureChatOpenAI
+
     api_key = os.getenv("AZURE_OPENAI_API_KEY")
     endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
     api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-    
+
     if not api_key:
         raise ValueError("AZURE_OPENAI_API_KEY environment variable is required")
     if not endpoint:
         raise ValueError("AZURE_OPENAI_ENDPOINT environment variable is required")
-    
+
     # Use deployment name from env or default to model name
     if not deployment_name:
         deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", model)
-    
-    return AzureChatOpenAI(
+
+    http_client, http_async_client = get_http_clients()
+    return _concurrency_limited(AzureChatOpenAI)(
         azure_endpoint=endpoint,
         api_key=api_key,
         api_version=api_version,
         azure_deployment=deployment_name,
         temperature=temperature,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        **kwargs,
+    )
+
+
+def _deployment_for(role: str, configuration: Configuration) -> str:
+    """Resolve the model deployment of ``role`` from config, then environment."""
+    configured: str = getattr(configuration, f"{role}_model")
+    return (
+        configured
+        or os.getenv(f"AZURE_OPENAI_DEPLOYMENT_NAME_{role.upper()}", "")
+        or os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
     )
 
+
+def register_llm(role: str, model: Optional[BaseChatModel]) -> None:
+    """Force ``role`` to use ``model`` regardless of the configuration.
+
+    Args:
+        role: One of ``ROLES``.
+        model: The chat model, or None to remove the override.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Unknown role {role!r}; expected one of {ROLES}")
+    if model is None:
+        _overrides.pop(role, None)
+    else:
+        _overrides[role] = model
+
+
+def get_llm(role: str, config: Optional[RunnableConfig] = None) -> BaseChatModel:
+    """Return the chat model serving ``role`` for the current run.
+
+    Args:
+        role: One of ``ROLES``.
+        config: The runnable config of the current node, if any.
+
+    Returns:
+        A cached chat model; models with identical settings are shared.
+
+    Raises:
+        ValueError: If the role or provider is unknown.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Unknown role {role!r}; expected one of {ROLES}")
+    configuration = Configuration.from_runnable_config(config)
+    limit = getattr(configuration, f"{role}_max_concurrency")
+    limits = _role_limits.get()
+    if limits.get(role) != limit:
+        _role_limits.set({**limits, role: limit})
+    if role in _overrides:
+        return _overrides[role]
+
+    provider = configuration.llm_provider
+    if provider not in LLM_PROVIDERS:
+        raise ValueError(f"Unknown llm_provider {provider!r}; expected one of {LLM_PROVIDERS}")
+    deployment = _deployment_for(role, configuration)
+
+    key: Tuple[Any, ...] = (role, provider, deployment)
+    if provider == "fake":
+        key += (configuration.fake_llm_latency_ms, configuration.fake_latency_sigma)
+    with _lock:
+        model = _models.get(key)
+    if model is not None:
+        return model
+
+    metadata = {"agent_role": role}
+    if provider == "fake":
+        from .fakes import FakeChatModel, default_fake_responder
+
+        model = _concurrency_limited(FakeChatModel)(
+            responder=default_fake_responder(role),
+            latency_seconds=configuration.fake_llm_latency_ms / 1000,
+            latency_sigma=configuration.fake_latency_sigma,
+            metadata=metadata,
+        )
+    else:
+        model = get_azure_llm(
+            model=deployment, temperature=0, deployment_name=deployment, metadata=metadata
+        )
+    with _lock:
+        return _models.setdefault(key, model)
+
+
+def model_identity(role: str, config: Optional[RunnableConfig] = None) -> str:
+    """Return a string identifying the model serving ``role`` for the current run.
+
+    Caches of model outputs include it in their keys, so an output of one
+    model is never served to runs routed to another.
+    """
+    if role in _overrides:
+        model = _overrides[role]
+        return f"override:{type(model).__name__}:{id(model)}"
+    configuration = Configuration.from_runnable_config(config)
+    return f"{configuration.llm_provider}:{_deployment_for(role, configuration)}"
+
+
+def get_role_runnable(
+    role: str,
+    build: Callable[[BaseChatModel], Runnable[Any, Any]],
+    config: Optional[RunnableConfig] = None,
+) -> Runnable[Any, Any]:
+    """Return ``build(get_llm(role, config))``, built once per model.
+
+    Args:
+        role: One of ``ROLES``.
+        build: Factory wrapping the model, e.g. into a structured-output chain.
+        config: The runnable config of the current node, if any.
+
+    Returns:
+        The cached runnable.
+    """
+    llm = get_llm(role, config)
+    key = (f"{build.__module__}.{build.__qualname__}", id(llm))
+    runnable = _runnables.get(key)
+    if runnable is None:
+        runnable = _runnables.setdefault(key, build(llm))
+    return runnable
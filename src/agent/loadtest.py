@@ -0,0 +1,429 @@
+"""Load test for the graph, with a concurrency scaling report.
+
+Drives many runs at increasing load, either against the compiled graph in
+this process (fake models and search backend with log-normal latencies, so
+no network access or API keys) or against a running LangGraph server, and
+prints a JSON report with sorted keys:
+
+    python -m agent.loadtest --levels 1,10,50,200 --requests 200 --output load.json
+    python -m agent.loadtest --pattern open --levels 5,20,80 --requests 400
+    python -m agent.loadtest --url http://localhost:2024 --levels 10,50,500
+
+Each level is a number of concurrent runs (``--pattern closed``: that many
+clients each start a new run as soon as their last one finishes) or an
+arrival rate in runs per second (``--pattern open``: runs start at Poisson
+arrival times whether or not earlier runs have finished, which is how
+independent users behave and exposes queueing). For each level the report
+gives:
+
+- ``latency_ms``: mean, p50, p95 and p99 end-to-end run latency;
+- ``throughput_rps`` and, for open loops, the offered rate;
+- ``event_loop_lag_ms``: how late a timer firing every ``--lag-interval-ms``
+  was woken up. Anything beyond a few milliseconds means a blocking call on
+  the event loop, which stalls every run in the process;
+- ``memory``: the peak traced allocation per concurrent run and the memory
+  still held afterwards (a leak shows up as retained memory growing with the
+  level). ``tracemalloc`` slows allocations several times over, so memory is
+  measured in an extra, untimed round of as many concurrent runs as were in
+  flight at the level's peak.
+
+``saturation`` names the last level that still increased throughput by at
+least ``--saturation-gain`` (10% by default) over the level before it, for
+closed loops, or that was served at that fraction of its offered rate, for
+open loops. Levels past it only add latency; use it to size workers.
+
+With ``--url``, runs are sent to the server with ``langgraph_sdk`` and its
+own models and search backend answer them. To load test it offline, start
+it on the fakes, e.g. ``AGENT_LLM_PROVIDER=fake AGENT_SEARCH_BACKEND=fake
+AGENT_FAKE_LLM_LATENCY_MS=800 AGENT_FAKE_LATENCY_SIGMA=0.5 langgraph dev``.
+Memory is then the server's business and is not reported; the event-loop
+lag is the client's.
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from .fakes import (
+    FakeChatModel,
+    FakeSearchBackend,
+    fake_search,
+    finishing_replanner,
+    registered_models,
+    research_planner,
+    searching_executor,
+)
+from .reporting import parse_setting, summary_ms
+
+LOAD_PATTERNS = ("closed", "open")
+
+
+@dataclass
+class LagMonitor:
+    """Measure how late the event loop wakes up a periodic timer."""
+
+    interval_seconds: float = 0.01
+    lags: List[float] = field(default_factory=list)
+
+    async def run(self) -> None:
+        """Sample the lag until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def summary(self) -> Dict[str, float]:
+        """Return the p50, p99 and max event loop lag in milliseconds."""
+        summary = summary_ms(self.lags, (50, 99))
+        summary["max"] = round(max(self.lags, default=0.0) * 1000, 3)
+        return summary
+
+
+async def _measure_memory(invoke: Callable[[int], Awaitable[Any]], runs: int, first_index: int) -> Dict[str, float]:
+    # A separate round of concurrent runs, so tracing does not slow the timed ones
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        gc.collect()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        await asyncio.gather(*(invoke(first_index + i) for i in range(runs)), return_exceptions=True)
+        peak = tracemalloc.get_traced_memory()[1]
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    return {
+        "concurrent_runs": runs,
+        "peak_kib_per_concurrent_run": round((peak - baseline) / 1024 / runs, 1),
+        "retained_kib": round((retained - baseline) / 1024, 1),
+    }
+
+
+def _parse_levels(text: str) -> List[float]:
+    try:
+        levels = [float(part) for part in text.split(",") if part.strip()]
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"expected comma-separated numbers, got {text!r}") from e
+    if not levels or min(levels) <= 0:
+        raise argparse.ArgumentTypeError(f"expected positive levels, got {text!r}")
+    return levels
+
+
+async def measure_level(
+    invoke: Callable[[int], Awaitable[Any]],
+    level: float,
+    requests: int,
+    pattern: str = "closed",
+    lag_interval_ms: float = 10.0,
+    trace_memory: bool = True,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Run ``requests`` calls of ``invoke`` at one load level.
+
+    Args:
+        invoke: Coroutine function running one request, given its index.
+        level: Concurrent clients for a closed loop, arrivals per second for an open loop.
+        requests: Number of requests in the level.
+        pattern: "closed" or "open".
+        lag_interval_ms: Interval of the event-loop lag timer.
+        trace_memory: Measure memory with ``tracemalloc`` in an extra round of
+            as many concurrent requests as were in flight at the peak.
+        seed: Seed of the open-loop arrival times.
+
+    Returns:
+        The level's section of the report.
+
+    Raises:
+        ValueError: If the pattern is unknown.
+    """
+    if pattern not in LOAD_PATTERNS:
+        raise ValueError(f"Unknown load pattern {pattern!r}; expected one of {LOAD_PATTERNS}")
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    in_flight = peak_in_flight = 0
+
+    async def run(index: int) -> None:
+        nonlocal in_flight, peak_in_flight
+        in_flight += 1
+        peak_in_flight = max(peak_in_flight, in_flight)
+        start = time.perf_counter()
+        try:
+            await invoke(index)
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        else:
+            latencies.append(time.perf_counter() - start)
+        finally:
+            in_flight -= 1
+
+    async def closed_client(indices: Any) -> None:
+        for index in indices:
+            await run(index)
+
+    async def open_arrivals() -> None:
+        rng = random.Random(seed)
+        tasks = []
+        for index in range(requests):
+            tasks.append(asyncio.ensure_future(run(index)))
+            await asyncio.sleep(rng.expovariate(level))
+        await asyncio.gather(*tasks)
+
+    monitor = LagMonitor(lag_interval_ms / 1000)
+    monitor_task = asyncio.ensure_future(monitor.run())
+    # Let the monitor arm its first timer before the load starts
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    try:
+        if pattern == "closed":
+            indices = iter(range(requests))
+            await asyncio.gather(*(closed_client(indices) for _ in range(max(1, int(level)))))
+        else:
+            await open_arrivals()
+        wall_seconds = time.perf_counter() - start
+    finally:
+        monitor_task.cancel()
+        try:
+            await monitor_task
+        except asyncio.CancelledError:
+            pass
+
+    report: Dict[str, Any] = {
+        "level": level,
+        "requests": requests,
+        "failures": sum(errors.values()),
+        "errors": errors,
+        "latency_ms": summary_ms(latencies, (50, 95, 99)),
+        "throughput_rps": round(len(latencies) / wall_seconds, 3) if wall_seconds else 0.0,
+        "peak_in_flight": peak_in_flight,
+        "event_loop_lag_ms": monitor.summary(),
+        "wall_seconds": round(wall_seconds, 3),
+    }
+    if pattern == "open":
+        report["offered_rps"] = level
+    if trace_memory:
+        report["memory"] = await _measure_memory(invoke, max(1, peak_in_flight), requests)
+    return report
+
+
+def saturation_point(levels: Sequence[Dict[str, Any]], pattern: str, gain: float = 0.1) -> Optional[Dict[str, Any]]:
+    """Find where throughput stops scaling with the load.
+
+    Args:
+        levels: The level reports, in increasing load order.
+        pattern: "closed" or "open".
+        gain: Closed loops: throughput increase a level must add over the
+            previous one. Open loops: shortfall of throughput below the
+            offered rate a level may have.
+
+    Returns:
+        The last level that still scaled, its throughput and the reason the
+        next one did not, or None if every level scaled.
+    """
+    for previous, current in zip(levels, levels[1:]):
+        if pattern == "open":
+            if current["throughput_rps"] < current["offered_rps"] * (1 - gain):
+                reason = f"throughput fell more than {gain:.0%} below the offered rate"
+                break
+        elif current["throughput_rps"] < previous["throughput_rps"] * (1 + gain):
+            reason = f"throughput grew less than {gain:.0%} over the previous level"
+            break
+    else:
+        return None
+    return {"level": previous["level"], "throughput_rps": previous["throughput_rps"], "reason": reason}
+
+
+async def load_test(
+    levels: Sequence[float] = (1, 10, 50),
+    requests: int = 50,
+    pattern: str = "closed",
+    searches: int = 3,
+    llm_latency_ms: float = 800.0,
+    ms_per_token: float = 0.0,
+    search_latency_ms: float = 300.0,
+    latency_sigma: float = 0.5,
+    output_words: int = 80,
+    lag_interval_ms: float = 10.0,
+    trace_memory: bool = True,
+    saturation_gain: float = 0.1,
+    url: Optional[str] = None,
+    assistant_id: str = "agent",
+    configurable: Optional[Dict[str, Any]] = None,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Run the load test at each level and build the scaling report.
+
+    Args:
+        levels: Load levels, in increasing order: concurrent clients, or arrivals per second.
+        requests: Runs per level.
+        pattern: "closed" or "open".
+        searches: Number of independent search steps in each in-process plan.
+        llm_latency_ms: Median fake model latency before the first token.
+        ms_per_token: Fake model latency per generated token.
+        search_latency_ms: Median fake search latency.
+        latency_sigma: Log-normal spread of the fake latencies (0 for fixed latencies).
+        output_words: Length of each executor answer.
+        lag_interval_ms: Interval of the event-loop lag timer.
+        trace_memory: Measure memory per run (in process only).
+        saturation_gain: Threshold used to find the saturation point.
+        url: LangGraph server to load instead of the in-process graph.
+        assistant_id: Assistant or graph id on the server.
+        configurable: Extra configuration fields for every run.
+        seed: Seed of the latency draws and arrival times.
+
+    Returns:
+        The JSON-serializable report.
+    """
+    if pattern not in LOAD_PATTERNS:
+        raise ValueError(f"Unknown load pattern {pattern!r}; expected one of {LOAD_PATTERNS}")
+    parameters = {
+        "levels": list(levels),
+        "requests": requests,
+        "pattern": pattern,
+        "target": url or "in_process",
+        "configurable": configurable or {},
+    }
+    results: List[Dict[str, Any]] = []
+    # Distinct objectives, so no run reuses another's plan or searches
+    objectives = itertools.count()
+
+    if url:
+        try:
+            from langgraph_sdk import get_client
+        except ImportError as e:
+            raise ImportError(
+                "Load testing a server requires langgraph-sdk. Install it with `pip install langgraph-sdk`."
+            ) from e
+        client = get_client(url=url)
+
+        async def invoke(index: int) -> Any:
+            return await client.runs.wait(
+                None,
+                assistant_id,
+                input={"input": f"Research objective {next(objectives)}"},
+                config={"configurable": configurable or {}},
+            )
+
+        for level in levels:
+            results.append(
+                await measure_level(invoke, level, requests, pattern, lag_interval_ms, trace_memory=False, seed=seed)
+            )
+    else:
+        from .graph import workflow
+
+        parameters.update(
+            {
+                "searches": searches,
+                "llm_latency_ms": llm_latency_ms,
+                "ms_per_token": ms_per_token,
+                "search_latency_ms": search_latency_ms,
+                "latency_sigma": latency_sigma,
+                "output_words": output_words,
+            }
+        )
+
+        def model(responder: Any, offset: int) -> FakeChatModel:
+            return FakeChatModel(
+                responder=responder,
+                latency_seconds=llm_latency_ms / 1000,
+                seconds_per_token=ms_per_token / 1000,
+                latency_sigma=latency_sigma,
+                seed=seed + offset,
+            )
+
+        models = {
+            "planner": model(research_planner(searches), 1),
+            "executor": model(searching_executor(output_words), 2),
+            "replanner": model(finishing_replanner, 3),
+        }
+        run_configurable = {
+            "llm_provider": "fake",
+            "cache_backend": "none",
+            "entry_route": "full",
+            **(configurable or {}),
+        }
+        graph = workflow.compile(name="Plan and Execute Agent")
+        backend = FakeSearchBackend(
+            latency_seconds=search_latency_ms / 1000, latency_sigma=latency_sigma, seed=seed
+        )
+
+        async def invoke(index: int) -> Any:
+            return await graph.ainvoke(
+                {"input": f"Research objective {next(objectives)}"}, {"configurable": run_configurable}
+            )
+
+        with registered_models(models), fake_search(backend, 0.0):
+            for level in levels:
+                results.append(
+                    await measure_level(invoke, level, requests, pattern, lag_interval_ms, trace_memory, seed)
+                )
+
+    return {
+        "benchmark": "loadtest",
+        "parameters": parameters,
+        "levels": results,
+        "saturation": saturation_point(results, pattern, saturation_gain),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run a load test from the command line and print its JSON report."""
+    parser = argparse.ArgumentParser(prog="python -m agent.loadtest", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--levels", type=_parse_levels, default=[1.0, 10.0, 50.0], metavar="N,N,...")
+    parser.add_argument("--requests", type=int, default=50, help="runs per level")
+    parser.add_argument("--pattern", choices=LOAD_PATTERNS, default="closed")
+    parser.add_argument("--searches", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--ms-per-token", type=float, default=0.0)
+    parser.add_argument("--search-latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--output-words", type=int, default=80)
+    parser.add_argument("--lag-interval-ms", type=float, default=10.0)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc memory measurement")
+    parser.add_argument("--saturation-gain", type=float, default=0.1)
+    parser.add_argument("--url", help="load a LangGraph server instead of the in-process graph")
+    parser.add_argument("--assistant-id", default="agent")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", type=parse_setting, action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(
+        load_test(
+            levels=args.levels,
+            requests=args.requests,
+            pattern=args.pattern,
+            searches=args.searches,
+            llm_latency_ms=args.llm_latency_ms,
+            ms_per_token=args.ms_per_token,
+            search_latency_ms=args.search_latency_ms,
+            latency_sigma=args.latency_sigma,
+            output_words=args.output_words,
+            lag_interval_ms=args.lag_interval_ms,
+            trace_memory=not args.no_memory,
+            saturation_gain=args.saturation_gain,
+            url=args.url,
+            assistant_id=args.assistant_id,
+            configurable=dict(args.set),
+            seed=args.seed,
+        )
+    )
+    text = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
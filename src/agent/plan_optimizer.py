@@ -0,0 +1,268 @@
+"""Deterministic plan optimization between the planner and the scheduler.
+
+Every plan step costs a full ReAct run, and usually a replan. Planners often
+emit steps that add nothing, such as the same search worded twice, or a run
+of small independent searches that one executor run could cover. Before the
+first wave, the ``plan_optimizer`` node rewrites the plan without a model
+call:
+
+1. Normalize: strip list numbering ("1.", "Step 2:", bullets), collapse
+   whitespace and drop empty steps.
+2. Deduplicate: two steps of the same kind are duplicates when the content
+   words of one contain those of the other and overlap by at least
+   ``plan_dedupe_similarity`` (Jaccard). Steps that each name something the
+   other does not ("EV sales in Norway" / "in Sweden"), or that mention
+   different numbers ("2023" / "2024"), are kept. The later
+   step is dropped; the more specific wording is kept in the earlier step's
+   place, and steps depending on the dropped step now depend on the kept one.
+   Draft steps are never deduplicated, since rewriting the draft twice is
+   usually deliberate.
+3. Batch searches: up to ``plan_max_batched_searches`` adjacent search
+   steps that do not depend on one another become one multi-query step.
+4. Cap the length (off by default): plans longer than ``plan_max_steps``
+   keep their first steps and their last step, which is usually the final
+   report. Steps that needed a dropped step now need what it needed.
+
+Dependencies are remapped at each stage, so the plan stays acyclic. Each
+removed step is logged with the reason it was removed, and
+``plan_optimizer_stats`` in the state counts the steps planned and kept.
+Plans from the replanner are not rewritten: speculation and the repeated-step
+guard compare their steps with the executed ones by text.
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+from .configuration import Configuration
+from .planner import Plan
+from .state import PlanExecute, get_default_state
+from .streaming import get_writer, plan_event
+from .task_router import normalize_task, task_kind
+
+logger = logging.getLogger(__name__)
+
+_NUMBERING = re.compile(r"^\s*(?:step\s*\d+\s*[:.)\-]|\d+\s*[.):]|[-*•])\s*", re.IGNORECASE)
+_WORD = re.compile(r"\w+")
+# Words that say how a step is done rather than what it is about
+_FILLER = frozenset(
+    """a an and about as at by for from in into of on or the to with
+    use using search searches find look up research gather information info details data
+    tavilysearchresults web online latest recent current""".split()
+)
+
+
+def clean_step(step: str) -> str:
+    """Return ``step`` without list numbering and with whitespace collapsed."""
+    return " ".join(_NUMBERING.sub("", str(step)).split())
+
+
+def _content_words(step: str) -> Set[str]:
+    words = {word for word in _WORD.findall(step.casefold()) if word not in _FILLER}
+    return words or set(_WORD.findall(step.casefold()))
+
+
+def step_similarity(first: str, second: str) -> float:
+    """Return the Jaccard overlap of the content words of two steps."""
+    a, b = _content_words(first), _content_words(second)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def is_duplicate(first: str, second: str, threshold: float) -> bool:
+    """Return whether one step restates the other, possibly more specifically."""
+    a, b = _content_words(first), _content_words(second)
+    if {w for w in a if w.isdigit()} != {w for w in b if w.isdigit()}:
+        return False
+    return (a <= b or b <= a) and step_similarity(first, second) >= threshold
+
+
+def batched_search_step(steps: Sequence[str]) -> str:
+    """Return one step running every search of ``steps``."""
+    queries = "; ".join(f"({i}) {step.rstrip('.')}" for i, step in enumerate(steps, 1))
+    return f"Search for each of the following in one batched search and report the findings for each: {queries}"
+
+
+@dataclass
+class OptimizedPlan:
+    """The result of ``optimize_plan``."""
+
+    steps: List[str]
+    dependencies: List[List[int]]
+    step_kinds: Dict[str, str]
+    # (original step, reason) for every step that was removed or merged away
+    removed: List[Tuple[str, str]] = field(default_factory=list)
+
+    def count(self, reason: str) -> int:
+        """Return how many steps were removed for a reason starting with ``reason``."""
+        return sum(r.startswith(reason) for _, r in self.removed)
+
+
+def optimize_plan(
+    steps: Sequence[str],
+    dependencies: Sequence[Sequence[int]],
+    step_kinds: Optional[Mapping[str, str]] = None,
+    *,
+    dedupe_similarity: float = 0.75,
+    max_batched_searches: int = 1,
+    max_steps: int = 0,
+) -> OptimizedPlan:
+    """Normalize, deduplicate, batch and cap a plan.
+
+    Args:
+        steps: The planned steps.
+        dependencies: For each step, the indices of earlier steps it needs.
+        step_kinds: Planner task kind tags by normalized step.
+        dedupe_similarity: Similarity at which steps are duplicates (above 1 disables deduplication).
+        max_batched_searches: Searches merged into one step at most (1 disables merging).
+        max_steps: Maximum plan length (0 for no limit).
+
+    Returns:
+        The optimized plan, its dependencies and kind tags, and the removed steps.
+    """
+    dependencies = Plan(steps=list(steps), dependencies=[list(d) for d in dependencies]).resolved_dependencies()
+    removed: List[Tuple[str, str]] = []
+    texts: Dict[int, str] = {}
+    kinds: Dict[int, str] = {}
+    # Original index -> the kept step standing in for it
+    representative: Dict[int, int] = {}
+
+    for i, step in enumerate(steps):
+        text = clean_step(step)
+        if not text:
+            removed.append((step, "empty"))
+            continue
+        kind = task_kind(step, step_kinds)
+        duplicate = next(
+            (
+                j
+                for j in texts
+                if kind != "draft" and kinds[j] == kind and is_duplicate(texts[j], text, dedupe_similarity)
+            ),
+            None,
+        )
+        if duplicate is not None:
+            representative[i] = duplicate
+            removed.append((step, f"duplicate of {texts[duplicate]!r}"))
+            if len(_content_words(text)) > len(_content_words(texts[duplicate])):
+                texts[duplicate] = text
+            continue
+        representative[i] = i
+        texts[i], kinds[i] = text, kind
+
+    resolved: Dict[int, Set[int]] = {}
+
+    def resolve(i: int) -> Set[int]:
+        # Dropped (empty) steps pass their own dependencies on
+        if i not in resolved:
+            if i in representative:
+                resolved[i] = {representative[i]}
+            else:
+                resolved[i] = set().union(*(resolve(d) for d in dependencies[i]))
+        return resolved[i]
+
+    needs = {k: set().union(*(resolve(d) for d in dependencies[k])) - {k} for k in texts}
+
+    groups: List[List[int]] = []
+    for k in texts:
+        group = groups[-1] if groups else []
+        if (
+            kinds[k] == "search"
+            and group
+            and kinds[group[0]] == "search"
+            and len(group) < max_batched_searches
+            and not needs[k] & set(group)
+        ):
+            group.append(k)
+            removed.append((steps[k], f"merged into the search batch starting with {texts[group[0]]!r}"))
+        else:
+            groups.append([k])
+
+    if max_steps > 0 and len(groups) > max_steps:
+        keep = groups[: max_steps - 1] + groups[-1:] if max_steps > 1 else groups[:1]
+        for group in groups:
+            if group not in keep:
+                removed.extend((steps[k], "over the plan length limit") for k in group)
+        groups = keep
+
+    group_of = {k: g for g, group in enumerate(groups) for k in group}
+    kept_needs: Dict[int, Set[int]] = {}
+
+    def kept(k: int) -> Set[int]:
+        # Steps dropped by the length cap pass their own dependencies on
+        if k not in kept_needs:
+            kept_needs[k] = set().union(*({d} if d in group_of else kept(d) for d in needs[k]))
+        return kept_needs[k]
+
+    new_steps: List[str] = []
+    new_dependencies: List[List[int]] = []
+    new_kinds: Dict[str, str] = {}
+    for g, group in enumerate(groups):
+        text = batched_search_step([texts[k] for k in group]) if len(group) > 1 else texts[group[0]]
+        new_steps.append(text)
+        new_dependencies.append(
+            sorted({group_of[d] for k in group for d in kept(k) if group_of[d] < g})
+        )
+        # A batch is tagged so its queries' wording cannot route it elsewhere
+        tag = "search" if len(group) > 1 else (step_kinds or {}).get(normalize_task(steps[group[0]]))
+        if tag:
+            new_kinds[normalize_task(text)] = tag
+    return OptimizedPlan(new_steps, new_dependencies, new_kinds, removed)
+
+
+async def optimize_plan_step(state: PlanExecute, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """Optimize the planner's plan before the first wave.
+
+    Args:
+        state: The current agent state.
+        config: The runnable config holding the ``plan_*`` settings.
+
+    Returns:
+        The optimized plan, dependencies and kind tags, and the updated
+        ``plan_optimizer_stats``.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    if not configuration.plan_optimizer:
+        return {}
+    current_state = get_default_state()
+    current_state.update(state)
+
+    planned = current_state["plan"]
+    optimized = optimize_plan(
+        planned,
+        current_state["plan_dependencies"],
+        current_state["step_kinds"],
+        dedupe_similarity=configuration.plan_dedupe_similarity,
+        max_batched_searches=configuration.plan_max_batched_searches,
+        max_steps=configuration.plan_max_steps,
+    )
+    for step, reason in optimized.removed:
+        logger.info("Plan optimizer removed step %r: %s", step, reason)
+
+    previous = current_state["plan_optimizer_stats"]
+    stats = {
+        "planned_steps": previous.get("planned_steps", 0) + len(planned),
+        "optimized_steps": previous.get("optimized_steps", 0) + len(optimized.steps),
+    }
+    for reason, name in (
+        ("empty", "empty"),
+        ("duplicate", "deduplicated"),
+        ("merged", "merged"),
+        ("over the plan length", "truncated"),
+    ):
+        stats[name] = previous.get(name, 0) + optimized.count(reason)
+    stats["steps_saved"] = stats["planned_steps"] - stats["optimized_steps"]
+
+    update: Dict[str, Any] = {"plan_optimizer_stats": stats}
+    if optimized.steps != list(planned):
+        logger.info("Plan optimizer reduced the plan from %d to %d steps", len(planned), len(optimized.steps))
+        get_writer()(plan_event("plan_optimizer", optimized.steps))
+        update.update(
+            {
+                "plan": optimized.steps,
+                "plan_dependencies": optimized.dependencies,
+                "step_kinds": optimized.step_kinds,
+            }
+        )
+    return update
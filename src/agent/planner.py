@@ -1,47 +1,87 @@
-import os
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Any, List, Optional
 from langchain_core.messages import HumanMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 
+from .cache import cached_ainvoke
 from .state import PlanExecute, get_default_state
-from .prompts import PLANNER_PROMPT_TEMPLATE
-from .llm_config import get_azure_llm
+from .streaming import get_writer, plan_event
+from .prompt_assembly import planner_messages
+from .llm_config import get_role_runnable
+from .task_router import valid_kinds
 
 class Plan(BaseModel):
     """Plan to follow in future"""
     steps: List[str] = Field(
         description="different steps to follow, should be in sorted order"
     )
+    dependencies: List[List[int]] = Field(
+        default_factory=list,
+        description="for each step, the zero-based indices of earlier steps whose results it needs; "
+        "use an empty list for a step that can run on its own (e.g. an independent search). "
+        "Leave this field empty to run all steps strictly in order."
+    )
+    kinds: List[str] = Field(
+        default_factory=list,
+        description="for each step, its kind: 'draft' if it writes or edits the draft document, "
+        "'search' if it gathers information with a tool, 'general' otherwise. "
+        "Leave this field empty to let the executor infer it."
+    )
+
+    def resolved_dependencies(self) -> List[List[int]]:
+        """Return a well-formed dependency list for ``steps``.
+
+        Missing or malformed dependencies fall back to a sequential chain, and
+        references to later (or out-of-range) steps are dropped so the result
+        is always acyclic.
+
+        Returns:
+            One list of earlier step indices per step.
+        """
+        if len(self.dependencies) != len(self.steps):
+            return [[i - 1] if i else [] for i in range(len(self.steps))]
+        return [
+            sorted({d for d in deps if 0 <= d < i})
+            for i, deps in enumerate(self.dependencies)
+        ]
 
 
-# 这句代码的作用是创建一个对话式提示模板（planner_prompt），
-# 该模板包括系统消息（作为总体规划指令和背景设定，即PLANNER_PROMPT_TEMPLATE），
-# 以及一个"placeholder"，用来动态插入用户的输入信息（messages）。
-# 结果是：可以结构化地组织LLM提示，使其能融合固定规划准则和实时用户输入，有助于模型产出针对性强的任务分解方案。
-# 是的，大模型的对话prompt通常采用"system"和"user"这样的role来区分系统设定和用户输入。这里"system"代表整体规划指令背景，"placeholder"用来动态填充用户输入数据（实际会被"HumanMessage"对象替换）。下面的写法即明确分为 system（设定场景/能力）和占位符（用户输入）：
-planner_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", PLANNER_PROMPT_TEMPLATE),
-        MessagesPlaceholder("messages"),
-    ]
-)
-
-planner = planner_prompt | get_azure_llm(
-    model="gpt-4",
-    temperature=0,
-    deployment_name=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME_PLANNER", "gpt-4")
-).with_structured_output(Plan)
-
-async def plan_step(state: PlanExecute):
+# 规划器提示词由 prompt_assembly.planner_messages 组装：
+# 先放字节稳定的静态规划指令（PLANNER_SYSTEM_PROMPT），再放时间上下文，最后是用户输入（messages），
+# 这样每次调用共享的前缀最长，便于模型服务端的提示词缓存命中；同时按段统计 token。
+planner_prompt = RunnableLambda(planner_messages)
+
+def _build_planner(llm: BaseChatModel) -> Runnable[Any, Any]:
+    return planner_prompt | llm.with_structured_output(Plan)
+
+
+def get_planner(config: Optional[RunnableConfig] = None) -> Runnable[Any, Any]:
+    """Return the planner chain bound to the model routed to the planner role."""
+    return get_role_runnable("planner", _build_planner, config)
+
+async def plan_step(state: PlanExecute, config: Optional[RunnableConfig] = None):
     # Get default state values and update with current state
     current_state = get_default_state()
     current_state.update(state)
     
-    plan = await planner.ainvoke({
-        "messages": [HumanMessage(content=current_state["input"])],
-        "current_utc_date": current_state["current_utc_date"],
-        "current_utc_time": current_state["current_utc_time"],
-        "current_year": current_state["current_year"],
-    })
-    return {"plan": plan.steps}
\ No newline at end of file
+    plan = await cached_ainvoke(
+        "planner",
+        get_planner(config),
+        {
+            "messages": [HumanMessage(content=current_state["input"])],
+            "current_utc_date": current_state["current_utc_date"],
+            "current_utc_time": current_state["current_utc_time"],
+            "current_year": current_state["current_year"],
+        },
+        Plan,
+        config,
+        semantic_field="messages",
+        role="planner",
+    )
+    get_writer()(plan_event("planner", plan.steps))
+    return {
+        "plan": plan.steps,
+        "plan_dependencies": plan.resolved_dependencies(),
+        "step_kinds": valid_kinds(plan.steps, plan.kinds),
+    }
\ No newline at end of file
@@ -0,0 +1,267 @@
+"""Prompt assembly: cache-friendly message layouts with per-section token counts.
+
+Providers cache the longest prompt prefix they have already seen, so the
+planner, executor and replanner prompts are laid out as:
+
+1. the node's static instructions (``PLANNER_SYSTEM_PROMPT`` and friends),
+   byte-identical on every call;
+2. the time context, rendered once per distinct timestamp;
+3. the run state: the objective, the plan as a numbered list, the compacted
+   executed steps and the draft.
+
+The original layouts formatted the time context (and, for the replanner,
+the whole run state) into the middle of the instructions, so the shared
+prefix ended after the first paragraph, and sent the plan as a Python list
+repr. They are still used with ``compact_prompts=False``.
+
+Templates are parsed once into ``PromptTemplate`` objects that render
+named sections. With the ``prompt_stats`` setting on (the prompts benchmark
+turns it on), every assembled prompt is recorded in ``prompt_stats``:
+calls, tokens per section (local tokenizer, see ``tokens.py``) and the
+size of the static prefix. Token counts of static sections are memoized.
+It is off by default so model calls do not pay for tokenizing.
+"""
+import threading
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+
+from .configuration import Configuration
+from .prompts import (
+    EXECUTOR_SYSTEM_PROMPT,
+    PLANNER_PROMPT_TEMPLATE,
+    PLANNER_SYSTEM_PROMPT,
+    REPLANNER_CONTEXT_TEMPLATE,
+    REPLANNER_PROMPT_TEMPLATE,
+    REPLANNER_SYSTEM_PROMPT,
+    TIME_CONTEXT_TEMPLATE,
+    get_executor_system_prompt,
+)
+from .tokens import count_tokens
+
+# Section names of the template fields
+_FIELD_SECTIONS = {
+    "input": "objective",
+    "plan": "plan",
+    "past_steps": "past_steps",
+    "current_draft_report": "draft",
+}
+
+
+@dataclass(frozen=True)
+class PromptSection:
+    """A named piece of a prompt; ``static`` pieces are identical on every call."""
+
+    name: str
+    text: str
+    static: bool = False
+
+    @property
+    def tokens(self) -> int:
+        """Return the token count of the section text."""
+        return _static_tokens(self.text) if self.static else count_tokens(self.text)
+
+
+@lru_cache(maxsize=64)
+def _static_tokens(text: str) -> int:
+    return count_tokens(text)
+
+
+class PromptTemplate:
+    """A ``str.format`` template parsed once and rendered into named sections.
+
+    Literal text becomes "instructions" sections; the leading one is static
+    if ``static_prefix`` is set, i.e. if the template starts the prompt.
+    """
+
+    def __init__(self, template: str, static_prefix: bool = False) -> None:
+        """Create a template by parsing ``template`` once."""
+        self.parts: Tuple[Tuple[str, Optional[str]], ...] = tuple(
+            (literal, field_name) for literal, field_name, _, _ in Formatter().parse(template)
+        )
+        self.static_prefix = static_prefix
+
+    def sections(self, values: Mapping[str, Any]) -> List[PromptSection]:
+        """Render the template with ``values`` as a list of sections."""
+        sections = []
+        for i, (literal, field_name) in enumerate(self.parts):
+            if literal:
+                sections.append(PromptSection("instructions", literal, self.static_prefix and i == 0))
+            if field_name:
+                sections.append(PromptSection(_FIELD_SECTIONS.get(field_name, field_name), str(values[field_name])))
+        return sections
+
+
+# The original layouts, with the time context block as a single field
+_PLANNER_TEMPLATE = PromptTemplate(
+    PLANNER_PROMPT_TEMPLATE.replace(TIME_CONTEXT_TEMPLATE, "{time_context}"), static_prefix=True
+)
+_REPLANNER_TEMPLATE = PromptTemplate(
+    REPLANNER_PROMPT_TEMPLATE.replace(TIME_CONTEXT_TEMPLATE, "{time_context}"), static_prefix=True
+)
+_REPLANNER_CONTEXT = PromptTemplate(REPLANNER_CONTEXT_TEMPLATE)
+# The original executor prompt is stable up to the time context
+_EXECUTOR_PREFIX, _, _EXECUTOR_SUFFIX = get_executor_system_prompt("\0").partition("\0")
+
+
+def render(sections: Sequence[PromptSection]) -> str:
+    """Concatenate the text of ``sections``."""
+    return "".join(section.text for section in sections)
+
+
+@lru_cache(maxsize=256)
+def render_time_context(current_utc_date: str, current_utc_time: str, current_year: Any) -> str:
+    """Return the time context block for the planner and replanner."""
+    return TIME_CONTEXT_TEMPLATE.format(
+        current_utc_date=current_utc_date, current_utc_time=current_utc_time, current_year=current_year
+    )
+
+
+def _time_context(variables: Mapping[str, Any]) -> str:
+    return render_time_context(
+        variables["current_utc_date"], variables["current_utc_time"], variables["current_year"]
+    )
+
+
+def format_plan(steps: Sequence[str]) -> str:
+    """Render plan steps as a numbered list with one line per step."""
+    if not steps:
+        return "(no steps)"
+    return "\n".join(f"{i}. {' '.join(str(step).split())}" for i, step in enumerate(steps, 1))
+
+
+@dataclass
+class NodePromptStats:
+    """Token accounting of the prompts assembled for one node."""
+
+    calls: int = 0
+    tokens: int = 0
+    # Tokens in the byte-stable prefix, i.e. what a provider cache can reuse
+    static_tokens: int = 0
+    sections: Dict[str, int] = field(default_factory=dict)
+
+
+prompt_stats: Dict[str, NodePromptStats] = {}
+_stats_lock = threading.Lock()
+
+
+def record_prompt(node: str, sections: Sequence[PromptSection]) -> None:
+    """Count the tokens of one assembled prompt for ``node``."""
+    counts = [(section, section.tokens) for section in sections]
+    static_tokens = 0
+    for section, tokens in counts:
+        if not section.static:
+            break
+        static_tokens += tokens
+    with _stats_lock:
+        stats = prompt_stats.setdefault(node, NodePromptStats())
+        stats.calls += 1
+        stats.static_tokens += static_tokens
+        for section, tokens in counts:
+            stats.tokens += tokens
+            stats.sections[section.name] = stats.sections.get(section.name, 0) + tokens
+
+
+def prompt_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Return ``prompt_stats`` as plain dictionaries, one per node."""
+    with _stats_lock:
+        return {node: asdict(stats) for node, stats in prompt_stats.items()}
+
+
+def _message_sections(messages: Sequence[BaseMessage], first: str, rest: str) -> List[PromptSection]:
+    return [
+        PromptSection(first if i == 0 else rest, str(message.content))
+        for i, message in enumerate(messages)
+    ]
+
+
+def planner_messages(variables: Dict[str, Any], config: Optional[RunnableConfig] = None) -> List[BaseMessage]:
+    """Assemble the planner prompt.
+
+    Args:
+        variables: The planner inputs: ``messages`` and the time fields.
+        config: The runnable config, read for ``compact_prompts``.
+
+    Returns:
+        The messages sent to the planner model.
+    """
+    messages = list(variables["messages"])
+    time_context = _time_context(variables)
+    configuration = Configuration.from_runnable_config(config)
+    if configuration.compact_prompts:
+        sections = [
+            PromptSection("instructions", PLANNER_SYSTEM_PROMPT, static=True),
+            PromptSection("time_context", time_context),
+        ]
+        prompt = [SystemMessage(content=PLANNER_SYSTEM_PROMPT), SystemMessage(content=time_context)]
+    else:
+        sections = _PLANNER_TEMPLATE.sections({"time_context": time_context})
+        prompt = [SystemMessage(content=render(sections))]
+    if configuration.prompt_stats:
+        record_prompt("planner", sections + _message_sections(messages, "objective", "objective"))
+    return prompt + messages
+
+
+def replanner_messages(variables: Dict[str, Any], config: Optional[RunnableConfig] = None) -> List[BaseMessage]:
+    """Assemble the replanner prompt.
+
+    Args:
+        variables: The replanner inputs: ``input``, ``plan`` (a list of
+            steps), the compacted ``past_steps`` and ``current_draft_report``
+            texts and the time fields.
+        config: The runnable config, read for ``compact_prompts``.
+
+    Returns:
+        The messages sent to the replanner model.
+    """
+    time_context = _time_context(variables)
+    configuration = Configuration.from_runnable_config(config)
+    if not configuration.compact_prompts:
+        sections = _REPLANNER_TEMPLATE.sections({**variables, "time_context": time_context})
+        if configuration.prompt_stats:
+            record_prompt("replanner", sections)
+        return [HumanMessage(content=render(sections))]
+
+    context = _REPLANNER_CONTEXT.sections({**variables, "plan": format_plan(variables["plan"])})
+    sections = [PromptSection("time_context", time_context + "\n\n"), *context]
+    if configuration.prompt_stats:
+        record_prompt(
+            "replanner", [PromptSection("instructions", REPLANNER_SYSTEM_PROMPT, static=True), *sections]
+        )
+    return [SystemMessage(content=REPLANNER_SYSTEM_PROMPT), HumanMessage(content=render(sections))]
+
+
+def executor_messages(
+    messages: Sequence[BaseMessage], time_context: str, compact: bool = True, record: bool = False
+) -> List[BaseMessage]:
+    """Assemble the prompt of one ReAct sub-agent model call.
+
+    Args:
+        messages: The sub-agent messages: the task input, then tool calls and results.
+        time_context: The executor time context string.
+        compact: Whether to use the static-prefix layout.
+        record: Whether to count the prompt in ``prompt_stats``.
+
+    Returns:
+        The messages sent to the executor model.
+    """
+    if compact:
+        sections = [
+            PromptSection("instructions", EXECUTOR_SYSTEM_PROMPT, static=True),
+            PromptSection("time_context", time_context),
+        ]
+        prompt = [SystemMessage(content=EXECUTOR_SYSTEM_PROMPT), SystemMessage(content=time_context)]
+    else:
+        sections = [
+            PromptSection("instructions", _EXECUTOR_PREFIX, static=True),
+            PromptSection("time_context", time_context),
+            PromptSection("instructions", _EXECUTOR_SUFFIX),
+        ]
+        prompt = [SystemMessage(content=render(sections))]
+    if record:
+        record_prompt("executor", sections + _message_sections(messages, "task", "history"))
+    return [*prompt, *messages]
@@ -0,0 +1,81 @@
+"""Replanning policies deciding whether a replanner call is needed after a step.
+
+Policies (``replan_policy`` in the configuration):
+- ``always``: replan after every scheduler wave (the original behavior).
+- ``on_failure``: replan only when an unreviewed step looks like an error or
+  a refusal; otherwise keep executing the remaining plan.
+- ``every_n_steps``: replan once ``replan_every_n_steps`` steps have run since
+  the last replan, or earlier if a step failed.
+- ``at_end``: replan only when the plan is exhausted.
+
+Whatever the policy, the replanner always runs once the plan is empty so it
+can decide whether the objective is met and produce the final response.
+"""
+import re
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+
+from .configuration import Configuration
+from .state import PlanExecute
+
+REPLAN_POLICIES = ("always", "on_failure", "every_n_steps", "at_end")
+
+# First-person refusals and error reports the executor opens a failed step
+# with; the same words later in an answer are usually its subject matter
+_FAILURE_PATTERN = re.compile(
+    r"^\W*(?:(?:sorry|unfortunately|apologies)\b\W*)?("
+    r"i(?:'m| am)? (?:sorry|cannot|can't|can not|am unable|was unable|am not able|was not able|could not|couldn't|unable|not able)"
+    r"|(?:i (?:was|am) )?unable to|(?:i )?failed to|(?:an |the )?(?:tool |search )?error(?::| occurred| while)|exception:|traceback \(most recent call last\)"
+    r"|(?:the )?(?:search|tool|page|document|website) (?:is |was )?not (?:possible|available|accessible)"
+    r"|no (?:relevant )?(?:results|information|data) (?:was |were )?(?:found|available)"
+    r")",
+    re.IGNORECASE,
+)
+
+
+def looks_like_failure(output: str) -> bool:
+    """Heuristically check whether a step output is an error or a refusal.
+
+    Args:
+        output: The executor output for a step.
+
+    Returns:
+        True if the output looks like a failure, False otherwise.
+    """
+    if not output or not output.strip():
+        return True
+    return _FAILURE_PATTERN.match(output) is not None
+
+
+def should_replan(state: PlanExecute, config: Optional[RunnableConfig] = None) -> bool:
+    """Decide whether the replanner must run after the latest scheduler wave.
+
+    Args:
+        state: The current agent state.
+        config: The runnable config holding the replanning policy.
+
+    Returns:
+        True if the replanner should run, False to keep executing the plan.
+    """
+    if not state.get("plan"):
+        return True
+
+    configuration = Configuration.from_runnable_config(config)
+    policy = configuration.replan_policy
+    if policy not in REPLAN_POLICIES:
+        raise ValueError(
+            f"Unknown replan_policy {policy!r}; expected one of {REPLAN_POLICIES}"
+        )
+    if policy == "always":
+        return True
+    if policy == "at_end":
+        return False
+
+    steps_since_replan = state.get("steps_since_replan", 0)
+    unreviewed = state.get("past_steps", [])[-steps_since_replan:] if steps_since_replan else []
+    if any(looks_like_failure(str(output)) for _, output in unreviewed):
+        return True
+    if policy == "every_n_steps":
+        return steps_since_replan >= max(1, configuration.replan_every_n_steps)
+    return False
@@ -1,12 +1,26 @@
-import os
-from langchain_core.prompts import ChatPromptTemplate
+import logging
+from contextvars import ContextVar
 from pydantic import BaseModel, Field
-from typing import Union
+from typing import Any, Dict, List, Optional, Union
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 
+from .cache import cached_ainvoke
+from .compaction import compact_replanner_context, expand_draft_placeholder
+from .configuration import Configuration
 from .planner import Plan
 from .state import PlanExecute, get_default_state
-from .prompts import REPLANNER_PROMPT_TEMPLATE
-from .llm_config import get_azure_llm
+from .streaming import get_writer, plan_event, response_event, token_event
+from .prompt_assembly import replanner_messages
+from .llm_config import get_role_runnable
+from .speculation import resolve_speculation, start_speculation
+from .task_router import valid_kinds
+
+logger = logging.getLogger(__name__)
+
+# Collects the response text streamed by ``_astream_replanner`` for replan_step,
+# which streams the rest itself when the answer came from the cache
+_streamed_response: ContextVar[Optional[List[str]]] = ContextVar("agent_replanner_streamed", default=None)
 
 # Response model as per the example
 class Response(BaseModel):
@@ -21,47 +35,124 @@ class Act(BaseModel):
         "If you need to further use tools to get the answer or continue working, use Plan."
     )
 
-# Replanner prompt as per the example
-replanner_prompt = ChatPromptTemplate.from_template(REPLANNER_PROMPT_TEMPLATE)
+# Replanner prompt: static instructions first, then the run state (see prompt_assembly.py)
+replanner_prompt = RunnableLambda(replanner_messages)
 
 # LLM and replanner chain as per the example
-replanner = replanner_prompt | get_azure_llm(
-    model="gpt-4",
-    temperature=0,
-    deployment_name=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME_REPLANNER", "gpt-4")
-).with_structured_output(Act)
+def _build_replanner(llm: BaseChatModel) -> Runnable[Any, Any]:
+    return replanner_prompt | llm.with_structured_output(Act)
+
+
+def get_replanner(config: Optional[RunnableConfig] = None) -> Runnable[Any, Any]:
+    """Return the replanner chain bound to the model routed to the replanner role."""
+    return get_role_runnable("replanner", _build_replanner, config)
+
+async def _astream_replanner(
+    input_data: Dict[str, Any], config: Optional[RunnableConfig] = None
+) -> Act:
+    """Run the replanner chain, streaming the final response text as it is generated."""
+    writer = get_writer()
+    streamed_response = ""
+    output_act: Optional[Act] = None
+    async for partial_act in get_replanner(config).astream(input_data, config):
+        if partial_act is None:
+            continue
+        output_act = partial_act
+        if isinstance(partial_act.action, Response):
+            text = partial_act.action.response
+            if text.startswith(streamed_response) and len(text) > len(streamed_response):
+                writer(token_event("replanner", None, text[len(streamed_response):]))
+                streamed_response = text
+    if output_act is None:
+        # Nothing could be parsed while streaming; ask once more without streaming
+        output_act = await get_replanner(config).ainvoke(input_data, config)
+    if output_act is None:
+        raise ValueError("The replanner returned no parseable action")
+    streamed = _streamed_response.get()
+    if streamed is not None:
+        streamed.append(streamed_response)
+    return output_act
 
-async def replan_step(state: PlanExecute):
+
+# Streaming wrapper around the replanner chain, used behind the output cache
+streaming_replanner = RunnableLambda(_astream_replanner)
+
+async def replan_step(state: PlanExecute, config: Optional[RunnableConfig] = None):
     """Replans the existing plan based on execution feedback."""
     # Get default state values and update with current state
     current_state = get_default_state()
     current_state.update(state)
     
+    configuration = Configuration.from_runnable_config(config)
+    # Keep past steps and the draft within their token budgets
+    compacted, compaction_update = compact_replanner_context(current_state, configuration)
+    
     input_data_for_replanner = {
         "input": current_state["input"],
         "plan": current_state.get("plan", []),  # Previous plan
-        "past_steps": current_state["past_steps"],
-        "current_draft_report": current_state.get("current_draft_report", ""),  # Pass current draft
+        "past_steps": compacted["past_steps"],
+        "current_draft_report": compacted["current_draft_report"],  # Pass current draft
         "current_utc_date": current_state["current_utc_date"],
         "current_utc_time": current_state["current_utc_time"],
         "current_year": current_state["current_year"],
     }
     
-    output_act = await replanner.ainvoke(input_data_for_replanner)
+    # Run the next pending step while the replanner decides (see speculation.py)
+    speculation = (
+        start_speculation(current_state, config) if configuration.speculative_execution else None
+    )
+    streamed: List[str] = []
+    _streamed_response.set(streamed)
+    try:
+        output_act = await cached_ainvoke(
+            "replanner", streaming_replanner, input_data_for_replanner, Act, config, role="replanner"
+        )
+    except BaseException:
+        if speculation is not None:
+            await speculation.discard()
+        raise
+    writer = get_writer()
+    speculation_update = {}
+    if speculation is not None:
+        new_plan = output_act.action if isinstance(output_act.action, Plan) else None
+        speculation_update = await resolve_speculation(speculation, current_state, new_plan)
 
     if isinstance(output_act.action, Response):
+        # Cached and shared answers were not streamed by this run: send what is missing
+        text = output_act.action.response
+        streamed_text = streamed[0] if streamed else ""
+        if text != streamed_text:
+            writer(token_event("replanner", None, text[len(streamed_text):] if text.startswith(streamed_text) else text))
+        # This is the final answer/report
+        response = expand_draft_placeholder(
+            output_act.action.response, current_state.get("current_draft_report")
+        )
+        writer(response_event(response))
         return {
-            "response": output_act.action.response,  # This is the final answer/report
-            "plan": []  # Clear plan as it's finished
+            **compaction_update,
+            **speculation_update,
+            "response": response,
+            "plan": [],  # Clear plan as it's finished
+            "plan_dependencies": [],
         }
     elif isinstance(output_act.action, Plan):
+        writer(plan_event("replanner", output_act.action.steps))
         return {
+            **compaction_update,
             "plan": output_act.action.steps,  # New plan steps
-            "response": ""  # Clear any old final response from state if continuing
+            "plan_dependencies": output_act.action.resolved_dependencies(),
+            "step_kinds": {
+                **current_state["step_kinds"],
+                **valid_kinds(output_act.action.steps, output_act.action.kinds),
+            },
+            "steps_since_replan": 0,  # Every executed step has now been reviewed
+            "response": "",  # Clear any old final response from state if continuing
             # current_draft_report remains in state, it's not cleared by replanner
+            # A committed speculative step replaces the plan and adds to past_steps
+            **speculation_update,
         }
     else:
-        print(f"Warning: replan_step received an unexpected action type: {type(output_act.action)}. Defaulting to empty plan.")
+        logger.warning("replan_step received an unexpected action type: %s. Defaulting to empty plan.", type(output_act.action))
         # Potentially problematic, agent might get stuck.
         # Consider if it should re-try replanning or enter an error state.
-        return {"plan": [], "response": "Replanning resulted in an unexpected action type."}
\ No newline at end of file
+        return {"plan": [], "plan_dependencies": [], "response": "Replanning resulted in an unexpected action type."}
\ No newline at end of file
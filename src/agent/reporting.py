@@ -0,0 +1,36 @@
+"""Latency summaries and command-line helpers shared by the offline tools.
+
+Used by the benchmark (``benchmark.py``), the load test (``loadtest.py``) and
+the batch runner (``batch.py``).
+"""
+import argparse
+import statistics
+from typing import Dict, Sequence, Tuple
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Return the ``q`` percentile (0-100) of ``values`` by linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summary_ms(seconds: Sequence[float], percentiles: Sequence[int] = (50, 95)) -> Dict[str, float]:
+    """Return the mean and ``percentiles`` of ``seconds``, in milliseconds."""
+    ms = [s * 1000 for s in seconds]
+    summary = {"mean": round(statistics.fmean(ms), 3) if ms else 0.0}
+    for q in percentiles:
+        summary[f"p{q}"] = round(percentile(ms, q), 3)
+    return summary
+
+
+def parse_setting(text: str) -> Tuple[str, str]:
+    """Split a ``KEY=VALUE`` command-line argument."""
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected key=value, got {text!r}")
+    return key, value
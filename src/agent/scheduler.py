@@ -0,0 +1,165 @@
+"""Scheduler node that executes independent plan steps concurrently.
+
+The planner declares, for each step, which earlier steps it depends on. The
+scheduler picks every step whose dependencies have already been executed (a
+"wave"), runs them at the same time with a bounded concurrency, and merges
+their outputs into ``past_steps`` in plan order so the result does not depend
+on which step happened to finish first.
+
+Steps that already appear in ``past_steps`` (e.g. when a checkpointed thread
+is invoked again, or a new plan repeats a finished step) are dropped without
+being executed, unless ``skip_completed_steps`` is disabled. Either way they
+are counted in ``repeated_steps`` for the loop guard in ``budget.py``, and a
+wave never runs more steps than the step budget has left.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+from .budget import remaining_steps
+from .configuration import Configuration
+from .evidence import evidence_store_for, evidence_update
+from .executor import _is_document_related_task, _prepare_time_context, execute_task
+from .instrumentation import record_queue_wait
+from .planner import Plan
+from .state import PlanExecute, get_default_state
+from .task_router import normalize_task
+
+
+def _ready_wave(
+    plan: Sequence[str],
+    dependencies: Sequence[Sequence[int]],
+    step_kinds: Optional[Mapping[str, str]] = None,
+) -> List[int]:
+    """Select the indices of the steps to execute in the next wave.
+
+    A step is ready when none of its dependencies are still pending. Steps
+    that read or write the draft report are never run alongside other steps,
+    since they would race on ``current_draft_report``.
+
+    Args:
+        plan: The pending plan steps.
+        dependencies: Resolved dependencies for ``plan``.
+        step_kinds: Planner task kind tags (see ``task_router.py``).
+
+    Returns:
+        Indices into ``plan`` of the steps to execute, in plan order.
+    """
+    wave: List[int] = []
+    for index, task in enumerate(plan):
+        if dependencies[index]:
+            continue
+        if _is_document_related_task(task, step_kinds):
+            if not wave:
+                return [index]
+            continue
+        wave.append(index)
+    # An acyclic plan always has a ready step; guard against bad input anyway.
+    return wave or [0]
+
+
+def _remove_steps(
+    plan: Sequence[str],
+    dependencies: Sequence[Sequence[int]],
+    executed: Sequence[int],
+) -> Tuple[List[str], List[List[int]]]:
+    """Drop executed steps from the plan and re-index the remaining dependencies."""
+    done = set(executed)
+    new_index: Dict[int, int] = {}
+    for index in range(len(plan)):
+        if index not in done:
+            new_index[index] = len(new_index)
+    remaining_plan = [plan[i] for i in new_index]
+    remaining_dependencies = [
+        [new_index[d] for d in dependencies[i] if d in new_index]
+        for i in new_index
+    ]
+    return remaining_plan, remaining_dependencies
+
+
+def _step_key(task: str) -> str:
+    return normalize_task(task)
+
+
+def _completed_indices(plan: Sequence[str], past_steps: Sequence[Tuple[Any, ...]]) -> List[int]:
+    """Return the indices of the plan steps that were already executed."""
+    completed = {_step_key(step[0]) for step in past_steps if step}
+    return [index for index, task in enumerate(plan) if _step_key(task) in completed]
+
+
+async def schedule_step(state: PlanExecute, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """Execute the next wave of independent plan steps concurrently.
+
+    Args:
+        state: The current agent state.
+        config: The runnable config; ``max_concurrency`` caps parallel steps.
+
+    Returns:
+        Updated state with execution results.
+    """
+    current_state = get_default_state()
+    current_state.update(state)
+
+    plan = current_state["plan"]
+    current_draft_content = current_state.get("current_draft_report")
+    if not plan:
+        return {
+            "past_steps": [("No task to execute", "Plan was empty.")],
+            "current_draft_report": current_draft_content,
+        }
+
+    dependencies = Plan(
+        steps=plan, dependencies=current_state["plan_dependencies"]
+    ).resolved_dependencies()
+    configuration = Configuration.from_runnable_config(config)
+    completed = _completed_indices(plan, current_state["past_steps"])
+    repeated_steps = current_state["repeated_steps"]
+    if configuration.skip_completed_steps and completed:
+        plan, dependencies = _remove_steps(plan, dependencies, completed)
+        repeated_steps += len(completed)
+        if not plan:
+            return {"plan": [], "plan_dependencies": [], "repeated_steps": repeated_steps}
+
+    step_kinds = current_state["step_kinds"]
+    wave = _ready_wave(plan, dependencies, step_kinds)
+    remaining = remaining_steps(state, config)
+    if remaining is not None:
+        wave = wave[: max(1, remaining)]
+    if not configuration.skip_completed_steps:
+        repeated_steps += len(set(wave) & set(completed))
+    time_context = _prepare_time_context(current_state)
+    # Shared by the wave, so steps running side by side add to one store
+    evidence = evidence_store_for(current_state, config)
+    semaphore = asyncio.Semaphore(max(1, configuration.max_concurrency))
+
+    async def _run(index: int) -> Tuple[str, Optional[str]]:
+        queued_at = time.perf_counter()
+        async with semaphore:
+            await record_queue_wait(
+                "scheduler", time.perf_counter() - queued_at, plan[index], config
+            )
+            return await execute_task(
+                plan[index], current_draft_content, time_context, config, step_kinds=step_kinds, evidence=evidence
+            )
+
+    results = await asyncio.gather(*(_run(index) for index in wave))
+
+    new_draft_report_content = current_draft_content
+    past_steps = []
+    for index, (agent_output, draft) in zip(wave, results):
+        past_steps.append((plan[index], agent_output))
+        if _is_document_related_task(plan[index], step_kinds):
+            new_draft_report_content = draft
+
+    remaining_plan, remaining_dependencies = _remove_steps(plan, dependencies, wave)
+    return {
+        "past_steps": past_steps,
+        "current_draft_report": new_draft_report_content,
+        "plan": remaining_plan,
+        "plan_dependencies": remaining_dependencies,
+        "steps_since_replan": current_state["steps_since_replan"] + len(wave),
+        "repeated_steps": repeated_steps,
+        **evidence_update(evidence),
+    }
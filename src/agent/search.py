@@ -0,0 +1,487 @@
+"""Search tool layer shared by every executor step.
+
+``SearchService`` wraps a ``SearchBackend`` (Tavily in production, a fake in
+tests) with:
+- query normalization, so trivially different queries share results;
+- in-flight coalescing, so concurrent identical queries share one call;
+- a TTL result cache with LRU eviction;
+- a token-bucket rate limiter and a concurrency semaphore.
+
+``make_search_tool`` exposes the service to the ReAct sub-agent under the
+same name and schema as ``TavilySearchResults``, and adds its hits to the
+run's evidence store (see ``evidence.py``). Without a fixed service, the
+tools search through ``get_search_service`` for the calling run's config, so
+per-run ``search_*`` settings apply; runs with the same settings share one
+service, and with it its cache and limits.
+
+``make_batch_search_tool`` takes a list of queries in one tool call, so a
+step needing N searches costs one model turn instead of N. The queries run
+concurrently (at most ``search_batch_concurrency`` at a time, on top of the
+service's own limits). The hits are deduplicated by URL and returned as a
+text digest within ``search_batch_token_budget`` tokens.
+"""
+import asyncio
+import logging
+import re
+import time
+import weakref
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import BaseModel, Field
+
+from .cache import InMemoryCacheBackend
+from .configuration import Configuration
+from .evidence import record_search
+from .tokens import count_tokens, truncate_to_tokens
+
+if TYPE_CHECKING:
+    from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BACKENDS = ("tavily", "fake")
+SEARCH_TOOL_NAME = "tavily_search_results_json"
+SEARCH_TOOL_DESCRIPTION = (
+    "A search engine optimized for comprehensive, accurate, and trusted results. "
+    "Useful for when you need to answer questions about current events. "
+    "Input should be a search query."
+)
+BATCH_SEARCH_TOOL_NAME = "tavily_search_batch"
+BATCH_SEARCH_TOOL_DESCRIPTION = (
+    "Run several search queries at once and get a compact digest of the distinct results. "
+    "Use this instead of one search per turn whenever a task needs more than one query. "
+    "Input should be a list of search queries."
+)
+# Hits get at least this many tokens of content in a digest; fewer hits are shown otherwise
+_MIN_DIGEST_HIT_TOKENS = 40
+
+_PUNCTUATION = re.compile(r"[^\w\s\-\.:/'\"]+")
+
+# Process-wide services keyed by their settings, and the service forced by register_search_service
+_services: Dict[Tuple[Any, ...], "SearchService"] = {}
+_override: Optional["SearchService"] = None
+
+
+class SearchBackend(Protocol):
+    """Source of raw search results."""
+
+    async def asearch(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        """Return up to ``max_results`` hits, each with ``url`` and ``content`` keys."""
+        ...
+
+
+class TavilySearchBackend:
+    """Search backend calling the Tavily API."""
+
+    def __init__(self) -> None:
+        """Create the backend; the API client is built on the first search."""
+        self._api_wrapper: Optional[TavilySearchAPIWrapper] = None
+
+    async def asearch(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        """Return up to ``max_results`` cleaned Tavily results for ``query``."""
+        if self._api_wrapper is None:
+            # Created on first use so that a missing TAVILY_API_KEY only fails searches
+            from langchain_community.utilities.tavily_search import (
+                TavilySearchAPIWrapper,
+            )
+
+            # Validating an empty input reads the key from TAVILY_API_KEY
+            self._api_wrapper = TavilySearchAPIWrapper.model_validate({})
+        raw_results = await self._api_wrapper.raw_results_async(query, max_results)
+        results: List[Dict[str, Any]] = self._api_wrapper.clean_results(raw_results["results"])
+        return results
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query for caching and coalescing.
+
+    Args:
+        query: The raw query from the agent.
+
+    Returns:
+        The case-folded query with stray punctuation and extra whitespace removed.
+    """
+    return " ".join(_PUNCTUATION.sub(" ", query).split()).casefold().strip(" .")
+
+
+class TokenBucket:
+    """Token-bucket rate limiter for asyncio code."""
+
+    def __init__(self, rate_per_second: float, burst: int) -> None:
+        """Allow ``rate_per_second`` acquisitions on average, and bursts of ``burst``."""
+        self.rate_per_second = rate_per_second
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and consume it."""
+        if self.rate_per_second <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate_per_second
+            )
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+
+@dataclass
+class SearchStats:
+    """Counters describing how search requests were served."""
+
+    requests: int = 0
+    backend_calls: int = 0
+    cache_hits: int = 0
+    coalesced: int = 0
+    errors: int = 0
+
+
+class _LoopState:
+    """Asyncio primitives bound to one event loop."""
+
+    def __init__(self, max_concurrency: int) -> None:
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self.inflight: Dict[str, asyncio.Task[List[Dict[str, Any]]]] = {}
+
+
+class SearchService:
+    """Cached, coalesced and rate-limited access to a search backend."""
+
+    def __init__(
+        self,
+        backend: SearchBackend,
+        *,
+        max_results: int = 3,
+        cache_ttl_seconds: float = 300,
+        cache_max_entries: int = 256,
+        rate_per_second: float = 5.0,
+        burst: int = 5,
+        max_concurrency: int = 4,
+    ) -> None:
+        """Create a service in front of ``backend``.
+
+        Args:
+            backend: The backend answering the queries that are not cached.
+            max_results: Hits requested per query.
+            cache_ttl_seconds: How long results are reused.
+            cache_max_entries: Maximum number of cached queries.
+            rate_per_second: Average backend calls per second (0 disables the limit).
+            burst: Backend calls allowed at once before the rate applies.
+            max_concurrency: Maximum backend calls in flight per event loop.
+        """
+        self.backend = backend
+        self.max_results = max_results
+        self.max_concurrency = max_concurrency
+        self.cache = InMemoryCacheBackend(cache_max_entries, cache_ttl_seconds)
+        self.rate_limiter = TokenBucket(rate_per_second, burst)
+        self.stats = SearchStats()
+        self._loops: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _loop_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = _LoopState(self.max_concurrency)
+        return state
+
+    async def _call_backend(self, query: str, key: str) -> List[Dict[str, Any]]:
+        async with self._loop_state().semaphore:
+            await self.rate_limiter.acquire()
+            self.stats.backend_calls += 1
+            results = await self.backend.asearch(query, self.max_results)
+        self.cache.set(key, results)
+        return results
+
+    async def asearch(self, query: str) -> List[Dict[str, Any]]:
+        """Search for ``query``, reusing cached or in-flight results when possible.
+
+        Args:
+            query: The search query.
+
+        Returns:
+            The search hits.
+        """
+        self.stats.requests += 1
+        key = normalize_query(query)
+        cached: Optional[List[Dict[str, Any]]] = self.cache.get(key)
+        if cached is not None:
+            self.stats.cache_hits += 1
+            return cached
+
+        inflight = self._loop_state().inflight
+        task = inflight.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._call_backend(query, key))
+            inflight[key] = task
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+        try:
+            # Shield the shared call so one cancelled caller does not cancel the others
+            return await asyncio.shield(task)
+        except Exception:
+            self.stats.errors += 1
+            raise
+
+    async def asearch_many(
+        self, queries: Sequence[str], max_concurrency: int = 4
+    ) -> List[Union[List[Dict[str, Any]], BaseException]]:
+        """Search for several queries concurrently.
+
+        Args:
+            queries: The search queries.
+            max_concurrency: Queries searched at the same time.
+
+        Returns:
+            For each query, its hits or the exception it raised.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def _one(query: str) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self.asearch(query)
+
+        return await asyncio.gather(*(_one(query) for query in queries), return_exceptions=True)
+
+
+def search_digest(
+    results: Sequence[Tuple[str, Union[List[Dict[str, Any]], BaseException]]], token_budget: int
+) -> str:
+    """Merge the hits of several queries into one compact text digest.
+
+    Hits are deduplicated by URL and interleaved across queries (every
+    query's best hit first). The content of each hit is truncated so the
+    digest fits in ``token_budget`` tokens. If the budget cannot give each
+    hit a useful share, the lowest-ranked hits are left out.
+
+    Args:
+        results: (query, hits or exception) pairs.
+        token_budget: Token budget of the digest.
+
+    Returns:
+        One numbered block per hit, followed by a line per failed query.
+    """
+    ranked: List[List[Tuple[str, Dict[str, Any]]]] = []
+    failures = []
+    for query, hits in results:
+        if isinstance(hits, BaseException):
+            failures.append(f"Search for {query!r} failed: {hits!r}")
+        else:
+            ranked.append([(query, hit) for hit in hits if isinstance(hit, dict)])
+
+    seen = set()
+    merged: List[Tuple[str, Dict[str, Any]]] = []
+    for rank in range(max((len(query_hits) for query_hits in ranked), default=0)):
+        for query_hits in ranked:
+            if rank < len(query_hits):
+                query, hit = query_hits[rank]
+                url = str(hit.get("url") or "")
+                if url and url in seen:
+                    continue
+                seen.add(url)
+                merged.append((query, hit))
+
+    footer = "\n".join(failures)
+    budget = token_budget - count_tokens(footer)
+    merged = merged[: max(1, budget // _MIN_DIGEST_HIT_TOKENS)]
+    blocks = []
+    for i, (query, hit) in enumerate(merged, 1):
+        header = f"[{i}] {hit.get('url', '')} (query: {query})"
+        # The header, the line break and the truncation marker take a few tokens of the share
+        share = budget // len(merged) - count_tokens(header) - 4
+        blocks.append(f"{header}\n{truncate_to_tokens(' '.join(str(hit.get('content', '')).split()), share)}")
+    return "\n\n".join(blocks + ([footer] if footer else [])) or "No results."
+
+
+class SearchInput(BaseModel):
+    """Input of the search tool."""
+
+    query: str = Field(description="search query to look up")
+
+
+def make_search_tool(service: Optional[SearchService] = None) -> BaseTool:
+    """Expose a search service as a tool compatible with ``TavilySearchResults``.
+
+    Args:
+        service: The search service answering queries; by default the one
+            of the calling run (see ``get_search_service``).
+
+    Returns:
+        The search tool.
+    """
+
+    async def _search(query: str, config: RunnableConfig) -> Any:
+        try:
+            results = await (service or get_search_service(config)).asearch(query)
+        except Exception as e:
+            # Like TavilySearchResults, report failures to the agent instead of raising
+            logger.warning("Search for %r failed: %r", query, e)
+            return repr(e)
+        record_search(query, results)
+        return results
+
+    return StructuredTool.from_function(
+        coroutine=_search,
+        name=SEARCH_TOOL_NAME,
+        description=SEARCH_TOOL_DESCRIPTION,
+        args_schema=SearchInput,
+    )
+
+
+class BatchSearchInput(BaseModel):
+    """Input of the batched search tool."""
+
+    queries: List[str] = Field(description="search queries to look up, one per topic")
+
+
+def make_batch_search_tool(
+    service: Optional[SearchService] = None,
+    max_queries: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> BaseTool:
+    """Expose a search service as a tool running a list of queries in one call.
+
+    Args:
+        service: The search service answering queries; by default the one
+            of the calling run (see ``get_search_service``).
+        max_queries: Queries accepted per call; further ones are ignored.
+        max_concurrency: Queries of one call searched at the same time.
+        token_budget: Token budget of the returned digest.
+
+    Unset arguments come from the calling run's ``search_batch_*`` fields.
+
+    Returns:
+        The batched search tool.
+    """
+
+    async def _search_many(queries: List[str], config: RunnableConfig) -> str:
+        configuration = Configuration.from_runnable_config(config)
+        unique: Dict[str, str] = {}
+        for query in queries:
+            if query.strip():
+                unique.setdefault(normalize_query(query), query)
+        selected = list(unique.values())[: max(1, max_queries or configuration.search_batch_max_queries)]
+        results = await (service or get_search_service(config)).asearch_many(
+            selected, max_concurrency or configuration.search_batch_concurrency
+        )
+        for query, hits in zip(selected, results):
+            if isinstance(hits, BaseException):
+                logger.warning("Search for %r failed: %r", query, hits)
+            else:
+                record_search(query, hits)
+        return search_digest(
+            list(zip(selected, results)), token_budget or configuration.search_batch_token_budget
+        )
+
+    return StructuredTool.from_function(
+        coroutine=_search_many,
+        name=BATCH_SEARCH_TOOL_NAME,
+        description=BATCH_SEARCH_TOOL_DESCRIPTION,
+        args_schema=BatchSearchInput,
+    )
+
+
+def build_search_service(
+    backend: Optional[SearchBackend] = None,
+    config: Optional[RunnableConfig] = None,
+    **overrides: Any,
+) -> SearchService:
+    """Build a search service configured from ``search_*`` configuration fields.
+
+    Args:
+        backend: The search backend; defaults to the one named by ``search_backend``.
+        config: Optional runnable config; the environment is used otherwise.
+        **overrides: Keyword arguments overriding the configured values.
+
+    Returns:
+        The search service.
+
+    Raises:
+        ValueError: If ``search_backend`` is unknown.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    if backend is None:
+        if configuration.search_backend not in SEARCH_BACKENDS:
+            raise ValueError(
+                f"Unknown search_backend {configuration.search_backend!r}; expected one of {SEARCH_BACKENDS}"
+            )
+        if configuration.search_backend == "fake":
+            from .fakes import FakeSearchBackend
+
+            backend = FakeSearchBackend(
+                latency_seconds=configuration.fake_search_latency_ms / 1000,
+                latency_sigma=configuration.fake_latency_sigma,
+            )
+        else:
+            backend = TavilySearchBackend()
+    settings: Dict[str, Any] = {
+        "max_results": configuration.search_max_results,
+        "cache_ttl_seconds": configuration.search_cache_ttl_seconds,
+        "cache_max_entries": configuration.search_cache_max_entries,
+        "rate_per_second": configuration.search_rate_per_second,
+        "burst": configuration.search_burst,
+        "max_concurrency": configuration.search_max_concurrency,
+    }
+    settings.update(overrides)
+    return SearchService(backend, **settings)
+
+
+def get_search_service(config: Optional[RunnableConfig] = None) -> SearchService:
+    """Return the process-wide search service for the run's ``search_*`` settings.
+
+    Args:
+        config: Optional runnable config; the environment is used otherwise.
+
+    Returns:
+        The service registered with ``register_search_service``, or the one
+        shared by every run with the same settings.
+    """
+    if _override is not None:
+        return _override
+    configuration = Configuration.from_runnable_config(config)
+    settings = (
+        configuration.search_backend,
+        configuration.fake_search_latency_ms,
+        configuration.fake_latency_sigma,
+        configuration.search_max_results,
+        configuration.search_cache_ttl_seconds,
+        configuration.search_cache_max_entries,
+        configuration.search_rate_per_second,
+        configuration.search_burst,
+        configuration.search_max_concurrency,
+    )
+    service = _services.get(settings)
+    if service is None:
+        service = _services[settings] = build_search_service(config=config)
+    return service
+
+
+def register_search_service(service: Optional[SearchService]) -> None:
+    """Force every run to search through ``service`` regardless of the configuration.
+
+    Args:
+        service: The search service, or None to remove the override.
+    """
+    global _override
+    _override = service
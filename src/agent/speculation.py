@@ -0,0 +1,162 @@
+"""Speculative execution of the next plan step while the replanner runs.
+
+Most replans keep the rest of the existing plan, yet the scheduler waits for
+the replanner before running anything. With ``speculative_execution``
+enabled, ``replan_step`` starts the next ready step of the remaining plan
+at the same time as the replanner call:
+
+- If the new plan keeps the step (compared after whitespace and case
+  normalization) with no dependencies on other pending steps, the
+  speculative result is committed to ``past_steps`` and the step is removed
+  from the plan, hiding one executor run behind the replanner call.
+- Otherwise (the step was dropped or reordered, or the replanner answered)
+  the run is cancelled and its result discarded.
+
+Stream events of a speculative run are held back and only written on
+commit. ``speculation_stats`` in the state counts attempts, hits, misses and
+the tokens spent by discarded runs.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+
+from .budget import UsageCounter
+from .evidence import EvidenceStore, evidence_store_for, evidence_update
+from .executor import _is_document_related_task, _prepare_time_context, execute_task
+from .planner import Plan
+from .scheduler import _ready_wave, _remove_steps, _step_key
+from .streaming import StreamEvent, buffer_events, get_writer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Speculation:
+    """A plan step executing ahead of the replanner's decision."""
+
+    step: str
+    task: "asyncio.Task[Tuple[str, Optional[str]]]"
+    counter: UsageCounter
+    # Stream events of the run, written only if it is committed
+    events: List[StreamEvent]
+    # Copy of the run's evidence store, saved only if the step is committed
+    evidence: Optional[EvidenceStore] = None
+
+    async def discard(self) -> int:
+        """Cancel the run and return the tokens it had spent."""
+        self.task.cancel()
+        try:
+            await self.task
+        except BaseException:
+            # Cancelled, or failed before it could be cancelled: either way unused
+            pass
+        return self.counter.tokens
+
+
+def start_speculation(state: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Optional[Speculation]:
+    """Start executing the next ready step of ``state["plan"]`` in the background.
+
+    Args:
+        state: The agent state seen by the replanner, with defaults applied.
+        config: The runnable config of the replanner node.
+
+    Returns:
+        The running speculation, or None when the plan has no pending step.
+    """
+    plan = state["plan"]
+    if not plan:
+        return None
+    dependencies = Plan(steps=plan, dependencies=state["plan_dependencies"]).resolved_dependencies()
+    step_kinds = state["step_kinds"]
+    step = plan[_ready_wave(plan, dependencies, step_kinds)[0]]
+    counter = UsageCounter()
+    events: List[StreamEvent] = []
+    evidence = evidence_store_for(state, config)
+    run_config = merge_configs(config, {"callbacks": [counter], "metadata": {"agent_speculative": True}})
+
+    async def _run() -> Tuple[str, Optional[str]]:
+        buffer_events(events)
+        return await execute_task(
+            step,
+            state.get("current_draft_report"),
+            _prepare_time_context(state),
+            run_config,
+            step_kinds=step_kinds,
+            evidence=evidence,
+        )
+
+    return Speculation(step, asyncio.ensure_future(_run()), counter, events, evidence)
+
+
+def _kept_index(step: str, plan: List[str], dependencies: List[List[int]]) -> Optional[int]:
+    """Return the index of ``step`` in the new plan if it can run right away."""
+    key = _step_key(step)
+    for index, task in enumerate(plan):
+        if _step_key(task) == key:
+            return None if dependencies[index] else index
+    return None
+
+
+async def resolve_speculation(
+    speculation: Speculation,
+    state: Dict[str, Any],
+    new_plan: Optional[Plan],
+) -> Dict[str, Any]:
+    """Commit or discard a speculation once the replanner has decided.
+
+    Args:
+        speculation: The running speculation.
+        state: The agent state seen by the replanner, with defaults applied.
+        new_plan: The replanner's new plan, or None if it answered.
+
+    Returns:
+        The state update: updated ``speculation_stats`` and, on a hit, the
+        committed step in ``past_steps`` and the plan without it.
+    """
+    stats = dict(state.get("speculation_stats") or {})
+    stats["attempts"] = stats.get("attempts", 0) + 1
+    kept = None
+    if new_plan is not None:
+        dependencies = new_plan.resolved_dependencies()
+        kept = _kept_index(speculation.step, new_plan.steps, dependencies)
+
+    if kept is not None:
+        try:
+            output, draft = await speculation.task
+        except Exception:
+            logger.warning("Speculative step %r failed; running it again", speculation.step, exc_info=True)
+            kept = None
+
+    # A replanner answer (no new plan) always discards the speculation
+    if kept is None or new_plan is None:
+        stats["misses"] = stats.get("misses", 0) + 1
+        stats["wasted_tokens"] = stats.get("wasted_tokens", 0) + await speculation.discard()
+        return {"speculation_stats": stats}
+
+    stats["hits"] = stats.get("hits", 0) + 1
+    writer = get_writer()
+    for event in speculation.events:
+        writer(event)
+    plan, dependencies = _remove_steps(new_plan.steps, dependencies, [kept])
+    update: Dict[str, Any] = {
+        "speculation_stats": stats,
+        "past_steps": [(new_plan.steps[kept], output)],
+        "plan": plan,
+        "plan_dependencies": dependencies,
+        # The committed step has not been reviewed yet
+        "steps_since_replan": 1,
+        **evidence_update(speculation.evidence),
+    }
+    if _is_document_related_task(speculation.step, state["step_kinds"]):
+        update["current_draft_report"] = draft
+    return update
+
+
+def speculation_hit_rate(stats: Dict[str, int]) -> float:
+    """Return the fraction of speculative steps that were committed."""
+    attempts = stats.get("attempts", 0)
+    return stats.get("hits", 0) / attempts if attempts else 0.0
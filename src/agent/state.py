@@ -1,14 +1,44 @@
-from typing import List, Tuple, TypedDict, Annotated, Optional
+from typing import Dict, List, Tuple, TypedDict, Annotated, Optional
 import operator
 import datetime
 
+from .evidence import merge_evidence
+
 class PlanExecute(TypedDict, total=False):
     """State for the plan-and-execute agent."""
     input: str  # The user's input
+    # Path chosen by the entry router (direct, single_step or full) and why
+    route: str
+    route_reason: str
     # The plan devised by the planner
     plan: List[str]
+    # For each step in `plan`, the indices of earlier steps in `plan` it depends on
+    plan_dependencies: List[List[int]]
+    # Task kind ("draft", "search" or "general") tagged by the planner, by normalized step
+    step_kinds: Dict[str, str]
     # A list of (task, task_output) tuples for executed steps
     past_steps: Annotated[List[Tuple], operator.add]
+    # Steps planned and kept by the plan optimizer, and why the others were removed
+    plan_optimizer_stats: Dict[str, int]
+    # Number of steps executed since the replanner last ran
+    steps_since_replan: int
+    # Planned steps that repeated an already executed step (see budget.py)
+    repeated_steps: int
+    # Model tokens, search calls and start time of the run, checked against the budgets
+    budget_usage: Dict[str, float]
+    # The budget that ended the run early, if any
+    budget_stop: str
+    # Rolling one-line-per-step summary of the first `summarized_steps` past steps
+    past_steps_summary: str
+    summarized_steps: int
+    # Search hits gathered by the executor, as [url, content, query] rows (see evidence.py)
+    evidence: Annotated[List[List[str]], merge_evidence]
+    # Fingerprint of the draft the replanner saw last, to detect unchanged drafts
+    draft_fingerprint: str
+    # Replanner prompt tokens before/after compaction, accumulated over the run
+    compaction_stats: Dict[str, int]
+    # Speculative step attempts, hits, misses and wasted tokens, accumulated over the run
+    speculation_stats: Dict[str, int]
     # The final response or summary from the agent
     response: str
     # Time context fields
@@ -22,8 +52,23 @@ def get_default_state() -> dict:
     """Get default state values."""
     now_utc = datetime.datetime.now(datetime.timezone.utc)
     return {
+        "route": "",
+        "route_reason": "",
         "plan": [],
+        "plan_dependencies": [],
+        "step_kinds": {},
         "past_steps": [],
+        "plan_optimizer_stats": {},
+        "steps_since_replan": 0,
+        "repeated_steps": 0,
+        "budget_usage": {},
+        "budget_stop": "",
+        "past_steps_summary": "",
+        "summarized_steps": 0,
+        "evidence": [],
+        "draft_fingerprint": "",
+        "compaction_stats": {},
+        "speculation_stats": {},
         "response": "",
         "current_utc_date": now_utc.strftime('%Y-%m-%d'),
         "current_utc_time": now_utc.strftime('%H:%M:%S'),
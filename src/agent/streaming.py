@@ -0,0 +1,128 @@
+"""Custom stream events emitted by the graph nodes.
+
+Nodes write events through LangGraph's custom stream writer, so they are
+delivered to ``graph.astream(..., stream_mode="custom")`` consumers (and as
+``on_custom_event``-style chunks to ``astream_events``/server clients using
+the "custom" stream mode). Outside of a streaming run the writer is a no-op.
+
+Every event is a JSON-serializable dict with a ``type`` and the emitting
+``node``. Executor events also carry ``step``, the plan step they belong to,
+so consumers can demultiplex steps that run concurrently.
+
+Event schema (``type``: fields):
+
+- ``plan``: ``node``, ``steps``. The initial plan or a new plan from the
+  replanner.
+- ``step_start``: ``node``, ``step``. An executor step started.
+- ``token``: ``node``, ``step``, ``delta``, ``target``. Text generated by the
+  executor (``step`` is the plan step) or by the replanner's final response
+  (``step`` is None). ``target`` is "draft" when the text is new draft
+  content, "output" otherwise.
+- ``tool_start``: ``node``, ``step``, ``tool``, ``tool_call_id``, ``input``.
+- ``tool_end``: ``node``, ``step``, ``tool``, ``tool_call_id``, ``output``
+  (truncated to ``TOOL_OUTPUT_PREVIEW_CHARS``).
+- ``step_end``: ``node``, ``step``, ``output``. An executor step finished.
+- ``draft``: ``node``, ``step``, ``content``. ``current_draft_report`` was
+  updated; ``content`` is the full new draft.
+- ``response``: ``node``, ``content``. The final response (with the draft
+  placeholder already expanded). ``node`` is "replanner", or "direct" /
+  "single_step" for objectives answered by the entry router's short routes.
+
+Work whose outcome is not known yet (a speculatively executed step) calls
+``buffer_events`` so its events are held back and only written once the
+work is committed.
+"""
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from langgraph.config import get_stream_writer
+
+StreamEvent = Dict[str, Any]
+StreamWriter = Callable[[StreamEvent], None]
+
+TOOL_OUTPUT_PREVIEW_CHARS = 500
+
+_event_buffer: ContextVar[Optional[List[StreamEvent]]] = ContextVar("agent_event_buffer", default=None)
+
+
+def _no_op_writer(_: StreamEvent) -> None:
+    pass
+
+
+def get_writer() -> StreamWriter:
+    """Return the custom stream writer of the current run.
+
+    Returns:
+        The writer, or a no-op when called outside of a graph run. Inside
+        ``buffer_events`` it appends to the buffer instead.
+    """
+    buffer = _event_buffer.get()
+    if buffer is not None:
+        return buffer.append
+    try:
+        return get_stream_writer()
+    except (RuntimeError, KeyError):
+        return _no_op_writer
+
+
+def buffer_events(events: List[StreamEvent]) -> None:
+    """Collect the events written in the current context into ``events``.
+
+    Call it at the start of a task: the task runs in its own copy of the
+    context, so the buffering ends with it.
+    """
+    _event_buffer.set(events)
+
+
+def plan_event(node: str, steps: List[str]) -> StreamEvent:
+    """Build a ``plan`` event."""
+    return {"type": "plan", "node": node, "steps": list(steps)}
+
+
+def step_start_event(step: str) -> StreamEvent:
+    """Build a ``step_start`` event."""
+    return {"type": "step_start", "node": "executor", "step": step}
+
+
+def step_end_event(step: str, output: str) -> StreamEvent:
+    """Build a ``step_end`` event."""
+    return {"type": "step_end", "node": "executor", "step": step, "output": output}
+
+
+def token_event(node: str, step: Optional[str], delta: str, target: str = "output") -> StreamEvent:
+    """Build a ``token`` event."""
+    return {"type": "token", "node": node, "step": step, "delta": delta, "target": target}
+
+
+def tool_start_event(step: str, tool: str, tool_call_id: Optional[str], tool_input: Any) -> StreamEvent:
+    """Build a ``tool_start`` event."""
+    return {
+        "type": "tool_start",
+        "node": "executor",
+        "step": step,
+        "tool": tool,
+        "tool_call_id": tool_call_id,
+        "input": tool_input,
+    }
+
+
+def tool_end_event(step: str, tool: Optional[str], tool_call_id: Optional[str], output: Any) -> StreamEvent:
+    """Build a ``tool_end`` event with a truncated preview of the output."""
+    return {
+        "type": "tool_end",
+        "node": "executor",
+        "step": step,
+        "tool": tool,
+        "tool_call_id": tool_call_id,
+        "output": str(output)[:TOOL_OUTPUT_PREVIEW_CHARS],
+    }
+
+
+def draft_event(step: str, content: Optional[str]) -> StreamEvent:
+    """Build a ``draft`` event."""
+    return {"type": "draft", "node": "executor", "step": step, "content": content or ""}
+
+
+def response_event(content: str, node: str = "replanner") -> StreamEvent:
+    """Build a ``response`` event."""
+    return {"type": "response", "node": node, "content": content}
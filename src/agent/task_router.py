@@ -0,0 +1,162 @@
+"""Task routing: decide what kind of work a plan step is.
+
+The kind decides how a step is executed:
+
+- "draft": the step reads or writes the draft report. The draft is attached
+  to its prompt, its output updates the draft, and it never runs alongside
+  other steps.
+- "search": the step gathers information with the search tool.
+- "general": anything else (analysis, calculations, direct answers).
+
+The planner may tag each step with its kind (``Plan.kinds``); tags are kept
+in ``step_kinds`` in the state and take precedence. Untagged steps go to
+the process-wide ``TaskRouter``, by default ``KeywordTaskRouter``: compiled
+word-boundary patterns, memoized per task string. Unlike plain substring
+checks, "create a list of sources" or "review the search results" are not
+mistaken for draft work; a draft step has to name the draft or a document.
+A step that writes a document ("summarize the search results into a
+report") is draft work even when it mentions searching, unless the search
+comes first ("find the latest report").
+
+Install another router (e.g. a small classifier model) with
+``set_task_router``. ``routing_stats`` counts the routed steps per kind and
+how often, and at what token cost, the draft was attached.
+"""
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional, Protocol
+
+TASK_KINDS = ("draft", "search", "general")
+
+# Explicit references to the agent's draft always make a draft step
+_DRAFT_REFERENCE = re.compile(r"\bcurrent_draft_report\b|\bdrafts?\b", re.IGNORECASE)
+_SEARCH = re.compile(
+    r"\b(?:tavilysearchresults|search(?:es|ing)?|look(?:ing)? up|find|browse|gather)\b",
+    re.IGNORECASE,
+)
+# Verbs that produce a document, and the documents the agent writes
+_COMPOSE = re.compile(
+    r"\b(?:write|rewrite|compose|create|generate|produce|prepare|compile|summari[sz]e|finali[sz]e|revise)\b",
+    re.IGNORECASE,
+)
+_DOCUMENT = re.compile(
+    r"\b(?:reports?|documents?|summary|summaries|articles?|essays?|outline|sections?|memo|brief)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_task(task: str) -> str:
+    """Return ``task`` with whitespace collapsed and case folded, for comparisons."""
+    return " ".join(task.split()).casefold()
+
+
+class TaskRouter(Protocol):
+    """Classifies a plan step into one of ``TASK_KINDS``."""
+
+    def classify(self, task: str) -> str:
+        """Return the kind of ``task``."""
+        ...
+
+
+class KeywordTaskRouter:
+    """Word-boundary keyword matcher, memoized per task string."""
+
+    def __init__(self, max_cached: int = 4096) -> None:
+        """Create a router memoizing the kinds of up to ``max_cached`` task strings."""
+        self._cached_match = lru_cache(maxsize=max_cached)(self._match)
+
+    @staticmethod
+    def _match(task: str) -> str:
+        if _DRAFT_REFERENCE.search(task):
+            return "draft"
+        search = _SEARCH.search(task)
+        compose = _COMPOSE.search(task)
+        # Writing a document wins unless the step searches first ("find the latest report")
+        if compose and _DOCUMENT.search(task, compose.end()) and (not search or compose.start() < search.start()):
+            return "draft"
+        if search:
+            return "search"
+        if _DOCUMENT.search(task):
+            return "draft"
+        return "general"
+
+    def classify(self, task: str) -> str:
+        """Return the kind of ``task``."""
+        return self._cached_match(task)
+
+
+@dataclass
+class RoutingStats:
+    """Counters describing how executed steps were routed."""
+
+    steps: int = 0
+    # Steps whose kind came from a planner tag rather than the router
+    tagged: int = 0
+    by_kind: Dict[str, int] = field(default_factory=dict)
+    draft_attached: int = 0
+    draft_tokens_attached: int = 0
+
+    @property
+    def draft_attach_rate(self) -> float:
+        """Return the share of steps that were given the draft."""
+        return self.draft_attached / self.steps if self.steps else 0.0
+
+
+_router: TaskRouter = KeywordTaskRouter()
+routing_stats = RoutingStats()
+_stats_lock = threading.Lock()
+
+
+def set_task_router(router: Optional[TaskRouter]) -> None:
+    """Install a custom task router.
+
+    Args:
+        router: The router to use, or None to restore ``KeywordTaskRouter``.
+    """
+    global _router
+    _router = router if router is not None else KeywordTaskRouter()
+
+
+def get_task_router() -> TaskRouter:
+    """Return the process-wide task router."""
+    return _router
+
+
+def valid_kinds(steps: Any, kinds: Any) -> Dict[str, str]:
+    """Map each step to its planner tag, keeping only known kinds."""
+    if not kinds or len(kinds) != len(steps):
+        return {}
+    return {normalize_task(s): k for s, k in zip(steps, kinds) if k in TASK_KINDS}
+
+
+def task_kind(task: str, tags: Optional[Mapping[str, str]] = None) -> str:
+    """Return the kind of ``task``.
+
+    Args:
+        task: The plan step.
+        tags: Planner tags by normalized step (``step_kinds`` in the state).
+    """
+    if tags:
+        tagged = tags.get(normalize_task(task))
+        if tagged:
+            return tagged
+    return _router.classify(task)
+
+
+def record_route(kind: str, tagged: bool, draft_tokens: int = 0) -> None:
+    """Count one executed step and, if the draft was attached, its tokens."""
+    with _stats_lock:
+        routing_stats.steps += 1
+        routing_stats.tagged += int(tagged)
+        routing_stats.by_kind[kind] = routing_stats.by_kind.get(kind, 0) + 1
+        if draft_tokens:
+            routing_stats.draft_attached += 1
+            routing_stats.draft_tokens_attached += draft_tokens
+
+
+def routing_snapshot() -> Dict[str, Any]:
+    """Return ``routing_stats`` as a plain dictionary."""
+    with _stats_lock:
+        return {**asdict(routing_stats), "draft_attach_rate": routing_stats.draft_attach_rate}
@@ -0,0 +1,61 @@
+"""Local token counting used for prompt budgets and metrics.
+
+Uses tiktoken (installed with langchain-openai) when available and falls
+back to a four-characters-per-token estimate otherwise.
+"""
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import tiktoken
+
+ENCODING_NAME = "cl100k_base"
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional["tiktoken.Encoding"]:
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of ``text`` with a local tokenizer.
+
+    Args:
+        text: The text to measure.
+
+    Returns:
+        The number of tokens.
+    """
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " […]") -> str:
+    """Truncate ``text`` to at most ``max_tokens`` tokens.
+
+    Args:
+        text: The text to truncate.
+        max_tokens: The token budget.
+        marker: Suffix appended when the text was shortened.
+
+    Returns:
+        The original text if it fits, otherwise a truncated copy ending with ``marker``.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is None:
+        return text[: max_tokens * 4].rstrip() + marker
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens]).rstrip() + marker
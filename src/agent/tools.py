@@ -1,5 +1,10 @@
-from langchain_community.tools.tavily_search import TavilySearchResults
+from .evidence import make_evidence_tool
+from .search import make_batch_search_tool, make_search_tool
 
 # For this example, we will use a built-in search tool via Tavily.
 # Ensure TAVILY_API_KEY is set in your environment variables.
-tools = [TavilySearchResults(max_results=3)]
\ No newline at end of file
+# Searches are normalized, cached, coalesced and rate limited by the service
+# matching each run's search settings (see search.py).
+tools = [make_search_tool(), make_batch_search_tool()]
+# Retrieval over the search results of the current run (see evidence.py)
+evidence_tools = [make_evidence_tool()]
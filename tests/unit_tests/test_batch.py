@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+import pytest
+
+from agent.batch import BatchItem, BatchRunner, main, parse_tenant_limits, read_jsonl
+from agent.cache import (
+    InMemoryCacheBackend,
+    StructuredOutputCache,
+    set_structured_output_cache,
+)
+from agent.fakes import (
+    FakeChatModel,
+    FakeSearchBackend,
+    fake_search,
+    finishing_replanner,
+    registered_models,
+    research_planner,
+    searching_executor,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingGraph:
+    """Graph stand-in that sleeps per input and records peak concurrency."""
+
+    def __init__(self, delays=None) -> None:
+        self.delays = delays or {}
+        self.active = {}
+        self.peak = {}
+        self.configs = []
+
+    async def ainvoke(self, inputs, config):
+        self.configs.append(config)
+        tenant = config["metadata"]["tenant"]
+        self.active[tenant] = self.active.get(tenant, 0) + 1
+        self.peak[tenant] = max(self.peak.get(tenant, 0), self.active[tenant])
+        try:
+            delay = self.delays.get(inputs["input"], 0.01)
+            if delay is None:
+                raise RuntimeError("boom")
+            await asyncio.sleep(delay)
+        finally:
+            self.active[tenant] -= 1
+        return {"response": f"done: {inputs['input']}"}
+
+
+def _items(count, tenant):
+    return [{"id": f"{tenant}-{i}", "input": f"{tenant} objective {i}", "tenant": tenant} for i in range(count)]
+
+
+async def test_tenant_and_global_limits() -> None:
+    graph = RecordingGraph()
+    runner = BatchRunner(
+        graph,
+        {"configurable": {"batch_max_concurrency": 3, "batch_tenant_max_concurrency": 2}},
+        tenant_limits={"small": 1},
+    )
+    summary = await runner.arun(_items(6, "big") + _items(4, "small"))
+
+    assert summary["status"]["ok"] == 10
+    assert summary["tenants"]["small"]["ok"] == 4
+    assert graph.peak == {"big": 2, "small": 1}
+    assert graph.configs[0]["configurable"]["thread_id"] == "big-0"
+
+
+async def test_results_stream_with_timeout_error_and_invalid_lines() -> None:
+    graph = RecordingGraph({"slow": 1.0, "bad": None})
+    runner = BatchRunner(graph, {"configurable": {"batch_timeout_seconds": 0.05}})
+    lines = [
+        json.dumps({"id": "a", "input": "fast"}),
+        json.dumps({"id": "b", "input": "slow"}),
+        json.dumps({"id": "c", "input": "bad"}),
+        "",
+        "not json",
+    ]
+    streamed = []
+    summary = await runner.arun(read_jsonl(lines), streamed.append)
+
+    statuses = {r.id: r.status for r in streamed}
+    assert statuses == {"line-5": "error", "a": "ok", "c": "error", "b": "timeout"}
+    # The slow run times out last, after the others were already written
+    assert streamed[-1].id == "b"
+    assert summary["status"] == {"ok": 1, "error": 2, "timeout": 1, "cancelled": 0}
+
+
+async def test_cancel_and_backpressure() -> None:
+    graph = RecordingGraph({f"objective {i}": 0.3 for i in range(4)})
+    runner = BatchRunner(graph, {"configurable": {"batch_max_pending": 2, "batch_tenant_max_concurrency": 4}})
+    read = []
+
+    def items():
+        for i in range(4):
+            read.append(i)
+            yield BatchItem(id=str(i), input=f"objective {i}")
+
+    async def cancel_first():
+        await asyncio.sleep(0.05)
+        # Only max_pending inputs were read while the first run was blocking
+        assert len(read) <= 3
+        assert runner.cancel("0")
+
+    canceller = asyncio.ensure_future(cancel_first())
+    summary = await runner.arun(items())
+    await canceller
+
+    assert summary["status"]["cancelled"] == 1
+    assert summary["status"]["ok"] == 3
+    assert runner.cancel("0") is False
+
+
+async def test_overlapping_objectives_share_plans_and_searches() -> None:
+    models = {
+        "planner": FakeChatModel(responder=research_planner(2)),
+        "executor": FakeChatModel(responder=searching_executor(5)),
+        "replanner": FakeChatModel(responder=finishing_replanner),
+    }
+    set_structured_output_cache(StructuredOutputCache(InMemoryCacheBackend()))
+    items = [{"id": str(i), "input": "AI trends"} for i in range(4)]
+    try:
+        with registered_models(models), fake_search(FakeSearchBackend(), 0):
+            runner = BatchRunner(config={"configurable": {"llm_provider": "fake", "entry_route": "full"}})
+            summary = await runner.arun(items)
+    finally:
+        set_structured_output_cache(None)
+
+    assert summary["status"]["ok"] == 4
+    assert models["planner"].call_count == 1
+    assert summary["planner_cache"]["planner"]["hit_rate"] == 0.75
+    assert summary["search"]["backend_calls"] == 2
+
+
+def test_parse_tenant_limits() -> None:
+    assert parse_tenant_limits(" a=2, b=1,") == {"a": 2, "b": 1}
+    with pytest.raises(ValueError):
+        parse_tenant_limits("a")
+
+
+def test_cli_appends_results(tmp_path, capsys, monkeypatch) -> None:
+    graph = RecordingGraph()
+    monkeypatch.setattr("agent.graph.graph", graph)
+    source = tmp_path / "in.jsonl"
+    source.write_text("\n".join(json.dumps(item) for item in _items(3, "t")))
+    output = tmp_path / "out.jsonl"
+
+    main([str(source), str(output), "--concurrency", "2", "--tenant-limit", "t=1"])
+
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(row["id"] for row in rows) == ["t-0", "t-1", "t-2"]
+    assert json.loads(capsys.readouterr().out)["status"]["ok"] == 3
+    assert graph.peak == {"t": 1}
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from agent.benchmark import (
+    benchmark_checkpoint_overhead,
+    benchmark_draft_edits,
+    benchmark_graph,
+    benchmark_prompts,
+    main,
+)
+from agent.reporting import percentile
+
+pytestmark = pytest.mark.anyio
+
+
+def test_percentile_interpolates() -> None:
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([5], 95) == 5
+    assert percentile([], 50) == 0.0
+
+
+async def test_checkpoint_benchmark_reports_overhead() -> None:
+    report = await benchmark_checkpoint_overhead(runs=1, steps=3, output_words=200)
+    # input, router, planner, plan optimizer, three scheduler waves, replanner and the final checkpoint
+    assert report["supersteps_per_run"] == 9
+    assert report["write_ms_per_superstep"]["mean"] > 0
+    assert report["final_state_bytes"]["stored"] < report["final_state_bytes"]["raw"]
+
+
+async def test_graph_benchmark_counts_are_deterministic() -> None:
+    report = await benchmark_graph(requests=3, concurrency=2, llm_latency_ms=0, search_latency_ms=0)
+
+    assert report["failures"] == 0
+    # Three searches (tool call + answer each), then the report step.
+    assert report["llm_calls_per_request"] == {"planner": 1, "executor": 7, "replanner": 2}
+    assert report["search_calls_per_request"] == 3
+    assert report["prompt_tokens_per_request"]["replanner"] > 0
+    assert report["latency_ms"]["p99"] >= report["latency_ms"]["p50"] > 0
+
+
+async def test_replan_policy_variant_saves_replanner_calls() -> None:
+    report = await benchmark_graph(
+        requests=1, llm_latency_ms=0, search_latency_ms=0, configurable={"replan_policy": "at_end"}
+    )
+    assert report["llm_calls_per_request"]["replanner"] == 1
+
+
+def test_cli_writes_sorted_json(tmp_path, capsys) -> None:
+    output = tmp_path / "bench.json"
+    main(["--output", str(output), "graph", "--requests", "1", "--llm-latency-ms", "0", "--set", "max_concurrency=1"])
+
+    report = json.loads(output.read_text())
+    assert report["parameters"]["configurable"] == {"max_concurrency": "1"}
+    assert list(report) == sorted(report)
+    assert json.loads(capsys.readouterr().out) == report
+
+
+async def test_speculative_variant_reports_hits() -> None:
+    report = await benchmark_graph(
+        requests=2, llm_latency_ms=0, search_latency_ms=0, configurable={"speculative_execution": True}
+    )
+    assert report["speculation"]["hit_rate"] == 1.0
+    assert report["llm_calls_per_request"] == {"planner": 1, "executor": 7, "replanner": 2}
+
+
+async def test_draft_benchmark_patches_save_completion_tokens() -> None:
+    report = await benchmark_draft_edits(sections=3, section_words=60, ms_per_token=0)
+
+    assert report["drafts_match"]
+    assert report["completion_token_reduction"] > 0.4
+
+
+async def test_prompts_benchmark_reports_cacheable_prefix() -> None:
+    report = await benchmark_prompts(requests=2, searches=2, output_words=20)
+
+    assert set(report["variants"]["compact"]) == {"planner", "executor", "replanner"}
+    for node in ("planner", "executor", "replanner"):
+        assert report["uncached_token_reduction"][node] > 0.3
+        assert report["variants"]["compact"][node]["sections_per_call"]["instructions"] > 0
@@ -0,0 +1,155 @@
+import time
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent.budget import UsageCounter, best_available_response, budget_exhausted
+from agent.checkpointer import thread_config
+from agent.fakes import (
+    FakeChatModel,
+    FakeSearchBackend,
+    default_fake_responder,
+    fake_search,
+    registered_models,
+    research_planner,
+    searching_executor,
+)
+from agent.graph import workflow
+from agent.search import BATCH_SEARCH_TOOL_NAME, SEARCH_TOOL_NAME
+
+pytestmark = pytest.mark.anyio
+
+FAKE = {"llm_provider": "fake", "cache_backend": "none", "entry_route": "full"}
+
+
+async def _run(models, **configurable):
+    with registered_models(models), fake_search(FakeSearchBackend(), 0):
+        return await workflow.compile().ainvoke(
+            {"input": "AI trends"}, {"configurable": {**FAKE, **configurable}, "recursion_limit": 100}
+        )
+
+
+def _endless_replanner():
+    """Always plan one more new step, never answer."""
+    counter = iter(range(1000))
+    return FakeChatModel(
+        responder=lambda messages: {"action": {"steps": [f"Check fact {next(counter)}"], "dependencies": [[]]}}
+    )
+
+
+async def test_step_budget_finalizes_with_the_current_draft() -> None:
+    models = {
+        "planner": FakeChatModel(
+            responses=[{"steps": ["Generate an initial draft of the report"], "dependencies": [[]]}]
+        ),
+        "executor": FakeChatModel(responder=lambda messages: "# Report\nBody"),
+        "replanner": _endless_replanner(),
+    }
+    state = await _run(models, budget_max_steps=3)
+
+    assert state["budget_stop"] == "steps budget exhausted (3 of 3)"
+    assert len(state["past_steps"]) == 3
+    assert state["response"] == state["current_draft_report"] == "# Report\nBody"
+
+
+async def test_wave_is_capped_by_the_step_budget() -> None:
+    models = {
+        "planner": FakeChatModel(responder=research_planner(4)),
+        "executor": FakeChatModel(responder=default_fake_responder("executor")),
+        "replanner": FakeChatModel(responder=default_fake_responder("replanner")),
+    }
+    state = await _run(models, budget_max_steps=2)
+
+    assert len(state["past_steps"]) == 2
+    assert models["replanner"].call_count == 0
+    assert state["response"].startswith("Fake findings")
+
+
+async def test_repeated_steps_stop_the_loop() -> None:
+    models = {
+        "planner": FakeChatModel(responses=[{"steps": ["Search A"], "dependencies": [[]]}]),
+        "executor": FakeChatModel(responder=lambda messages: "Found A."),
+        "replanner": FakeChatModel(
+            responder=lambda messages: {"action": {"steps": ["search  a"], "dependencies": [[]]}}
+        ),
+    }
+    state = await _run(models)
+
+    assert state["budget_stop"] == "repeated steps budget exhausted (3 of 3)"
+    assert models["executor"].call_count == 1
+    assert state["response"] == "Found A."
+
+
+async def test_token_budget_skips_execution() -> None:
+    models = {
+        "planner": FakeChatModel(responder=default_fake_responder("planner")),
+        "executor": FakeChatModel(responder=default_fake_responder("executor")),
+        "replanner": FakeChatModel(responder=default_fake_responder("replanner")),
+    }
+    state = await _run(models, budget_max_tokens=10)
+
+    assert state["budget_usage"]["tokens"] == models["planner"].input_tokens + models["planner"].output_tokens
+    assert state["budget_stop"].startswith("tokens budget exhausted")
+    assert models["executor"].call_count == 0
+    assert state["response"].startswith("The run stopped before an answer was ready: tokens budget")
+
+
+async def test_search_calls_are_metered() -> None:
+    models = {
+        "planner": FakeChatModel(responder=research_planner(3)),
+        "executor": FakeChatModel(responder=searching_executor(5)),
+        "replanner": FakeChatModel(responder=default_fake_responder("replanner")),
+    }
+    state = await _run(models, budget_max_search_calls=2)
+
+    assert state["budget_usage"]["search_calls"] == 3
+    assert state["budget_stop"] == "search calls budget exhausted (3 of 2)"
+    assert models["replanner"].call_count == 0
+
+
+async def test_run_within_budget_is_unchanged() -> None:
+    models = {role: FakeChatModel(responder=default_fake_responder(role)) for role in ("planner", "executor", "replanner")}
+    state = await _run(models)
+
+    assert "budget_stop" not in state
+    assert state["response"] == "Fake final answer based on the executed steps."
+    assert state["budget_usage"]["tokens"] > 0
+
+
+async def test_each_run_on_a_thread_has_its_own_budget() -> None:
+    models = {role: FakeChatModel(responder=default_fake_responder(role)) for role in ("planner", "executor", "replanner")}
+    graph = workflow.compile(checkpointer=InMemorySaver())
+    config = thread_config("same-thread", {"configurable": {**FAKE, "budget_max_steps": 1}})
+    with registered_models(models), fake_search(FakeSearchBackend(), 0):
+        first = await graph.ainvoke({"input": "AI trends"}, config)
+        second = await graph.ainvoke({"input": "EV trends"}, config)
+
+    assert len(second["past_steps"]) == 2
+    assert second["budget_usage"]["first_step"] == 1
+    assert second["budget_usage"]["started_at"] > first["budget_usage"]["started_at"]
+    assert budget_exhausted(second, {"configurable": {"budget_max_seconds": 60}}) is None
+    assert second["response"] == best_available_response(second, "steps") == second["past_steps"][1][1]
+
+
+def test_wall_clock_budget() -> None:
+    state = {"budget_usage": {"started_at": time.time() - 5}}
+    config = {"configurable": {"budget_max_seconds": 2}}
+
+    assert budget_exhausted(state, config).startswith("seconds budget exhausted")
+    assert budget_exhausted(state, {"configurable": {"budget_max_seconds": 60}}) is None
+
+
+def test_best_available_response_skips_failed_steps() -> None:
+    state = {"past_steps": [("A", "Found A."), ("B", "I was unable to search.")]}
+    assert best_available_response(state, "steps") == "Found A."
+    assert best_available_response({"current_draft_report": "# Draft", **state}, "steps") == "# Draft"
+    assert best_available_response({}, "tokens") == "The run stopped before an answer was ready: tokens."
+
+
+def test_each_batched_query_counts_as_a_search_call() -> None:
+    counter = UsageCounter()
+    counter.on_tool_start({"name": SEARCH_TOOL_NAME}, "a")
+    counter.on_tool_start({"name": BATCH_SEARCH_TOOL_NAME}, "", inputs={"queries": ["a", "b", "c"]})
+    counter.on_tool_start({"name": "search_previous_results"}, "a")
+
+    assert counter.search_calls == 4
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from agent.cache import (
+    InMemoryCacheBackend,
+    SQLiteCacheBackend,
+    StructuredOutputCache,
+    get_structured_output_cache,
+)
+from agent.llm_config import model_identity
+from agent.planner import Plan
+from agent.replanner import Act, Response
+
+pytestmark = pytest.mark.anyio
+
+
+def _counting_chain(result):
+    calls = []
+
+    async def _run(variables):
+        calls.append(variables)
+        return result
+
+    return RunnableLambda(_run), calls
+
+
+def _planner_vars(objective: str, date: str = "2025-01-06", time: str = "10:00:00") -> dict:
+    return {
+        "messages": [HumanMessage(content=objective)],
+        "current_utc_date": date,
+        "current_utc_time": time,
+        "current_year": date[:4],
+    }
+
+
+class KeywordEmbeddings(Embeddings):
+    """Embeds text as keyword counts so similar objectives are close."""
+
+    words = ("ai", "trends", "report", "weather")
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [float(text.count(w)) for w in self.words]
+
+
+async def test_exact_tier_ignores_time_and_formatting() -> None:
+    cache = StructuredOutputCache()
+    chain, calls = _counting_chain(Plan(steps=["search"], dependencies=[[]]))
+
+    first = await cache.ainvoke("planner", chain, _planner_vars("AI trends"), Plan)
+    second = await cache.ainvoke(
+        "planner", chain, _planner_vars("  ai   TRENDS ", time="23:59:59"), Plan
+    )
+
+    assert len(calls) == 1
+    assert second == first
+    assert cache.stats_snapshot()["planner"]["exact_hits"] == 1
+    assert cache.stats_for("planner").misses == 1
+
+
+async def test_outputs_are_not_shared_between_models() -> None:
+    cache = StructuredOutputCache()
+    chain, calls = _counting_chain(Plan(steps=["search"], dependencies=[[]]))
+
+    await cache.ainvoke("planner", chain, _planner_vars("AI trends"), Plan, model="azure:gpt-4")
+    await cache.ainvoke("planner", chain, _planner_vars("AI trends"), Plan, model="fake:gpt-4")
+    await cache.ainvoke("planner", chain, _planner_vars("AI trends"), Plan, model="azure:gpt-4o")
+    await cache.ainvoke("planner", chain, _planner_vars("AI trends"), Plan, model="azure:gpt-4")
+
+    assert len(calls) == 3
+    assert model_identity("planner", {"configurable": {"llm_provider": "fake", "planner_model": "small"}}) == (
+        "fake:small"
+    )
+
+
+async def test_date_bucket_controls_reuse_across_days() -> None:
+    chain, calls = _counting_chain(Plan(steps=["search"]))
+    daily = StructuredOutputCache(date_bucket="day")
+    weekly = StructuredOutputCache(date_bucket="week")
+    for cache in (daily, weekly):
+        await cache.ainvoke("planner", chain, _planner_vars("x", date="2025-01-06"), Plan)
+        await cache.ainvoke("planner", chain, _planner_vars("x", date="2025-01-07"), Plan)
+    assert daily.stats_for("planner").misses == 2
+    assert weekly.stats_for("planner").exact_hits == 1
+
+
+async def test_semantic_tier_serves_near_duplicates() -> None:
+    cache = StructuredOutputCache(embeddings=KeywordEmbeddings(), similarity_threshold=0.9)
+    chain, calls = _counting_chain(Plan(steps=["search"]))
+
+    await cache.ainvoke("planner", chain, _planner_vars("AI trends report"), Plan, semantic_field="messages")
+    await cache.ainvoke("planner", chain, _planner_vars("report on AI trends"), Plan, semantic_field="messages")
+    await cache.ainvoke("planner", chain, _planner_vars("weather report"), Plan, semantic_field="messages")
+
+    stats = cache.stats_for("planner")
+    assert (stats.exact_hits, stats.semantic_hits, stats.misses) == (0, 1, 2)
+
+
+async def test_union_outputs_round_trip() -> None:
+    cache = StructuredOutputCache()
+    chain, _ = _counting_chain(Act(action=Response(response="done")))
+    variables = {"input": "q", "past_steps": [("task", "out")]}
+    await cache.ainvoke("replanner", chain, variables, Act)
+    cached = await cache.ainvoke("replanner", chain, variables, Act)
+    assert isinstance(cached.action, Response)
+
+
+def test_memory_backend_lru_and_ttl(monkeypatch) -> None:
+    backend = InMemoryCacheBackend(max_entries=2, ttl_seconds=10)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.evictions == 1
+
+    now = __import__("time").monotonic()
+    monkeypatch.setattr("agent.cache.time.monotonic", lambda: now + 11)
+    assert backend.get("a") is None
+
+
+def test_sqlite_backend_persists_and_evicts(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite3")
+    backend = SQLiteCacheBackend(path, max_entries=2)
+    backend.set("a", {"steps": ["x"]})
+    backend.set("b", {"steps": ["y"]})
+    backend.set("c", {"steps": ["z"]})
+
+    reopened = SQLiteCacheBackend(path, max_entries=2)
+    assert reopened.get("a") is None
+    assert reopened.get("c") == {"steps": ["z"]}
+
+
+async def test_sqlite_backend_is_not_called_on_the_event_loop(tmp_path, monkeypatch) -> None:
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+    cache = StructuredOutputCache(backend)
+    loop_thread = threading.get_ident()
+    threads = []
+    for name in ("get", "set"):
+        method = getattr(backend, name)
+        monkeypatch.setattr(
+            backend, name, lambda *args, _method=method: threads.append(threading.get_ident()) or _method(*args)
+        )
+    chain, calls = _counting_chain(Plan(steps=["search"], dependencies=[[]]))
+
+    await cache.ainvoke("planner", chain, _planner_vars("AI trends"), Plan)
+    await cache.ainvoke("planner", chain, _planner_vars("AI trends"), Plan)
+
+    assert len(calls) == 1
+    assert len(threads) == 3 and loop_thread not in threads
+
+
+def test_cache_can_be_disabled() -> None:
+    assert get_structured_output_cache({"configurable": {"cache_backend": "none"}}) is None
+    assert get_structured_output_cache({"configurable": {"cache_backend": "memory"}}) is not None
+
+
+async def test_identical_concurrent_calls_are_coalesced() -> None:
+    cache = StructuredOutputCache()
+    calls = []
+
+    async def _slow(variables):
+        calls.append(variables)
+        await asyncio.sleep(0.01)
+        return Plan(steps=["search"], dependencies=[[]])
+
+    chain = RunnableLambda(_slow)
+    plans = await asyncio.gather(
+        *(cache.ainvoke("planner", chain, _planner_vars("AI trends"), Plan) for _ in range(3))
+    )
+
+    assert len(calls) == 1
+    assert plans[0] == plans[1] == plans[2]
+    stats = cache.stats_snapshot()["planner"]
+    assert (stats["misses"], stats["coalesced"]) == (1, 2)
@@ -0,0 +1,81 @@
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent import llm_config
+from agent.checkpointer import (
+    CompressedSerializer,
+    aresume,
+    get_checkpointer,
+    thread_config,
+)
+from agent.fakes import FakeChatModel, default_fake_responder
+from agent.graph import workflow
+
+pytestmark = pytest.mark.anyio
+
+FAKE = {"llm_provider": "fake", "cache_backend": "none", "replan_policy": "at_end", "entry_route": "full"}
+
+
+def make_saver(configuration):
+    return InMemorySaver()
+
+
+def test_large_values_are_compressed() -> None:
+    serde = CompressedSerializer(min_bytes=256)
+    value = {"past_steps": [["task", "output " * 200]]}
+    typ, data = serde.dumps_typed(value)
+    assert typ.endswith("+zlib")
+    assert serde.loads_typed((typ, data)) == value
+
+    small = serde.dumps_typed({"plan": ["a"]})
+    assert not small[0].endswith("+zlib")
+    assert serde.loads_typed(small) == {"plan": ["a"]}
+
+
+def test_checkpointer_is_selected_from_configuration() -> None:
+    assert get_checkpointer({"configurable": {"checkpoint_backend": "none"}}) is None
+    assert isinstance(get_checkpointer({"configurable": {"checkpoint_backend": "memory"}}), InMemorySaver)
+    custom = get_checkpointer({"configurable": {"checkpoint_backend": f"{__name__}:make_saver"}})
+    assert isinstance(custom, InMemorySaver)
+    with pytest.raises(ValueError):
+        get_checkpointer({"configurable": {"checkpoint_backend": "redis"}})
+
+
+def test_sqlite_checkpointer(tmp_path) -> None:
+    pytest.importorskip("langgraph.checkpoint.sqlite")
+    saver = get_checkpointer(
+        {"configurable": {"checkpoint_backend": "sqlite", "checkpoint_path": str(tmp_path / "c.db")}}
+    )
+    assert saver is not None
+
+
+async def test_interrupted_run_resumes_without_repeating_steps(monkeypatch) -> None:
+    calls = []
+
+    def executor(messages):
+        task = str(messages[-1].content)
+        calls.append(task)
+        if "second" in task and len(calls) == 2:
+            raise RuntimeError("worker crashed")
+        return f"done: {task[:40]}"
+
+    planner = FakeChatModel(responses=[{"steps": ["first step", "second step"], "dependencies": [[], [0]]}])
+    monkeypatch.setitem(llm_config._overrides, "planner", planner)
+    monkeypatch.setitem(llm_config._overrides, "executor", FakeChatModel(responder=executor))
+    monkeypatch.setitem(
+        llm_config._overrides, "replanner", FakeChatModel(responder=default_fake_responder("replanner"))
+    )
+    graph = workflow.compile(checkpointer=InMemorySaver(serde=CompressedSerializer()))
+    config = thread_config("run-1", {"configurable": FAKE})
+
+    with pytest.raises(RuntimeError):
+        await graph.ainvoke({"input": "objective"}, config)
+    result = await aresume(graph, "run-1", {"configurable": FAKE})
+
+    assert [task for task, _ in result["past_steps"]] == ["first step", "second step"]
+    assert sum("first" in c for c in calls) == 1
+    assert planner.call_count == 1
+    assert (await aresume(graph, "run-1"))["response"] == result["response"]
+
+    with pytest.raises(ValueError):
+        await aresume(graph, "unknown")
@@ -0,0 +1,220 @@
+import asyncio
+import threading
+
+import pytest
+
+from agent.batch import BatchRunner
+from agent.coalesce import (
+    CoalescingGraph,
+    InMemorySingleFlight,
+    SQLiteSingleFlight,
+    coalesce_key,
+    set_single_flight,
+)
+from agent.fakes import (
+    FakeChatModel,
+    FakeSearchBackend,
+    default_fake_responder,
+    fake_search,
+    registered_models,
+)
+from agent.graph import workflow
+
+pytestmark = pytest.mark.anyio
+
+
+class StreamingGraph:
+    """Graph stand-in that streams two events per run and counts its runs."""
+
+    def __init__(self, delay=0.05, fail=False) -> None:
+        self.delay = delay
+        self.fail = fail
+        self.runs = 0
+
+    async def astream(self, inputs, config=None, stream_mode=None):
+        self.runs += 1
+        yield "custom", {"type": "step", "input": inputs["input"]}
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("boom")
+        yield "custom", {"type": "response", "run": self.runs}
+        yield "values", {"input": inputs["input"], "response": f"answer {self.runs}"}
+
+
+async def _collect(graph, text):
+    return [event async for event in graph.astream({"input": text})]
+
+
+def test_key_normalizes_the_input_and_buckets_the_date() -> None:
+    key = coalesce_key("AI  trends", "2031-01-02")
+    assert key == coalesce_key(" ai trends\n", "2031-01-02")
+    assert key != coalesce_key("AI trends", "2031-01-03")
+    assert coalesce_key("AI trends", "2031-01-02", "month") == coalesce_key("AI trends", "2031-01-30", "month")
+
+
+def test_key_includes_the_settings_that_change_the_answer() -> None:
+    graph = CoalescingGraph(StreamingGraph())
+    key = graph.key({"input": "AI trends"})
+
+    for field, value in [("planner_model", "other"), ("entry_route", "plan"), ("budget_max_steps", 5)]:
+        assert graph.key({"input": "AI trends"}, {"configurable": {field: value}}) != key
+    for field, value in [("max_concurrency", 1), ("cache_backend", "none"), ("coalesce_ttl_seconds", 5)]:
+        assert graph.key({"input": "AI trends"}, {"configurable": {field: value}}) == key
+
+
+async def test_runs_with_different_models_are_not_shared() -> None:
+    inner = StreamingGraph()
+    graph = CoalescingGraph(inner, single_flight=InMemorySingleFlight(ttl_seconds=60))
+
+    await asyncio.gather(
+        graph.ainvoke({"input": "AI trends"}, {"configurable": {"planner_model": "small"}}),
+        graph.ainvoke({"input": "AI trends"}, {"configurable": {"planner_model": "large"}}),
+    )
+
+    assert inner.runs == 2
+    assert (graph.stats.executions, graph.stats.joined) == (2, 0)
+
+
+async def test_concurrent_identical_runs_share_one_execution() -> None:
+    inner = StreamingGraph()
+    graph = CoalescingGraph(inner, single_flight=InMemorySingleFlight(ttl_seconds=0))
+
+    streams = await asyncio.gather(*(_collect(graph, text) for text in ["AI trends", "ai  TRENDS", "AI trends"]))
+    other = await graph.ainvoke({"input": "EV sales"})
+
+    assert inner.runs == 2
+    assert streams[0] == streams[1] == streams[2] == [
+        {"type": "step", "input": "AI trends"},
+        {"type": "response", "run": 1},
+    ]
+    assert other["response"] == "answer 2"
+    assert graph.stats_snapshot() == {"executions": 2, "joined": 2, "result_hits": 0, "failures": 0}
+
+
+async def test_finished_runs_are_reused_within_the_ttl() -> None:
+    inner = StreamingGraph(delay=0)
+    graph = CoalescingGraph(inner, single_flight=InMemorySingleFlight(ttl_seconds=60))
+
+    first = await graph.ainvoke({"input": "AI trends"})
+    events = await _collect(graph, "AI Trends")
+
+    assert inner.runs == 1
+    assert first["response"] == "answer 1"
+    assert events[-1] == {"type": "response", "run": 1}
+    assert graph.stats.result_hits == 1
+
+
+async def test_failures_reach_every_caller_and_are_not_reused() -> None:
+    inner = StreamingGraph(fail=True)
+    graph = CoalescingGraph(inner, single_flight=InMemorySingleFlight(ttl_seconds=60))
+
+    results = await asyncio.gather(*(graph.ainvoke({"input": "AI trends"}) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    inner.fail = False
+    assert (await graph.ainvoke({"input": "AI trends"}))["response"] == "answer 2"
+
+
+async def test_cancelled_caller_does_not_stop_the_shared_run() -> None:
+    inner = StreamingGraph()
+    graph = CoalescingGraph(inner, single_flight=InMemorySingleFlight(ttl_seconds=0))
+
+    first = asyncio.ensure_future(graph.ainvoke({"input": "AI trends"}))
+    await asyncio.sleep(0.01)
+    second = asyncio.ensure_future(graph.ainvoke({"input": "AI trends"}))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert (await second)["response"] == "answer 1"
+    assert inner.runs == 1
+
+
+async def test_running_executions_are_referenced_until_they_finish() -> None:
+    single_flight = InMemorySingleFlight(ttl_seconds=0)
+    graph = CoalescingGraph(StreamingGraph(), single_flight=single_flight)
+
+    run = asyncio.ensure_future(graph.ainvoke({"input": "AI trends"}))
+    await asyncio.sleep(0.01)
+    assert len(single_flight._tasks) == 1
+
+    await run
+    await asyncio.sleep(0)
+    assert not single_flight._tasks
+
+
+async def test_sqlite_runs_are_shared_across_stores(tmp_path) -> None:
+    path = str(tmp_path / "coalesce.sqlite3")
+    inner = StreamingGraph()
+    # Two stores on one file stand in for two processes
+    leader = CoalescingGraph(inner, single_flight=SQLiteSingleFlight(path, ttl_seconds=60, poll_seconds=0.01))
+    follower = CoalescingGraph(inner, single_flight=SQLiteSingleFlight(path, ttl_seconds=60, poll_seconds=0.01))
+
+    leading = asyncio.ensure_future(_collect(leader, "AI trends"))
+    await asyncio.sleep(0.01)
+    followed = await _collect(follower, "ai trends")
+
+    assert await leading == followed == [{"type": "step", "input": "AI trends"}, {"type": "response", "run": 1}]
+    assert (follower.stats.executions, follower.stats.joined) == (0, 1)
+    assert (await follower.ainvoke({"input": "AI trends"}))["response"] == "answer 1"
+    assert follower.stats.result_hits == 1
+    assert inner.runs == 1
+
+
+async def test_sqlite_run_with_an_expired_lease_is_taken_over(tmp_path) -> None:
+    path = str(tmp_path / "coalesce.sqlite3")
+    single_flight = SQLiteSingleFlight(path, ttl_seconds=60, lease_seconds=30, poll_seconds=0.01)
+    graph = CoalescingGraph(StreamingGraph(delay=0), single_flight=single_flight)
+    key = graph.key({"input": "AI trends"})
+    # A process that dies while running the key: its lease is not renewed
+    assert single_flight.store.claim(key, "dead", lease_seconds=0.05)
+
+    state = await graph.ainvoke({"input": "AI trends"})
+
+    assert state["response"] == "answer 1"
+    assert (single_flight.stats.executions, single_flight.stats.joined) == (1, 1)
+
+
+async def test_sqlite_store_is_not_called_on_the_event_loop(tmp_path) -> None:
+    single_flight = SQLiteSingleFlight(str(tmp_path / "coalesce.sqlite3"), ttl_seconds=60, poll_seconds=0.01)
+    loop_thread = threading.get_ident()
+    calls = []
+
+    def record(name):
+        method = getattr(single_flight.store, name)
+
+        def call(*args, **kwargs):
+            calls.append((name, threading.get_ident() != loop_thread))
+            return method(*args, **kwargs)
+
+        setattr(single_flight.store, name, call)
+
+    for name in ("lookup", "claim", "append", "finish", "poll"):
+        record(name)
+    graph = CoalescingGraph(StreamingGraph(), single_flight=single_flight)
+    await asyncio.gather(_collect(graph, "AI trends"), _collect(graph, "AI trends"))
+
+    assert {name for name, _ in calls} >= {"lookup", "claim", "append", "finish"}
+    assert all(off_loop for _, off_loop in calls)
+
+
+async def test_batch_runs_identical_objectives_once() -> None:
+    models = {role: FakeChatModel(responder=default_fake_responder(role)) for role in ("planner", "executor", "replanner")}
+    configurable = {
+        "llm_provider": "fake",
+        "cache_backend": "none",
+        "entry_route": "full",
+        "coalesce_backend": "memory",
+    }
+    items = [{"id": str(i), "input": "AI trends"} for i in range(4)]
+    set_single_flight(InMemorySingleFlight())
+    try:
+        with registered_models(models), fake_search(FakeSearchBackend(), 0):
+            runner = BatchRunner(workflow.compile(), {"configurable": configurable})
+            summary = await runner.arun(items)
+    finally:
+        set_single_flight(None)
+
+    assert summary["status"]["ok"] == 4
+    assert models["planner"].call_count == 1
+    assert summary["coalescing"]["executions"] == 1
+    assert summary["coalescing"]["joined"] + summary["coalescing"]["result_hits"] == 3
@@ -0,0 +1,88 @@
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from agent import replanner
+from agent.compaction import (
+    DRAFT_PLACEHOLDER,
+    compact_draft,
+    compact_past_steps,
+    compact_replanner_context,
+    draft_fingerprint,
+    expand_draft_placeholder,
+)
+from agent.configuration import Configuration
+from agent.replanner import Act, Response
+from agent.state import get_default_state
+from agent.tokens import count_tokens
+
+pytestmark = pytest.mark.anyio
+
+
+def _steps(n: int, words: int = 200):
+    return [(f"task {i}", " ".join(f"word{i}" for _ in range(words))) for i in range(n)]
+
+
+def test_older_steps_are_summarized_once() -> None:
+    steps = _steps(5)
+    text, summary, covered = compact_past_steps(steps, "", 0, 2000, recent_steps=2)
+    assert covered == 3
+    assert summary.count("\n") == 2
+    assert "Step 4: task 3" in text and "Step 5: task 4" in text
+
+    # The memoized summary is extended, never recomputed.
+    text, summary2, covered = compact_past_steps(steps + _steps(1), summary, covered, 2000, 2)
+    assert summary2.startswith(summary)
+    assert covered == 4
+
+
+def test_past_steps_respect_token_budget() -> None:
+    steps = _steps(40, words=400)
+    text, _, _ = compact_past_steps(steps, "", 0, 800, recent_steps=3)
+    assert count_tokens(text) < 1000
+    assert "oldest omitted" in text
+
+
+def test_unchanged_draft_is_sent_as_outline() -> None:
+    draft = "# Report\n\n## Intro\n" + "text " * 500 + "\n## Findings\nmore"
+    outline = compact_draft(draft, unchanged=True, token_budget=3000)
+    assert "## Intro" in outline and "## Findings" in outline
+    assert count_tokens(outline) < 50
+    assert compact_draft(draft, unchanged=False, token_budget=3000) == draft
+
+
+def test_compaction_stats_accumulate_across_replans() -> None:
+    state = get_default_state()
+    state.update(past_steps=_steps(6), current_draft_report="# Draft\nbody " * 50)
+    config = Configuration()
+
+    _, update = compact_replanner_context(state, config)
+    state.update(update)
+    variables, update = compact_replanner_context(state, config)
+
+    assert update["draft_fingerprint"] == draft_fingerprint(state["current_draft_report"])
+    assert variables["current_draft_report"].startswith("(Unchanged")
+    assert update["compaction_stats"]["replans"] == 2
+    assert update["compaction_stats"]["tokens_saved"] > 0
+
+
+def test_placeholder_expands_to_full_draft() -> None:
+    assert expand_draft_placeholder(f"Final:\n{DRAFT_PLACEHOLDER}", "full draft") == "Final:\nfull draft"
+    assert expand_draft_placeholder("direct answer", "draft") == "direct answer"
+
+
+async def test_replan_step_sends_compacted_context(monkeypatch) -> None:
+    seen = {}
+
+    async def fake_replanner(variables):
+        seen.update(variables)
+        return Act(action=Response(response=DRAFT_PLACEHOLDER))
+
+    monkeypatch.setattr(replanner, "get_replanner", lambda config=None: RunnableLambda(fake_replanner))
+    update = await replanner.replan_step(
+        {"input": "objective", "past_steps": _steps(5), "current_draft_report": "# Draft"},
+        {"configurable": {"cache_backend": "none"}},
+    )
+
+    assert seen["past_steps"].startswith("Summary of earlier steps:")
+    assert update["response"] == "# Draft"
+    assert update["summarized_steps"] == 2
@@ -0,0 +1,99 @@
+from agent import executor
+from agent.draft import (
+    DraftDocument,
+    Patch,
+    apply_step_output,
+    parse_patches,
+    section_task_input,
+)
+
+DRAFT = """Preface line
+
+# AI Trends
+
+Overview.
+
+## Market Size
+Large and growing.
+
+```
+# not a heading
+```
+
+## Risks
+Regulation.
+"""
+
+
+def test_parse_is_lossless_and_indexes_sections() -> None:
+    document = DraftDocument.parse(DRAFT)
+
+    assert document.render() == DRAFT
+    assert [s.id for s in document.sections] == ["start", "ai-trends", "market-size", "risks"]
+    assert "# not a heading" in document.sections[2].text
+    assert "  - market-size: Market Size" in document.outline()
+
+
+def test_duplicate_headings_get_unique_ids() -> None:
+    document = DraftDocument.parse("## Notes\na\n## Notes\nb\n")
+    assert [s.id for s in document.sections] == ["notes", "notes-2"]
+
+
+def test_select_targets_sections_named_by_the_task() -> None:
+    document = DraftDocument.parse(DRAFT)
+
+    assert [s.id for s in document.select("Refine the market size section with 2024 data")] == ["market-size"]
+    assert [s.id for s in document.select("Expand risks")] == ["risks"]
+    assert document.select("Add a section on adoption to the current_draft_report content") == []
+    assert document.select("Review the draft for formatting") is None
+
+
+def test_patches_are_applied_in_order() -> None:
+    output = (
+        "Edits below.\n"
+        "<<<REPLACE market-size (5 tokens)>>>\n## Market Size\nHuge.\n<<<END>>>\n"
+        "<<<INSERT AFTER ai-trends>>>\n## Drivers\nCompute.\n<<<END>>>\n"
+        "<<<DELETE risks>>><<<END>>>\n"
+        "<<<APPEND>>>\n## Outlook\nPositive.\n<<<END>>>"
+    )
+    assert [p.op for p in parse_patches(output)] == ["REPLACE", "INSERT AFTER", "DELETE", "APPEND"]
+
+    updated = DraftDocument.parse(apply_step_output(DRAFT, output))
+
+    assert [s.id for s in updated.sections] == ["start", "ai-trends", "drivers", "market-size", "outlook"]
+    assert "Huge." in updated.render() and "Regulation." not in updated.render()
+    assert updated.render().startswith("Preface line\n\n# AI Trends\n\nOverview.\n\n## Drivers\n")
+
+
+def test_unknown_targets_do_not_lose_content() -> None:
+    document = DraftDocument.parse(DRAFT)
+    rejected = document.apply(
+        [Patch("REPLACE", "missing", "## New\ntext"), Patch("DELETE", "missing", "")]
+    )
+
+    assert [p.op for p in rejected] == ["DELETE"]
+    assert document.sections[-1].id == "new"
+
+
+def test_output_without_patches_replaces_the_draft() -> None:
+    assert apply_step_output(DRAFT, "# Rewritten") == "# Rewritten"
+    assert apply_step_output(None, "<<<APPEND>>>\n# First\n<<<END>>>").startswith("<<<APPEND>>>")
+
+
+def test_report_step_input_sends_outline_and_targeted_sections_only() -> None:
+    task = "Refine the market size section"
+    text = executor._prepare_task_input(task, DRAFT, section_edits=True)
+
+    assert text == section_task_input(task, DraftDocument.parse(DRAFT))
+    assert "- risks: Risks" in text
+    assert "Large and growing." in text
+    assert "Regulation." not in text
+    assert "EXISTING DRAFT CONTENT START" in executor._prepare_task_input(task, DRAFT)
+
+
+def test_report_step_applies_patches_to_the_draft() -> None:
+    output = "<<<REPLACE risks>>>\n## Risks\nFew.\n<<<END>>>"
+    updated = executor._update_draft_report("Refine the risks section", output, DRAFT)
+
+    assert updated.endswith("## Risks\nFew.\n\n")
+    assert "Large and growing." in updated
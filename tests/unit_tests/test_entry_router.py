@@ -0,0 +1,102 @@
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent.checkpointer import thread_config
+from agent.entry_router import classify_objective
+from agent.fakes import (
+    FakeChatModel,
+    FakeSearchBackend,
+    default_fake_responder,
+    fake_search,
+    registered_models,
+)
+from agent.graph import workflow
+
+pytestmark = pytest.mark.anyio
+
+FAKE = {"llm_provider": "fake", "cache_backend": "none"}
+
+
+@pytest.mark.parametrize(
+    ("objective", "route"),
+    [
+        ("what year is it?", "direct"),
+        ("What is the current date today?", "direct"),
+        ("What is artificial intelligence?", "direct"),
+        ("Latest EV sales figures in Norway", "single_step"),
+        ("Who won the 2022 World Cup?", "single_step"),
+        ("Translate 'good morning' into French and Spanish, then explain the grammar", "full"),
+        ("Generate a detailed report on global smart city development trends", "full"),
+        ("Compare PostgreSQL and MySQL for analytics workloads", "full"),
+        ("What is RAG? How does it differ from fine-tuning?", "full"),
+        (" ".join(["word"] * 40), "full"),
+    ],
+)
+def test_classify_objective(objective, route) -> None:
+    assert classify_objective(objective)[0] == route
+
+
+def _models(executor_responder=None):
+    return {
+        "planner": FakeChatModel(responder=default_fake_responder("planner")),
+        "executor": FakeChatModel(responder=executor_responder or default_fake_responder("executor")),
+        "replanner": FakeChatModel(responder=default_fake_responder("replanner")),
+    }
+
+
+async def _run(objective, models, **configurable):
+    with registered_models(models), fake_search(FakeSearchBackend(), 0):
+        return await workflow.compile().ainvoke(
+            {"input": objective}, {"configurable": {**FAKE, **configurable}}
+        )
+
+
+async def test_direct_route_makes_one_model_call() -> None:
+    models = _models(lambda messages: "It is 2031.")
+    state = await _run("what year is it?", models)
+
+    assert (state["route"], state["response"]) == ("direct", "It is 2031.")
+    assert {role: m.call_count for role, m in models.items()} == {"planner": 0, "executor": 1, "replanner": 0}
+
+
+async def test_single_step_route_skips_planner_and_replanner() -> None:
+    models = _models()
+    state = await _run("Latest EV sales figures in Norway", models)
+
+    assert state["route"] == "single_step"
+    assert state["response"].startswith("Fake findings")
+    assert state["past_steps"][0][0] == "Latest EV sales figures in Norway"
+    assert models["planner"].call_count == models["replanner"].call_count == 0
+
+
+async def test_refused_direct_answer_escalates() -> None:
+    answers = iter(["Sorry, I am unable to answer that without searching.", "Paris hosts it."])
+    models = _models(lambda messages: next(answers))
+    state = await _run("Where is the next summit held?", models)
+
+    assert state["route"] == "single_step"
+    assert state["route_reason"] == "direct answer looked like a refusal"
+    assert state["response"] == "Paris hosts it."
+
+
+async def test_forced_full_route_plans() -> None:
+    models = _models()
+    state = await _run("what year is it?", models, entry_route="full")
+
+    assert (state["route"], state["route_reason"]) == ("full", "forced by entry_route")
+    assert models["planner"].call_count == 1
+    assert state["response"] == "Fake final answer based on the executed steps."
+
+
+async def test_each_run_on_a_thread_gets_its_own_answer() -> None:
+    models = _models(lambda messages: "It is 2031.")
+    graph = workflow.compile(checkpointer=InMemorySaver())
+    config = thread_config("same-thread", {"configurable": FAKE})
+    with registered_models(models), fake_search(FakeSearchBackend(), 0):
+        first = await graph.ainvoke({"input": "what year is it?"}, config)
+        second = await graph.ainvoke({"input": "Write a detailed report on EV adoption"}, config)
+
+    assert first["response"] == "It is 2031."
+    assert second["route"] == "full"
+    assert models["planner"].call_count == models["replanner"].call_count == 1
+    assert second["response"] == "Fake final answer based on the executed steps."
@@ -0,0 +1,132 @@
+import itertools
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent.evidence import (
+    EVIDENCE_TOOL_NAME,
+    NO_EVIDENCE,
+    EvidenceStore,
+    evidence_update,
+    make_evidence_tool,
+    merge_evidence,
+    use_evidence_store,
+)
+from agent.fakes import (
+    FINAL_STEP,
+    FakeChatModel,
+    FakeSearchBackend,
+    fake_search,
+    finishing_replanner,
+    registered_models,
+    research_planner,
+)
+from agent.graph import workflow
+from agent.search import SEARCH_TOOL_NAME
+
+pytestmark = pytest.mark.anyio
+
+HITS = [
+    {"url": "https://a", "content": "Norway EV sales reached record highs in 2024."},
+    {"url": "https://b", "content": "Battery prices fell sharply over the decade."},
+    {"url": "https://c", "content": "Charging networks expanded across Europe."},
+]
+
+
+def test_bm25_ranks_matching_hits_first() -> None:
+    store = EvidenceStore()
+    assert store.add_hits("EV market", HITS) == 3
+
+    assert [e.url for e in store.search("battery prices")] == ["https://b"]
+    assert store.search("EV sales in Norway")[0].url == "https://a"
+    assert store.search("unrelated words") == []
+
+
+def test_store_is_bounded_and_round_trips_through_rows() -> None:
+    store = EvidenceStore(max_entries=2, max_chars=20)
+    store.add_hits("q", HITS)
+    store.add_hits("q", "RuntimeError('search failed')")
+
+    rows = store.to_rows()
+    assert [row[0] for row in rows] == ["https://b", "https://c"]
+    assert rows[0] == ["https://b", "Battery prices fell ", "q"]
+
+    restored = EvidenceStore.from_rows(rows, max_entries=2, max_chars=20)
+    assert restored.to_rows() == rows and not restored.changed
+    restored.add_hits("again", [{"url": "https://c", "content": "Charging networks"}])
+    assert [row[0] for row in restored.to_rows()] == ["https://b", "https://c"] and restored.changed
+
+
+def test_updates_hold_only_the_changes_of_the_step() -> None:
+    store = EvidenceStore(max_entries=2)
+    store.add_hits("q", HITS[:2])
+    rows = merge_evidence([], evidence_update(store)["evidence"])
+
+    restored = EvidenceStore.from_rows(rows, max_entries=2)
+    assert evidence_update(restored) == {}
+    restored.add_hits("q2", HITS[2:])
+
+    update = evidence_update(restored)["evidence"]
+    assert update == [["https://c", HITS[2]["content"], "q2"], ["https://a"]]
+    assert merge_evidence(rows, update) == restored.to_rows()
+
+
+async def test_retrieval_tool_reads_the_current_store() -> None:
+    tool = make_evidence_tool(k=1)
+    use_evidence_store(None)
+    assert await tool.ainvoke({"query": "battery"}) == NO_EVIDENCE
+
+    store = EvidenceStore()
+    store.add_hits("EV market", HITS)
+    use_evidence_store(store)
+    try:
+        assert await tool.ainvoke({"query": "battery"}) == [HITS[1]]
+    finally:
+        use_evidence_store(None)
+
+
+async def test_retrieval_tool_uses_the_top_k_of_the_run() -> None:
+    tool = make_evidence_tool()
+    store = EvidenceStore()
+    store.add_hits("EV market", HITS)
+    use_evidence_store(store)
+    try:
+        one = await tool.ainvoke({"query": "EV sales battery charging"}, {"configurable": {"evidence_top_k": 1}})
+        three = await tool.ainvoke({"query": "EV sales battery charging"}, {"configurable": {"evidence_top_k": 3}})
+    finally:
+        use_evidence_store(None)
+    assert (len(one), len(three)) == (1, 3)
+
+
+def _evidence_executor():
+    """Search for search steps; the report step retrieves stored results instead."""
+    call_ids = itertools.count()
+
+    def respond(messages):
+        task = next(str(m.content) for m in messages if isinstance(m, HumanMessage)).splitlines()[0]
+        if isinstance(messages[-1], ToolMessage):
+            return f"Findings: {messages[-1].content}"
+        tool = EVIDENCE_TOOL_NAME if FINAL_STEP in task else SEARCH_TOOL_NAME
+        query = "aspect findings" if FINAL_STEP in task else task
+        return AIMessage(
+            content="", tool_calls=[{"name": tool, "args": {"query": query}, "id": f"call_{next(call_ids)}"}]
+        )
+
+    return respond
+
+
+async def test_later_steps_retrieve_instead_of_searching() -> None:
+    models = {
+        "planner": FakeChatModel(responder=research_planner(2)),
+        "executor": FakeChatModel(responder=_evidence_executor()),
+        "replanner": FakeChatModel(responder=finishing_replanner),
+    }
+    backend = FakeSearchBackend()
+    configurable = {"llm_provider": "fake", "cache_backend": "none", "entry_route": "full"}
+    with registered_models(models), fake_search(backend, 0) as stats:
+        state = await workflow.compile().ainvoke({"input": "EV trends"}, {"configurable": configurable})
+
+    assert stats.backend_calls == len(backend.queries) == 2
+    assert len(state["evidence"]) == 6
+    report = dict(state["past_steps"])[FINAL_STEP]
+    assert "https://example.com/" in report
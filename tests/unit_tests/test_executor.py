@@ -0,0 +1,48 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from agent import executor
+
+pytestmark = pytest.mark.anyio
+
+
+def test_executor_prompt_uses_time_context_from_state() -> None:
+    messages = executor._executor_prompt(
+        {"messages": [HumanMessage(content="task")], "time_context": "Year: 2030"}
+    )
+    assert isinstance(messages[0], SystemMessage) and isinstance(messages[1], SystemMessage)
+    assert "Year: 2030" not in messages[0].content
+    assert messages[1].content == "Year: 2030"
+    assert messages[2].content == "task"
+
+    original = executor._executor_prompt(
+        {"messages": [HumanMessage(content="task")], "time_context": "Year: 2030", "compact_prompts": False}
+    )
+    assert "Year: 2030" in original[0].content
+    assert original[1].content == "task"
+
+
+async def test_sub_agent_is_reused_across_steps(monkeypatch) -> None:
+    calls = []
+
+    class RecordingAgent:
+        async def astream(self, payload, config=None, stream_mode=None):
+            calls.append(payload)
+            yield "values", {"messages": [AIMessage(content="done")]}
+
+    agent = RecordingAgent()
+    monkeypatch.setattr(executor, "get_agent_executor", lambda config=None: agent)
+    await executor._execute_task_with_agent("first", "ctx 1")
+    await executor._execute_task_with_agent("second", "ctx 2")
+
+    assert [c["time_context"] for c in calls] == ["ctx 1", "ctx 2"]
+
+
+async def test_agent_stream_without_a_final_state_raises(monkeypatch) -> None:
+    class SilentAgent:
+        async def astream(self, payload, config=None, stream_mode=None):
+            yield "updates", {}
+
+    monkeypatch.setattr(executor, "get_agent_executor", lambda config=None: SilentAgent())
+    with pytest.raises(RuntimeError, match="without a final state"):
+        await executor._execute_task_with_agent("task", "ctx", "step")
@@ -0,0 +1,116 @@
+import pytest
+
+from agent import llm_config
+from agent.fakes import (
+    FakeChatModel,
+    FakeSearchBackend,
+    fake_search,
+    finishing_replanner,
+    research_planner,
+    searching_executor,
+)
+from agent.graph import workflow
+from agent.instrumentation import (
+    Instrumentation,
+    PrometheusExporter,
+    RunTrace,
+    TraceRecord,
+    estimate_cost,
+    get_instrumentation,
+)
+
+pytestmark = pytest.mark.anyio
+
+FAKE = {"llm_provider": "fake", "cache_backend": "none", "entry_route": "full"}
+
+
+@pytest.fixture
+def research_models(monkeypatch):
+    executor = FakeChatModel(responder=searching_executor(10), latency_seconds=0.01)
+    monkeypatch.setitem(llm_config._overrides, "planner", FakeChatModel(responder=research_planner(2)))
+    monkeypatch.setitem(llm_config._overrides, "executor", executor)
+    monkeypatch.setitem(llm_config._overrides, "replanner", FakeChatModel(responder=finishing_replanner))
+
+
+async def _run(instrumentation, **configurable):
+    with fake_search(FakeSearchBackend(), 0):
+        await workflow.compile().ainvoke(
+            {"input": "objective"},
+            {"configurable": {**FAKE, **configurable}, "callbacks": [instrumentation]},
+        )
+    return instrumentation.last_trace()
+
+
+def test_cost_uses_longest_model_prefix() -> None:
+    assert estimate_cost("gpt-4o-mini-2024", 1000, 1000) == pytest.approx(0.00075)
+    assert estimate_cost("gpt-4", 1000, 0) == pytest.approx(0.03)
+    assert estimate_cost("unknown", 1000, 1000) == 0.0
+
+
+def test_instrumentation_is_disabled_by_default() -> None:
+    assert get_instrumentation() is None
+    handler = get_instrumentation({"configurable": {"instrumentation": "trace"}})
+    assert isinstance(handler, Instrumentation) and handler.exporters == []
+    with pytest.raises(ValueError):
+        get_instrumentation({"configurable": {"instrumentation": "statsd"}})
+
+
+async def test_trace_records_nodes_steps_llm_and_tools(research_models) -> None:
+    trace = await _run(Instrumentation(), max_concurrency=1)
+
+    nodes = [r.name for r in trace.records if r.kind == "node"]
+    assert nodes == ["router", "planner", "plan_optimizer", "scheduler", "replanner", "scheduler", "replanner"]
+    summary = trace.summary()
+    assert summary["nodes"]["scheduler"]["tool_calls"] == 2
+    assert summary["nodes"]["scheduler"]["llm_calls"] == 5
+    assert summary["nodes"]["planner"]["prompt_tokens"] > 0
+    assert len(summary["steps"]) == 3
+    # The second search waited for the single scheduler slot.
+    assert sum(s["queue_seconds"] for s in summary["steps"].values()) > 0
+    assert 0 <= summary["graph_overhead_seconds"] < summary["duration_seconds"]
+
+
+async def test_traces_are_bounded(research_models) -> None:
+    instrumentation = Instrumentation(max_runs=1, max_records=3)
+    first = await _run(instrumentation)
+    second = await _run(instrumentation)
+
+    assert list(instrumentation.traces) == [second.run_id]
+    assert instrumentation.get_trace(first.run_id) is None
+    assert len(second.records) == 3 and second.dropped > 0
+
+
+async def test_role_slot_wait_is_attributed_to_llm_calls(research_models, monkeypatch) -> None:
+    limited = llm_config._concurrency_limited(FakeChatModel)(
+        responder=searching_executor(10), latency_seconds=0.01, metadata={"agent_role": "executor"}
+    )
+    monkeypatch.setitem(llm_config._overrides, "executor", limited)
+    trace = await _run(Instrumentation(), executor_max_concurrency=1)
+    llm_waits = [r.queue_seconds for r in trace.records if r.kind == "llm"]
+    assert max(llm_waits) > 0
+
+
+def test_prometheus_text_format() -> None:
+    exporter = PrometheusExporter(buckets=(0.1, 1.0))
+    trace = RunTrace("run", 0.0, duration_seconds=5.0)
+    trace.add(TraceRecord("node", "planner", node="planner", duration_seconds=0.5))
+    trace.add(TraceRecord("llm", "gpt-4o", node="planner", duration_seconds=0.4, prompt_tokens=10, completion_tokens=2))
+    trace.add(TraceRecord("tool", "search", node="scheduler", duration_seconds=0.05))
+    exporter.export(trace)
+
+    text = exporter.render()
+    assert "# TYPE agent_node_duration_seconds histogram" in text
+    assert 'agent_node_duration_seconds_bucket{node="planner",le="1"} 1' in text
+    assert 'agent_run_duration_seconds_bucket{le="1"} 0' in text
+    assert 'agent_run_duration_seconds_bucket{le="+Inf"} 1' in text
+    assert 'agent_llm_tokens_total{model="gpt-4o",node="planner",type="prompt"} 10' in text
+    assert 'agent_tool_calls_total{tool="search"} 1' in text
+
+
+def test_opentelemetry_exporter() -> None:
+    pytest.importorskip("opentelemetry")
+    from agent.instrumentation import OpenTelemetryExporter
+
+    trace = RunTrace("run", 0.0, duration_seconds=1.0)
+    trace.add(TraceRecord("node", "planner", duration_seconds=0.5))
+    OpenTelemetryExporter().export(trace)
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from agent import llm_config, search
+from agent.fakes import FakeChatModel, FakeSearchBackend
+from agent.graph import graph
+from agent.planner import Plan, get_planner
+
+pytestmark = pytest.mark.anyio
+
+FAKE = {"llm_provider": "fake", "cache_backend": "none", "entry_route": "full"}
+
+
+def test_roles_are_routed_to_the_configured_model() -> None:
+    small = {"configurable": {**FAKE, "executor_model": "small"}}
+    large = {"configurable": {**FAKE, "executor_model": "large"}}
+
+    assert llm_config.get_llm("executor", small) is llm_config.get_llm("executor", small)
+    assert llm_config.get_llm("executor", small) is not llm_config.get_llm("executor", large)
+    assert llm_config.get_llm("planner", small) is llm_config.get_llm("planner", large)
+
+
+def test_fake_models_take_the_configured_latency() -> None:
+    model = llm_config.get_llm("executor", {"configurable": {**FAKE, "fake_llm_latency_ms": 250}})
+
+    assert model.latency_seconds == 0.25
+    assert llm_config.get_llm("executor", {"configurable": FAKE}).latency_seconds == 0
+
+
+def test_chains_are_built_once_per_model() -> None:
+    config = {"configurable": FAKE}
+    assert get_planner(config) is get_planner(config)
+
+
+def test_unknown_provider_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        llm_config.get_llm("planner", {"configurable": {"llm_provider": "other"}})
+
+
+async def test_registered_model_overrides_configuration(monkeypatch) -> None:
+    model = FakeChatModel(responses=[Plan(steps=["only step"])])
+    monkeypatch.setitem(llm_config._overrides, "planner", model)
+
+    variables = {"messages": [], "current_utc_date": "", "current_utc_time": "", "current_year": ""}
+    plan = await get_planner({"configurable": FAKE}).ainvoke(variables)
+
+    assert plan.steps == ["only step"]
+    assert model.call_count == 1
+
+
+async def _peak_concurrency(limit: int, calls: int) -> int:
+    llm_config.get_llm("executor", {"configurable": {**FAKE, "executor_max_concurrency": limit}})
+    active = peak = 0
+
+    async def call() -> None:
+        nonlocal active, peak
+        async with llm_config.role_slot("executor"):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*(call() for _ in range(calls)))
+    return peak
+
+
+async def test_role_concurrency_limit() -> None:
+    assert await _peak_concurrency(1, 3) == 1
+    # A later run, or a concurrent one, with another limit gets its own slots
+    assert await _peak_concurrency(4, 4) == 4
+    assert await asyncio.gather(_peak_concurrency(1, 3), _peak_concurrency(3, 3)) == [1, 3]
+
+
+async def test_graph_runs_offline_with_fake_provider(monkeypatch) -> None:
+    monkeypatch.setattr(search.get_search_service({"configurable": FAKE}), "backend", FakeSearchBackend())
+
+    result = await graph.ainvoke({"input": "Summarize AI trends"}, {"configurable": FAKE})
+
+    assert result["response"] == "Fake final answer based on the executed steps."
+    assert len(result["past_steps"]) == 1
+
+
+def test_async_http_pool_is_kept_per_event_loop() -> None:
+    import httpx
+
+    transports = []
+
+    def factory():
+        transports.append(httpx.MockTransport(lambda request: httpx.Response(200)))
+        return transports[-1]
+
+    client = httpx.AsyncClient(transport=llm_config._loop_transport(factory))
+
+    async def send_twice():
+        await asyncio.gather(client.get("https://example.com"), client.get("https://example.com"))
+
+    asyncio.run(send_twice())
+    asyncio.run(send_twice())
+    assert len(transports) == 2
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import random
+import time
+
+import pytest
+
+from agent.fakes import FakeChatModel, sample_latency
+from agent.loadtest import load_test, main, measure_level, saturation_point
+
+pytestmark = pytest.mark.anyio
+
+
+def test_latencies_are_log_normal_around_the_median() -> None:
+    assert sample_latency(random.Random(0), 0.1, 0) == 0.1
+    rng = random.Random(0)
+    draws = sorted(sample_latency(rng, 0.1, 0.5) for _ in range(2001))
+    assert 0.09 < draws[1000] < 0.11
+    assert draws[1980] > 2 * draws[1000]
+
+    model = FakeChatModel(latency_seconds=0.1, latency_sigma=0.5, seed=3)
+    again = FakeChatModel(latency_seconds=0.1, latency_sigma=0.5, seed=3)
+    assert [model._first_token_latency() for _ in range(3)] == [again._first_token_latency() for _ in range(3)]
+
+
+async def test_closed_loop_keeps_the_level_in_flight() -> None:
+    async def invoke(index):
+        await asyncio.sleep(0.01)
+        if index == 3:
+            raise RuntimeError("boom")
+
+    report = await measure_level(invoke, 4, 12, trace_memory=False)
+
+    assert report["peak_in_flight"] == 4
+    assert report["failures"] == 1 and report["errors"] == {"RuntimeError": 1}
+    assert report["latency_ms"]["p99"] >= report["latency_ms"]["p50"] >= 10
+    assert "offered_rps" not in report and "memory" not in report
+
+
+async def test_open_loop_does_not_wait_for_earlier_runs() -> None:
+    async def invoke(index):
+        await asyncio.sleep(0.2)
+
+    report = await measure_level(invoke, 200, 10, pattern="open", trace_memory=False)
+
+    assert report["offered_rps"] == 200
+    assert report["peak_in_flight"] > 1
+
+
+async def test_blocking_calls_show_up_as_event_loop_lag() -> None:
+    async def blocking(index):
+        await asyncio.sleep(0.01)
+        time.sleep(0.05)
+
+    async def non_blocking(index):
+        await asyncio.sleep(0.06)
+
+    blocked = await measure_level(blocking, 2, 6, lag_interval_ms=5, trace_memory=False)
+    free = await measure_level(non_blocking, 2, 6, lag_interval_ms=5, trace_memory=False)
+
+    assert blocked["event_loop_lag_ms"]["max"] >= 40
+    assert free["event_loop_lag_ms"]["max"] < blocked["event_loop_lag_ms"]["max"]
+
+
+def test_saturation_is_the_last_level_that_scaled() -> None:
+    closed = [
+        {"level": 1, "throughput_rps": 2.0},
+        {"level": 10, "throughput_rps": 15.0},
+        {"level": 50, "throughput_rps": 16.0},
+        {"level": 100, "throughput_rps": 30.0},
+    ]
+    assert saturation_point(closed, "closed")["level"] == 10
+    assert saturation_point(closed[:2], "closed") is None
+
+    opened = [
+        {"level": 5, "offered_rps": 5, "throughput_rps": 5.0},
+        {"level": 20, "offered_rps": 20, "throughput_rps": 12.0},
+    ]
+    assert saturation_point(opened, "open") == {
+        "level": 5,
+        "throughput_rps": 5.0,
+        "reason": "throughput fell more than 10% below the offered rate",
+    }
+
+
+async def test_in_process_load_test_reports_every_level() -> None:
+    report = await load_test(levels=(1, 2), requests=2, searches=1, llm_latency_ms=1, search_latency_ms=1)
+
+    assert [level["level"] for level in report["levels"]] == [1, 2]
+    for level in report["levels"]:
+        assert level["failures"] == 0
+        assert level["memory"]["concurrent_runs"] == level["peak_in_flight"]
+        assert level["memory"]["peak_kib_per_concurrent_run"] > 0
+    assert report["parameters"]["target"] == "in_process"
+
+
+def test_cli_writes_the_report(tmp_path, capsys) -> None:
+    output = tmp_path / "load.json"
+    main(
+        [
+            "--levels", "1", "--requests", "1", "--searches", "1", "--llm-latency-ms", "0",
+            "--search-latency-ms", "0", "--no-memory", "--output", str(output),
+        ]
+    )
+
+    report = json.loads(output.read_text())
+    assert report == json.loads(capsys.readouterr().out)
+    assert report["benchmark"] == "loadtest" and report["saturation"] is None
@@ -0,0 +1,131 @@
+import pytest
+
+from agent.fakes import (
+    FakeChatModel,
+    FakeSearchBackend,
+    default_fake_responder,
+    fake_search,
+    registered_models,
+)
+from agent.graph import workflow
+from agent.plan_optimizer import is_duplicate, optimize_plan, optimize_plan_step
+
+pytestmark = pytest.mark.anyio
+
+
+def test_steps_are_normalized_and_empty_steps_dropped() -> None:
+    plan = optimize_plan(["1. Search  EV sales", "Step 2: ", "- Write the report"], [[], [0], [1]])
+
+    assert plan.steps == ["Search EV sales", "Write the report"]
+    # The report depended on the empty step, which depended on the search
+    assert plan.dependencies == [[], [0]]
+    assert plan.removed == [("Step 2: ", "empty")]
+
+
+@pytest.mark.parametrize(
+    "first, second, expected",
+    [
+        ("Search EV sales in Norway", "Find the latest EV sales numbers in Norway", True),
+        ("Search EV sales in Norway", "Search EV sales in Sweden", False),
+        ("Search EV sales in 2023", "Search EV sales in 2024", False),
+        ("Search EV sales", "Search battery prices", False),
+    ],
+)
+def test_duplicates_restate_a_step(first, second, expected) -> None:
+    assert is_duplicate(first, second, 0.75) is expected
+
+
+def test_duplicates_keep_the_specific_wording_and_dependents() -> None:
+    plan = optimize_plan(
+        [
+            "Search EV sales in Norway",
+            "Search battery prices",
+            "Find the latest EV sales numbers in Norway",
+            "Write the report",
+        ],
+        [[], [], [], [1, 2]],
+    )
+
+    assert plan.steps == ["Find the latest EV sales numbers in Norway", "Search battery prices", "Write the report"]
+    assert plan.dependencies == [[], [], [0, 1]]
+    assert plan.count("duplicate") == 1
+
+
+def test_draft_steps_are_never_deduplicated() -> None:
+    steps = ["Update the draft report", "Update the draft report"]
+    assert optimize_plan(steps, [[], [0]]).steps == steps
+
+
+def test_adjacent_independent_searches_are_batched() -> None:
+    plan = optimize_plan(
+        ["Search EV sales", "Search battery prices", "Search charging networks", "Search tariffs", "Write the report"],
+        [[], [], [1], [], [0, 1, 2, 3]],
+        max_batched_searches=3,
+    )
+
+    assert plan.steps[0] == (
+        "Search for each of the following in one batched search and report the findings for each: "
+        "(1) Search EV sales; (2) Search battery prices"
+    )
+    # The third search needs the second, so it starts a new batch with the fourth
+    assert plan.steps[1].endswith("(1) Search charging networks; (2) Search tariffs")
+    assert plan.dependencies == [[], [0], [0, 1]]
+    assert plan.step_kinds == {plan.steps[0].casefold(): "search", plan.steps[1].casefold(): "search"}
+    assert plan.count("merged") == 2
+
+
+def test_long_plans_keep_the_final_step() -> None:
+    steps = [f"Search topic {i}" for i in range(5)] + ["Write the report"]
+    plan = optimize_plan(steps, [[]] * 5 + [[0, 1, 2, 3, 4]], max_steps=3)
+
+    assert plan.steps == ["Search topic 0", "Search topic 1", "Write the report"]
+    assert plan.dependencies == [[], [], [0, 1]]
+    assert plan.count("over the plan length") == 3
+
+
+def test_dropped_steps_pass_their_dependencies_on() -> None:
+    steps = ["Search A", "Analyze A", "Check B", "Check C", "Write the report"]
+    plan = optimize_plan(steps, [[], [0], [], [2], [1, 3]], max_steps=3)
+
+    assert plan.steps == ["Search A", "Analyze A", "Write the report"]
+    # The report needed "Check C", which needed "Check B": both were dropped
+    assert plan.dependencies == [[], [0], [1]]
+
+
+async def test_long_plans_are_kept_by_default() -> None:
+    steps = [f"Search topic {i}" for i in range(12)]
+    update = await optimize_plan_step({"plan": steps, "plan_dependencies": [[]] * 12}, {"configurable": {}})
+    assert update["plan_optimizer_stats"]["truncated"] == 0
+    assert "plan" not in update
+
+
+async def test_disabled_optimizer_leaves_the_plan() -> None:
+    state = {"plan": ["Search A", "Search A"], "plan_dependencies": [[], []]}
+    assert await optimize_plan_step(state, {"configurable": {"plan_optimizer": False}}) == {}
+
+
+async def test_graph_skips_duplicate_steps() -> None:
+    models = {
+        "planner": FakeChatModel(
+            responses=[
+                {"steps": ["Search AI trends", "1. search  AI trends", "Search latest AI trends"], "dependencies": []}
+            ]
+        ),
+        "executor": FakeChatModel(responder=default_fake_responder("executor")),
+        "replanner": FakeChatModel(responder=default_fake_responder("replanner")),
+    }
+    configurable = {"llm_provider": "fake", "cache_backend": "none", "entry_route": "full", "replan_policy": "at_end"}
+    with registered_models(models), fake_search(FakeSearchBackend(), 0):
+        state = await workflow.compile().ainvoke({"input": "AI trends"}, {"configurable": configurable})
+
+    assert models["executor"].call_count == 1
+    assert [step for step, _ in state["past_steps"]] == ["Search AI trends"]
+    assert state["plan_optimizer_stats"] == {
+        "planned_steps": 3,
+        "optimized_steps": 1,
+        "empty": 0,
+        "deduplicated": 2,
+        "merged": 0,
+        "truncated": 0,
+        "steps_saved": 2,
+    }
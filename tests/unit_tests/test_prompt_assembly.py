@@ -0,0 +1,115 @@
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agent.prompt_assembly import (
+    PromptSection,
+    PromptTemplate,
+    executor_messages,
+    format_plan,
+    planner_messages,
+    prompt_snapshot,
+    record_prompt,
+    render,
+    replanner_messages,
+)
+from agent.prompts import PLANNER_PROMPT_TEMPLATE, REPLANNER_PROMPT_TEMPLATE
+from agent.tokens import count_tokens
+
+TIMES = {"current_utc_date": "2031-01-02", "current_utc_time": "10:00:00", "current_year": 2031}
+REPLAN = {
+    **TIMES,
+    "input": "AI trends",
+    "plan": ["Search 'A'", "Write the   report"],
+    "past_steps": "Step 1: Search A\nResult: found",
+    "current_draft_report": "",
+}
+ORIGINAL = {"configurable": {"compact_prompts": False}}
+
+
+def test_static_prefix_is_byte_stable_across_runs() -> None:
+    first = planner_messages({**TIMES, "messages": [HumanMessage(content="AI trends")]})
+    later = planner_messages(
+        {**TIMES, "current_utc_time": "23:59:59", "messages": [HumanMessage(content="EV sales")]}
+    )
+
+    assert first[0] == later[0] and isinstance(first[0], SystemMessage)
+    assert "10:00:00" not in first[0].content and "{" not in first[0].content
+    assert first[1].content != later[1].content
+    assert [m.content for m in first[2:]] == ["AI trends"]
+
+    replan = replanner_messages(REPLAN)
+    assert replan[0] == replanner_messages({**REPLAN, "input": "other"})[0]
+    assert "2031" in replan[1].content
+
+
+def test_original_layouts_are_kept() -> None:
+    messages = planner_messages({**TIMES, "messages": [HumanMessage(content="AI trends")]}, ORIGINAL)
+    assert messages[0].content == PLANNER_PROMPT_TEMPLATE.format(**TIMES)
+
+    messages = replanner_messages(REPLAN, ORIGINAL)
+    assert messages == [HumanMessage(content=REPLANNER_PROMPT_TEMPLATE.format(**REPLAN))]
+    assert "[\"Search 'A'\", 'Write the   report']" in messages[0].content
+
+
+def test_plan_is_serialized_as_a_numbered_list() -> None:
+    assert format_plan(REPLAN["plan"]) == "1. Search 'A'\n2. Write the report"
+    assert format_plan([]) == "(no steps)"
+    assert "# Previous Plan (that led to the last executed step):\n1. Search 'A'\n2. Write" in (
+        replanner_messages(REPLAN)[1].content
+    )
+
+
+def test_template_sections_render_like_str_format() -> None:
+    template = "Intro {input} middle {plan}"
+    sections = PromptTemplate(template, static_prefix=True).sections({"input": "x", "plan": "y"})
+
+    assert render(sections) == template.format(input="x", plan="y")
+    assert [(s.name, s.static) for s in sections] == [
+        ("instructions", True),
+        ("objective", False),
+        ("instructions", False),
+        ("plan", False),
+    ]
+
+
+def test_tokens_are_recorded_per_section() -> None:
+    before = prompt_snapshot().get("test", {"calls": 0, "tokens": 0, "static_tokens": 0, "sections": {}})
+    record_prompt(
+        "test",
+        [
+            PromptSection("instructions", "Static instructions.", static=True),
+            PromptSection("time_context", "Year: 2031"),
+            PromptSection("instructions", "More instructions.", static=True),
+        ],
+    )
+    after = prompt_snapshot()["test"]
+
+    assert after["calls"] - before["calls"] == 1
+    assert after["static_tokens"] - before["static_tokens"] == count_tokens("Static instructions.")
+    assert after["sections"]["time_context"] - before["sections"].get("time_context", 0) == count_tokens(
+        "Year: 2031"
+    )
+    assert after["tokens"] - before["tokens"] == sum(
+        count_tokens(t) for t in ("Static instructions.", "Year: 2031", "More instructions.")
+    )
+
+
+def test_executor_history_is_counted_separately() -> None:
+    before = prompt_snapshot().get("executor", {"sections": {}})["sections"]
+    executor_messages(
+        [HumanMessage(content="task"), HumanMessage(content="tool result")], "Year: 2031", record=True
+    )
+    after = prompt_snapshot()["executor"]["sections"]
+
+    assert after["task"] - before.get("task", 0) == count_tokens("task")
+    assert after["history"] - before.get("history", 0) == count_tokens("tool result")
+
+
+def test_prompts_are_only_counted_when_enabled() -> None:
+    variables = {**TIMES, "messages": [HumanMessage(content="AI trends")]}
+    before = prompt_snapshot().get("planner", {"calls": 0})["calls"]
+    planner_messages(variables)
+    replanner_messages(REPLAN)
+    assert prompt_snapshot().get("planner", {"calls": 0})["calls"] == before
+
+    planner_messages(variables, {"configurable": {"prompt_stats": True}})
+    assert prompt_snapshot()["planner"]["calls"] == before + 1
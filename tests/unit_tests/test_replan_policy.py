@@ -0,0 +1,73 @@
+import pytest
+
+from agent.graph import route_after_execution
+from agent.replan_policy import looks_like_failure, should_replan
+
+
+def _config(policy: str, **extra) -> dict:
+    return {"configurable": {"replan_policy": policy, **extra}}
+
+
+def _state(outputs, plan=("next step",)) -> dict:
+    return {
+        "plan": list(plan),
+        "past_steps": [(f"task {i}", out) for i, out in enumerate(outputs)],
+        "steps_since_replan": len(outputs),
+    }
+
+
+@pytest.mark.parametrize(
+    "output",
+    [
+        "I cannot access that document.",
+        "Tool error: timeout",
+        "",
+        "No results found for the query.",
+        "Sorry, I was unable to open the page.",
+        "Unfortunately, the search is not available right now.",
+    ],
+)
+def test_failures_are_detected(output: str) -> None:
+    assert looks_like_failure(output)
+
+
+@pytest.mark.parametrize(
+    "output",
+    [
+        "Error rates of speech models fell 20% in 2024.",
+        "Python raises an exception and prints a traceback when a call fails.",
+        "The new model is not available in the EU until 2025.",
+        "The study found that 30% of users say sorry to voice assistants.",
+        "Sales grew 12%. Analysts said they were unable to explain the jump.",
+    ],
+)
+def test_failure_words_as_a_topic_are_not_a_failure(output: str) -> None:
+    assert not looks_like_failure(output)
+
+
+def test_empty_plan_always_replans() -> None:
+    assert should_replan(_state(["ok"], plan=()), _config("at_end"))
+
+
+def test_always_policy() -> None:
+    assert route_after_execution(_state(["ok"]), _config("always")) == "replanner"
+
+
+def test_on_failure_policy() -> None:
+    assert route_after_execution(_state(["ok"]), _config("on_failure")) == "scheduler"
+    assert route_after_execution(_state(["I was unable to search."]), _config("on_failure")) == "replanner"
+
+
+def test_every_n_steps_policy() -> None:
+    config = _config("every_n_steps", replan_every_n_steps=2)
+    assert not should_replan(_state(["ok"]), config)
+    assert should_replan(_state(["ok", "ok"]), config)
+
+
+def test_at_end_policy() -> None:
+    assert not should_replan(_state(["Sorry, I can't do that."]), _config("at_end"))
+
+
+def test_unknown_policy_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        should_replan(_state(["ok"]), _config("sometimes"))
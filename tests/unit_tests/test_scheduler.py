@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from agent import scheduler
+from agent.planner import Plan
+from agent.scheduler import _ready_wave, _remove_steps, schedule_step
+
+pytestmark = pytest.mark.anyio
+
+
+def test_missing_dependencies_default_to_sequential() -> None:
+    plan = Plan(steps=["a", "b", "c"])
+    assert plan.resolved_dependencies() == [[], [0], [1]]
+
+
+def test_forward_references_are_dropped() -> None:
+    plan = Plan(steps=["a", "b"], dependencies=[[1], [0, 5]])
+    assert plan.resolved_dependencies() == [[], [0]]
+
+
+def test_ready_wave_keeps_document_steps_alone() -> None:
+    plan = [
+        "Use TavilySearchResults to find A",
+        "Use TavilySearchResults to find B",
+        "Generate an initial draft of the report",
+    ]
+    assert _ready_wave(plan, [[], [], [0, 1]]) == [0, 1]
+    assert _ready_wave(plan[2:], [[]]) == [0]
+
+
+def test_remove_steps_reindexes_dependencies() -> None:
+    plan, deps = _remove_steps(["a", "b", "c", "d"], [[], [], [0, 1], [2]], [0, 1])
+    assert plan == ["c", "d"]
+    assert deps == [[], [0]]
+
+
+async def test_schedule_step_runs_wave_concurrently_in_plan_order(monkeypatch) -> None:
+    running = 0
+    peak = 0
+
+    async def fake_execute_task(task, draft, time_context, config=None, step_kinds=None, evidence=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Finish in reverse order to check that merging is deterministic.
+        await asyncio.sleep(0.03 if task.endswith("A") else 0.01)
+        running -= 1
+        return f"result {task}", draft
+
+    monkeypatch.setattr(scheduler, "execute_task", fake_execute_task)
+    state = {
+        "input": "objective",
+        "plan": ["Search A", "Search B", "Generate an initial draft of the report"],
+        "plan_dependencies": [[], [], [0, 1]],
+    }
+    update = await schedule_step(state, {"configurable": {"max_concurrency": 2}})
+
+    assert peak == 2
+    assert update["past_steps"] == [
+        ("Search A", "result Search A"),
+        ("Search B", "result Search B"),
+    ]
+    assert update["plan"] == ["Generate an initial draft of the report"]
+    assert update["plan_dependencies"] == [[]]
+
+
+async def test_completed_steps_are_not_executed_again(monkeypatch) -> None:
+    executed = []
+
+    async def fake_execute_task(task, draft, time_context, config=None, step_kinds=None, evidence=None):
+        executed.append(task)
+        return f"result {task}", draft
+
+    monkeypatch.setattr(scheduler, "execute_task", fake_execute_task)
+    state = {
+        "plan": ["Search  a", "Search B"],
+        "plan_dependencies": [[], [0]],
+        "past_steps": [("search A", "cached")],
+    }
+    update = await schedule_step(state)
+    assert executed == ["Search B"]
+    assert update["plan"] == []
+
+    executed.clear()
+    await schedule_step(state, {"configurable": {"skip_completed_steps": False}})
+    assert executed == ["Search  a"]
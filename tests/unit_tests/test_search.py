@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+from agent.executor import execute_task
+from agent.fakes import FakeChatModel, FakeSearchBackend, fake_search, registered_models
+from agent.search import (
+    BATCH_SEARCH_TOOL_NAME,
+    SEARCH_TOOL_NAME,
+    SearchService,
+    TokenBucket,
+    build_search_service,
+    get_search_service,
+    make_batch_search_tool,
+    make_search_tool,
+    normalize_query,
+    search_digest,
+)
+from agent.tokens import count_tokens
+
+pytestmark = pytest.mark.anyio
+
+
+def test_normalize_query() -> None:
+    assert normalize_query("  Latest  AI trends?! ") == normalize_query("latest ai trends")
+
+
+async def test_concurrent_identical_queries_are_coalesced() -> None:
+    backend = FakeSearchBackend(latency_seconds=0.02)
+    service = SearchService(backend, rate_per_second=0)
+
+    results = await asyncio.gather(*(service.asearch(q) for q in ["AI trends", "ai  trends?", "AI Trends"]))
+
+    assert backend.queries == ["AI trends"]
+    assert results[0] == results[1] == results[2]
+    assert service.stats.coalesced == 2
+
+
+async def test_results_are_cached_until_ttl(monkeypatch) -> None:
+    backend = FakeSearchBackend()
+    service = SearchService(backend, cache_ttl_seconds=60, rate_per_second=0)
+    await service.asearch("quantum computing")
+    await service.asearch("Quantum computing.")
+    assert len(backend.queries) == 1
+    assert service.stats.cache_hits == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr("agent.cache.time.monotonic", lambda: now + 61)
+    await service.asearch("quantum computing")
+    assert len(backend.queries) == 2
+
+
+async def test_concurrency_is_bounded() -> None:
+    running = peak = 0
+
+    class SlowBackend:
+        async def asearch(self, query, max_results):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return []
+
+    service = SearchService(SlowBackend(), max_concurrency=2, rate_per_second=0)
+    await asyncio.gather(*(service.asearch(f"query {i}") for i in range(6)))
+    assert peak == 2
+
+
+async def test_token_bucket_limits_rate() -> None:
+    bucket = TokenBucket(rate_per_second=50, burst=1)
+    start = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    assert time.monotonic() - start >= 0.05
+
+
+async def test_tool_reports_errors_without_caching_them() -> None:
+    backend = FakeSearchBackend(fail_on="boom")
+    tool = make_search_tool(SearchService(backend, rate_per_second=0))
+    assert tool.name == SEARCH_TOOL_NAME
+
+    assert "RuntimeError" in await tool.ainvoke({"query": "boom"})
+    await tool.ainvoke({"query": "boom"})
+    assert len(backend.queries) == 2
+
+    hits = await tool.ainvoke({"query": "fine"})
+    assert hits[0]["url"].startswith("https://example.com/")
+
+
+async def test_batch_tool_runs_queries_concurrently() -> None:
+    backend = FakeSearchBackend(latency_seconds=0.05)
+    tool = make_batch_search_tool(SearchService(backend, rate_per_second=0), max_queries=3, max_concurrency=3)
+    assert tool.name == BATCH_SEARCH_TOOL_NAME
+
+    start = time.perf_counter()
+    digest = await tool.ainvoke({"queries": ["EV sales", "ev sales?", "battery prices", "tariffs", "charging"]})
+
+    assert time.perf_counter() - start < 0.1
+    assert backend.queries == ["EV sales", "battery prices", "tariffs"]
+    assert digest.startswith("[1] https://example.com/")
+    assert digest.count("(query: battery prices)") == 3
+
+
+def test_digest_dedupes_urls_and_fits_the_budget() -> None:
+    long_text = "word " * 500
+    results = [
+        ("a", [{"url": "https://same", "content": long_text}, {"url": "https://a2", "content": long_text}]),
+        ("b", [{"url": "https://same", "content": long_text}, {"url": "https://b2", "content": long_text}]),
+        ("c", RuntimeError("boom")),
+    ]
+    digest = search_digest(results, 300)
+
+    assert [line.split()[1] for line in digest.splitlines() if line.startswith("[")] == [
+        "https://same",
+        "https://a2",
+        "https://b2",
+    ]
+    assert digest.endswith("Search for 'c' failed: RuntimeError('boom')")
+    assert count_tokens(digest) <= 300
+    assert search_digest([], 300) == "No results."
+
+
+async def test_executor_searches_many_queries_in_one_turn() -> None:
+    def respond(messages):
+        if isinstance(messages[-1], ToolMessage):
+            return f"Summary of {messages[-1].content.count('[')} hits"
+        queries = ["EV sales", "battery prices", "charging networks"]
+        return AIMessage(
+            content="", tool_calls=[{"name": BATCH_SEARCH_TOOL_NAME, "args": {"queries": queries}, "id": "call_0"}]
+        )
+
+    executor = FakeChatModel(responder=respond)
+    backend = FakeSearchBackend()
+    with registered_models({"executor": executor}), fake_search(backend, 0):
+        output, _ = await execute_task("Research the EV market", None, "", {"configurable": {"llm_provider": "fake"}})
+
+    assert executor.call_count == 2
+    assert len(backend.queries) == 3
+    assert output == "Summary of 9 hits"
+
+
+def test_fake_search_backend_is_configurable(monkeypatch) -> None:
+    monkeypatch.setenv("AGENT_SEARCH_BACKEND", "fake")
+    monkeypatch.setenv("AGENT_FAKE_SEARCH_LATENCY_MS", "20")
+    service = build_search_service()
+    assert isinstance(service.backend, FakeSearchBackend)
+    assert service.backend.latency_seconds == 0.02
+
+    monkeypatch.setenv("AGENT_SEARCH_BACKEND", "bing")
+    with pytest.raises(ValueError):
+        build_search_service()
+
+
+async def test_tools_use_the_search_settings_of_the_run() -> None:
+    tool = make_search_tool()
+
+    def config(max_results: int) -> dict:
+        return {"configurable": {"search_backend": "fake", "search_max_results": max_results}}
+
+    assert len(await tool.ainvoke({"query": "ai"}, config(1))) == 1
+    assert len(await tool.ainvoke({"query": "ai"}, config(2))) == 2
+    # Runs with the same settings share one service and its cache
+    assert get_search_service(config(2)) is get_search_service(config(2))
+    assert get_search_service(config(2)).stats.requests == 1
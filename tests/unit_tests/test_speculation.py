@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from agent.budget import UsageCounter
+from agent.fakes import (
+    FINAL_STEP,
+    FakeChatModel,
+    FakeSearchBackend,
+    fake_search,
+    registered_models,
+    research_planner,
+    searching_executor,
+)
+from agent.graph import workflow
+from agent.speculation import Speculation, resolve_speculation, speculation_hit_rate
+
+pytestmark = pytest.mark.anyio
+
+CONFIG = {"configurable": {"llm_provider": "fake", "cache_backend": "none", "speculative_execution": True}}
+
+
+def _replanner(*actions):
+    """Return the scripted replanner actions in order, answering once they run out."""
+    remaining = iter(actions)
+
+    def respond(messages):
+        return {"action": next(remaining, {"response": "Done."})}
+
+    return respond
+
+
+async def _run(replanner_responder):
+    models = {
+        "planner": FakeChatModel(responder=research_planner(1)),
+        "executor": FakeChatModel(responder=searching_executor(5)),
+        "replanner": FakeChatModel(responder=replanner_responder),
+    }
+    with registered_models(models), fake_search(FakeSearchBackend(), 0):
+        events, state = [], None
+        async for mode, chunk in workflow.compile().astream(
+            {"input": "Research objective"}, CONFIG, stream_mode=["custom", "values"]
+        ):
+            if mode == "custom":
+                events.append(chunk)
+            else:
+                state = chunk
+    return state, events, models
+
+
+def _started(events):
+    return [e["step"] for e in events if e["type"] == "step_start"]
+
+
+async def test_kept_step_is_committed_without_running_again() -> None:
+    state, events, models = await _run(
+        _replanner({"steps": [FINAL_STEP], "dependencies": [[]]})
+    )
+
+    assert state["speculation_stats"] == {"attempts": 1, "hits": 1}
+    assert [step for step, _ in state["past_steps"]].count(FINAL_STEP) == 1
+    assert _started(events).count(FINAL_STEP) == 1
+    assert state["current_draft_report"].startswith("Findings for")
+    # search step (tool call + answer) and the speculated report step
+    assert models["executor"].call_count == 3
+    # The committed step emptied the plan, so it is reviewed right away
+    assert state["response"] == "Done."
+    assert models["replanner"].call_count == 2
+
+
+async def test_dropped_step_is_discarded_and_counted_as_waste() -> None:
+    other = "Summarize the findings in one paragraph"
+    state, events, models = await _run(
+        _replanner({"steps": [other], "dependencies": [[]]})
+    )
+
+    stats = state["speculation_stats"]
+    assert (stats["attempts"], stats.get("hits", 0), stats["misses"]) == (1, 0, 1)
+    assert stats["wasted_tokens"] > 0
+    assert speculation_hit_rate(stats) == 0.0
+    executed = [step for step, _ in state["past_steps"]]
+    assert FINAL_STEP not in executed and other in executed
+    # Discarded runs never reach the stream
+    assert FINAL_STEP not in _started(events)
+
+
+async def test_step_with_new_dependencies_is_not_committed() -> None:
+    first = "Check the latest figures"
+    state, _, _ = await _run(
+        _replanner(
+            {"steps": [first, FINAL_STEP], "dependencies": [[], [0]]},
+            {"steps": [FINAL_STEP], "dependencies": [[]]},
+        )
+    )
+
+    # Missed while it waited on the new step, committed on the next replan
+    stats = state["speculation_stats"]
+    assert (stats["attempts"], stats["hits"], stats["misses"]) == (2, 1, 1)
+    executed = [step for step, _ in state["past_steps"]]
+    assert executed.index(first) < executed.index(FINAL_STEP)
+
+
+def test_hit_rate() -> None:
+    assert speculation_hit_rate({}) == 0.0
+    assert speculation_hit_rate({"attempts": 4, "hits": 3}) == 0.75
+
+
+async def test_answer_without_a_plan_discards_the_speculation() -> None:
+    async def step():
+        return "output", None
+
+    speculation = Speculation("step", asyncio.ensure_future(step()), UsageCounter(), [])
+    update = await resolve_speculation(speculation, {"step_kinds": {}}, None)
+
+    assert update == {"speculation_stats": {"attempts": 1, "misses": 1, "wasted_tokens": 0}}
@@ -0,0 +1,56 @@
+"""Cold-start benchmark: import time and peak RSS of a fresh interpreter."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+resource = pytest.importorskip("resource")
+
+# Generous budgets: they catch eager heavy imports, not machine noise.
+IMPORT_PACKAGE_MAX_SECONDS = 0.5
+IMPORT_GRAPH_MAX_SECONDS = 5.0
+IMPORT_GRAPH_MAX_RSS_MB = 400
+
+HEAVY_MODULES = ("langchain_openai", "openai", "langchain_community", "tiktoken", "sqlite3")
+
+_MEASURE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+print(json.dumps({{
+    "seconds": seconds,
+    "peak_rss_mb": rss_mb,
+    "heavy_modules": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def _measure_import(module: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("AZURE_OPENAI_")}
+    out = subprocess.run(
+        [sys.executable, "-c", _MEASURE.format(module=module, heavy=HEAVY_MODULES)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def test_import_agent_is_fast() -> None:
+    stats = _measure_import("agent")
+    assert stats["heavy_modules"] == []
+    assert stats["seconds"] < IMPORT_PACKAGE_MAX_SECONDS, stats
+
+
+def test_graph_imports_without_credentials_or_llm_sdk() -> None:
+    stats = _measure_import("agent.graph")
+    assert stats["heavy_modules"] == []
+    assert stats["seconds"] < IMPORT_GRAPH_MAX_SECONDS, stats
+    assert stats["peak_rss_mb"] < IMPORT_GRAPH_MAX_RSS_MB, stats
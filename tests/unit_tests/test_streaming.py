@@ -0,0 +1,176 @@
+import uuid
+from typing import TypedDict
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import Runnable, RunnableGenerator
+from langgraph.graph import StateGraph
+from langgraph.prebuilt import create_react_agent
+
+from agent import executor, replanner
+from agent.replanner import Act, Response
+from agent.streaming import get_writer
+
+pytestmark = pytest.mark.anyio
+
+
+class _State(TypedDict, total=False):
+    output: str
+
+
+def _graph_running(task: str):
+    async def node(state):
+        output, _ = await executor.execute_task(task, None, "ctx")
+        return {"output": output}
+
+    workflow = StateGraph(_State)
+    workflow.add_node("node", node)
+    workflow.set_entry_point("node")
+    return workflow.compile()
+
+
+async def _custom_events(graph):
+    return [event async for event in graph.astream({}, stream_mode="custom")]
+
+
+def test_writer_is_a_no_op_outside_a_run() -> None:
+    get_writer()({"type": "token"})
+
+
+async def test_executor_streams_tokens_step_and_draft_events(monkeypatch) -> None:
+    class ToolFreeModel(GenericFakeChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+    model = ToolFreeModel(messages=iter([AIMessage(content="# Report\nBody text")]))
+    agent = create_react_agent(
+        model, [], prompt=executor._executor_prompt, state_schema=executor.ExecutorAgentState
+    )
+    monkeypatch.setattr(executor, "get_agent_executor", lambda config=None: agent)
+
+    events = await _custom_events(_graph_running("Generate an initial draft of the report"))
+    types = [e["type"] for e in events]
+
+    assert types[0] == "step_start"
+    assert types[-2:] == ["step_end", "draft"]
+    tokens = [e for e in events if e["type"] == "token"]
+    assert len(tokens) > 1
+    assert "".join(e["delta"] for e in tokens) == "# Report\nBody text"
+    assert {e["target"] for e in tokens} == {"draft"}
+    assert events[-1]["content"] == "# Report\nBody text"
+
+
+async def test_executor_streams_tool_calls(monkeypatch) -> None:
+    class ScriptedAgent:
+        async def astream(self, payload, config=None, stream_mode=None):
+            call = {"name": "search", "args": {"query": "ai"}, "id": "call-1"}
+            yield "updates", {"agent": {"messages": [AIMessage(content="", tool_calls=[call])]}}
+            yield "updates", {"tools": {"messages": [ToolMessage(content="hits", name="search", tool_call_id="call-1")]}}
+            yield "values", {"messages": [AIMessage(content="summary")]}
+
+    monkeypatch.setattr(executor, "get_agent_executor", lambda config=None: ScriptedAgent())
+    events = await _custom_events(_graph_running("Use TavilySearchResults to find ai news"))
+
+    start, end = [e for e in events if e["type"].startswith("tool_")]
+    assert start == {
+        "type": "tool_start",
+        "node": "executor",
+        "step": "Use TavilySearchResults to find ai news",
+        "tool": "search",
+        "tool_call_id": "call-1",
+        "input": {"query": "ai"},
+    }
+    assert (end["type"], end["output"]) == ("tool_end", "hits")
+    assert not any(e["type"] == "draft" for e in events)
+
+
+async def test_replanner_streams_final_response(monkeypatch) -> None:
+    async def partial_acts(inputs):
+        async for _ in inputs:
+            pass
+        for text in ["The", "The answer", "The answer is 42."]:
+            yield Act(action=Response(response=text))
+
+    monkeypatch.setattr(replanner, "get_replanner", lambda config=None: RunnableGenerator(partial_acts))
+
+    class _ReplanState(TypedDict, total=False):
+        input: str
+        response: str
+
+    workflow = StateGraph(_ReplanState)
+    workflow.add_node("replanner", replanner.replan_step)
+    workflow.set_entry_point("replanner")
+    graph = workflow.compile()
+
+    events = [
+        e
+        async for e in graph.astream(
+            {"input": "q"}, {"configurable": {"cache_backend": "none"}}, stream_mode="custom"
+        )
+    ]
+    assert [e["delta"] for e in events if e["type"] == "token"] == ["The", " answer", " is 42."]
+    assert events[-1] == {"type": "response", "node": "replanner", "content": "The answer is 42."}
+
+
+async def test_replanner_streams_cached_response(monkeypatch) -> None:
+    calls = []
+
+    async def partial_acts(inputs):
+        async for _ in inputs:
+            pass
+        calls.append(1)
+        for text in ["Cached", "Cached answer."]:
+            yield Act(action=Response(response=text))
+
+    monkeypatch.setattr(replanner, "get_replanner", lambda config=None: RunnableGenerator(partial_acts))
+
+    class _ReplanState(TypedDict, total=False):
+        input: str
+        response: str
+
+    workflow = StateGraph(_ReplanState)
+    workflow.add_node("replanner", replanner.replan_step)
+    workflow.set_entry_point("replanner")
+    graph = workflow.compile()
+
+    runs = []
+    for _ in range(2):
+        events = [
+            e
+            async for e in graph.astream(
+                {"input": f"cached {uuid.uuid4()}" if not runs else runs[0]["input"]},
+                {"configurable": {"cache_backend": "memory"}},
+                stream_mode=["custom", "values"],
+            )
+        ]
+        runs.append(next(chunk for mode, chunk in events if mode == "values"))
+        tokens = [chunk["delta"] for mode, chunk in events if mode == "custom" and chunk["type"] == "token"]
+        assert "".join(tokens) == "Cached answer."
+    assert len(calls) == 1
+
+
+class _UnparsedStream(Runnable):
+    """Replanner chain whose stream yields no parsed action."""
+
+    def __init__(self, result):
+        self.result = result
+
+    def invoke(self, inputs, config=None, **kwargs):
+        return self.result
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        return self.result
+
+    async def astream(self, inputs, config=None, **kwargs):
+        yield None
+
+
+async def test_replanner_falls_back_when_the_stream_parses_nothing(monkeypatch) -> None:
+    act = Act(action=Response(response="done"))
+    monkeypatch.setattr(replanner, "get_replanner", lambda config=None: _UnparsedStream(act))
+    assert await replanner._astream_replanner({}) == act
+
+    monkeypatch.setattr(replanner, "get_replanner", lambda config=None: _UnparsedStream(None))
+    with pytest.raises(ValueError, match="no parseable action"):
+        await replanner._astream_replanner({})
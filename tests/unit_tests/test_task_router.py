@@ -0,0 +1,95 @@
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent import executor, scheduler
+from agent.planner import Plan
+from agent.task_router import (
+    KeywordTaskRouter,
+    get_task_router,
+    routing_snapshot,
+    set_task_router,
+    task_kind,
+    valid_kinds,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize(
+    ("task", "kind"),
+    [
+        ("Generate an initial draft of the report on AI", "draft"),
+        ("Add a section on risks to the current_draft_report content", "draft"),
+        ("Write the final report from the findings", "draft"),
+        ("Use TavilySearchResults to find the latest AI report", "search"),
+        ("Create a list of sources by searching for EV sales data", "search"),
+        ("Review the search results for contradictions", "search"),
+        ("Write a report based on the research findings", "draft"),
+        ("Create a comprehensive summary of the search results found in previous steps", "draft"),
+        ("Summarize the research on EV adoption into an executive summary", "draft"),
+        ("Use TavilySearchResults to find information on: Write a report on EV sales", "search"),
+        ("Review the numbers and compute the growth rate", "general"),
+        ("Create a comparison table of the three vendors", "general"),
+    ],
+)
+def test_keyword_router_matches_whole_words(task, kind) -> None:
+    assert KeywordTaskRouter().classify(task) == kind
+
+
+def test_classification_is_memoized_per_task() -> None:
+    router = KeywordTaskRouter()
+    for _ in range(3):
+        router.classify("Write the report")
+    assert router._cached_match.cache_info().hits == 2
+
+
+def test_planner_tags_take_precedence() -> None:
+    steps = ["Write the report", "Compare vendors"]
+    tags = valid_kinds(steps, ["search", "bogus"])
+
+    assert tags == {"write the report": "search"}
+    assert task_kind("  write the REPORT ", tags) == "search"
+    assert task_kind("Compare vendors", tags) == "general"
+    assert valid_kinds(steps, ["draft"]) == {}
+    assert Plan(steps=steps).kinds == []
+
+
+def test_custom_router_can_be_installed() -> None:
+    class Everything:
+        def classify(self, task):
+            return "draft"
+
+    set_task_router(Everything())
+    try:
+        assert task_kind("Compare vendors") == "draft"
+    finally:
+        set_task_router(None)
+    assert isinstance(get_task_router(), KeywordTaskRouter)
+
+
+async def test_routing_stats_count_draft_attachments(monkeypatch) -> None:
+    prompts = []
+
+    class RecordingAgent:
+        async def astream(self, payload, config=None, stream_mode=None):
+            prompts.append(payload["messages"][0][1])
+            yield "values", {"messages": [AIMessage(content="done")]}
+
+    monkeypatch.setattr(executor, "get_agent_executor", lambda config=None: RecordingAgent())
+    before = routing_snapshot()
+
+    await executor.execute_task("Review the search results for gaps", "# Draft\nbody", "ctx")
+    await executor.execute_task("Refine the current_draft_report content", "# Draft\nbody", "ctx")
+
+    after = routing_snapshot()
+    assert after["steps"] - before["steps"] == 2
+    assert after["draft_attached"] - before["draft_attached"] == 1
+    assert after["draft_tokens_attached"] > before["draft_tokens_attached"]
+    assert "# Draft" not in prompts[0] and "# Draft" in prompts[1]
+
+
+def test_tagged_search_step_runs_alongside_others() -> None:
+    plan = ["Search A", "Summary of B from the web"]
+    assert scheduler._ready_wave(plan, [[], []]) == [0]
+    tags = valid_kinds(plan, ["search", "search"])
+    assert scheduler._ready_wave(plan, [[], []], tags) == [0, 1]